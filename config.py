@@ -354,6 +354,11 @@ def load_settings():
             "arr": 0.03,  # Auto Repeat Rate (秒)
             "lock_delay": 0.5,  # 追加：ロックディレイ設定
             "max_lock_resets": 15,  # 追加：最大ロックディレイリセット回数
+            "loop_mode": "lockstep",  # "fixed" でルールを固定の刻みで進める
+            "sim_rate": 240,  # 固定刻みのシミュレーションレート（回/秒）
+            "render_mode": "fixed",  # 描画レート（fixed / uncapped / vsync）
+            "render_fps": 60,  # render_mode が fixed のときの描画レート
+            "online_rating": 1000,  # クイックマッチのレーティング（近い相手と組まれやすくなる）
             "key_bindings": {  # キー設定
                 "move_left": pygame.K_LEFT,
                 "move_right": pygame.K_RIGHT,
@@ -443,7 +448,7 @@ def toggle_fullscreen():
                 screen_width, screen_height = 1920, 1080
 
             try:
-                screen = pygame.display.set_mode(
+                screen = set_display_mode(
                     (screen_width, screen_height), pygame.FULLSCREEN
                 )
             except pygame.error as e:
@@ -452,7 +457,7 @@ def toggle_fullscreen():
                 fullscreen = False
                 screen_width = BASE_SCREEN_WIDTH
                 screen_height = BASE_SCREEN_HEIGHT
-                screen = pygame.display.set_mode((screen_width, screen_height))
+                screen = set_display_mode((screen_width, screen_height))
                 scale_factor = 1.0
 
             if fullscreen:
@@ -465,7 +470,7 @@ def toggle_fullscreen():
             screen_width = BASE_SCREEN_WIDTH
             screen_height = BASE_SCREEN_HEIGHT
             try:
-                screen = pygame.display.set_mode((screen_width, screen_height))
+                screen = set_display_mode((screen_width, screen_height))
                 scale_factor = 1.0
             except pygame.error as e:
                 print(f"ウィンドウモード設定に失敗: {e}")
@@ -499,7 +504,7 @@ def toggle_fullscreen():
             fullscreen = False
             screen_width = BASE_SCREEN_WIDTH
             screen_height = BASE_SCREEN_HEIGHT
-            screen = pygame.display.set_mode((screen_width, screen_height))
+            screen = set_display_mode((screen_width, screen_height))
             scale_factor = 1.0
             grid_x = (screen_width - GRID_WIDTH * BLOCK_SIZE * scale_factor) // 2
             grid_y = (screen_height - GRID_HEIGHT * BLOCK_SIZE * scale_factor) // 2
@@ -511,6 +516,17 @@ def toggle_fullscreen():
 
 
 # スクリーンの初期化
+def set_display_mode(size, flags=0):
+    """画面モードを設定（描画モードが vsync なら垂直同期を要求する）"""
+    if settings.get("render_mode") == "vsync":
+        try:
+            # pygame 2 の vsync は SCALED か OPENGL と組み合わせたときだけ有効
+            return pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+        except pygame.error as e:
+            print(f"垂直同期の設定に失敗: {e}")
+    return pygame.display.set_mode(size, flags)
+
+
 def initialize_screen(fullscreen=False):
     global screen, screen_width, screen_height, grid_x, grid_y, scale_factor, FULLSCREEN
 
@@ -527,7 +543,7 @@ def initialize_screen(fullscreen=False):
             screen_width, screen_height = 1920, 1080
 
         # フルスクリーンモードでの画面設定
-        screen = pygame.display.set_mode(
+        screen = set_display_mode(
             (screen_width, screen_height), pygame.FULLSCREEN
         )
 
@@ -539,7 +555,7 @@ def initialize_screen(fullscreen=False):
         # ウィンドウモード
         screen_width = BASE_SCREEN_WIDTH
         screen_height = BASE_SCREEN_HEIGHT
-        screen = pygame.display.set_mode((screen_width, screen_height))
+        screen = set_display_mode((screen_width, screen_height))
         scale_factor = 1.0
 
     # グリッド位置の再計算 - 画面中央に配置
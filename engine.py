@@ -0,0 +1,1290 @@
+# ヘッドレスなゲームエンジン（pygame非依存）
+# game.py の Tetris クラスからルール部分を切り出したもの。
+# サーバー側シミュレーションや対戦相手の再シミュレーションで使用する。
+import random
+from collections import deque
+
+from tetromino import TETROMINOS, KICKS, I_KICKS, rotate_matrix, rotate_matrix_ccw
+
+# 盤面サイズ（config.py と同じ値）
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+
+# 固定ティック（入力同期・サーバー側シミュレーション用）
+TICK_RATE = 60
+TICK_DT = 1.0 / TICK_RATE
+
+# ガベージブロックの色（グレー）
+GARBAGE_COLOR = (128, 128, 128)
+
+# ガベージの到着までの遅延（ティック数、2秒）
+ATTACK_DELAY_TICKS = 2 * TICK_RATE
+
+# ガベージの穴の散らばり具合（攻撃ごとに穴の列を変える確率。0 なら同じ列が続き、1 なら毎回ランダム）
+GARBAGE_MESSINESS = 1.0
+
+# デフォルトのブロック色（classicテーマと同じ）
+DEFAULT_BLOCK_COLORS = [
+    (0, 255, 255),  # I - シアン
+    (255, 255, 0),  # O - イエロー
+    (128, 0, 128),  # T - パープル
+    (0, 0, 255),  # J - ブルー
+    (255, 165, 0),  # L - オレンジ
+    (0, 255, 0),  # S - グリーン
+    (255, 0, 0),  # Z - レッド
+]
+
+
+def calculate_attack(lines_count, spin_type=None):
+    """ライン消去数とスピンから攻撃力（送るガベージライン数）を計算する"""
+    attack_power = 0
+
+    # ライン消去数に応じた攻撃力
+    if lines_count == 2:
+        attack_power = 1  # ダブル
+    elif lines_count == 3:
+        attack_power = 2  # トリプル
+    elif lines_count == 4:
+        attack_power = 4  # テトリス
+
+    # スピンボーナス
+    if spin_type:
+        if "T-Spin" in spin_type:
+            attack_power += 2
+        else:
+            attack_power += 1
+
+    return attack_power
+
+
+def _copy_value(value):
+    """スナップショット用に値をコピーする（盤面・ピース程度の入れ子を想定）"""
+    if isinstance(value, list):
+        return [_copy_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy_value(v) for k, v in value.items()}
+    return value
+
+
+class GarbageGenerator:
+    """ガベージの穴位置を決める乱数（対戦ごとに共有シードから作る）
+
+    同じシードと散らばり具合なら、どの端末でも同じ順に穴位置が決まるため、
+    ガベージは穴位置ではなくライン数だけをやり取りすれば盤面が一致する。
+    1回の攻撃のラインは同じ列に穴を空ける。
+    """
+
+    def __init__(self, seed=None, messiness=GARBAGE_MESSINESS):
+        # ピース順とは別系列の乱数
+        self.rng = random.Random(None if seed is None else f"garbage:{seed}")
+        self.messiness = min(1.0, max(0.0, messiness))
+        self.hole = None
+
+    def next_hole(self):
+        """次の攻撃の穴の列"""
+        if self.hole is None or self.rng.random() < self.messiness:
+            self.hole = self.rng.randrange(GRID_WIDTH)
+        return self.hole
+
+    def getstate(self):
+        return self.rng.getstate(), self.hole
+
+    def setstate(self, state):
+        rng_state, self.hole = state
+        self.rng.setstate(rng_state)
+
+
+class TetrisEngine:
+    """テトリスのルールエンジン（描画・音声・エフェクトを持たない）"""
+
+    # スナップショットに含めない属性（サブクラスで拡張する）
+    SNAPSHOT_EXCLUDE = ("rng", "garbage", "block_colors", "muted")
+
+    def __init__(self, game_mode="marathon", seed=None, block_colors=None,
+                 garbage_messiness=GARBAGE_MESSINESS):
+        self.game_mode = game_mode
+        # ピース生成用の乱数（シードを共有すれば同じ順番でピースが出る）
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # ガベージの穴位置用の乱数（ピース順とは別系列）
+        self.garbage = GarbageGenerator(seed, garbage_messiness)
+        self.block_colors = block_colors or DEFAULT_BLOCK_COLORS
+        # True の間はフック（音声・エフェクト）を鳴らさない（再シミュレーション用）
+        self.muted = False
+        self.reset()
+
+        # ゲームモードに応じた設定
+        if game_mode == "sprint":
+            self.lines_target = 40
+            self.time_limit = None
+        elif game_mode == "ultra":
+            self.lines_target = None
+            self.time_limit = 180  # 3分
+        else:  # marathon
+            self.lines_target = None
+            self.time_limit = None
+
+        # ピース統計
+        self.pieces_stats = [0] * 7
+        self.tspin_count = 0
+
+        # ゲームクリアフラグ
+        self.game_clear = False
+
+        self.is_tspin = False  # 後方互換性のため維持
+        self.current_spin_type = None  # 現在のスピンタイプ
+        self.spin_count = {
+            "T-Spin": 0,
+            "I-Spin": 0,
+            "J-Spin": 0,
+            "L-Spin": 0,
+            "S-Spin": 0,
+            "Z-Spin": 0,
+        }
+
+    def reset(self):
+        # ゲームの状態を初期化
+        self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        self.current_piece = None
+        self.held_piece = None
+        self.can_hold = True
+        self.has_used_hold = False
+
+        # 7種類のミノを1セットとしてシャッフル
+        self.piece_bag = []
+        self.refill_piece_bag()
+
+        # 次のピースを5つ用意
+        self.next_pieces = [self.get_next_piece() for _ in range(5)]
+        self.game_over = False
+        self.game_clear = False
+        self.paused = False
+        self.soft_drop = False
+
+        # 次のピースを取得
+        self.current_piece = self.next_pieces.pop(0)
+        self.next_pieces.append(self.get_next_piece())
+
+        # ゴーストピースの初期化
+        self.ghost_piece = self.get_ghost_piece()
+
+        # スコアと関連情報
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.combo = 0
+        self.back_to_back = False
+
+        # 落下速度と時間変数
+        self.fall_time = 0
+        self.fall_speed = 0.8  # 初期落下速度（秒）
+        # 修正：本家準拠のロックディレイシステム
+        self.lock_delay = 0
+        self.max_lock_delay = 0.5  # 基本ロックディレイ（本家準拠）
+        self.lock_delay_resets = 0  # ロックディレイリセット回数
+        self.max_lock_delay_resets = 15  # 最大リセット回数（本家準拠）
+        self.is_on_ground = False  # 接地状態フラグ
+        self.last_move_reset_lock = (
+            False  # 最後の移動でロックディレイがリセットされたか
+        )
+        self.has_ever_been_grounded = False  # 追加：一度でも接地したかのフラグ
+
+        # ゲーム時間
+        self.time_played = 0
+
+        # ラインクリア用
+        self.clearing_lines = False
+        self.lines_to_clear = []
+
+        # T-Spinフラグをリセット
+        self.is_tspin = False
+        self.current_spin_type = None
+
+        # オンライン対戦用
+        self.lines_cleared_this_frame = 0
+        self.pending_attack = 0  # まだ相手に送っていない攻撃力
+
+        # 固定ティック数（step() で進める）
+        self.tick = 0
+
+    def get_block_color(self, piece_index):
+        """ピースの種類に対応するブロック色を返す"""
+        return self.block_colors[TETROMINOS[piece_index]["color"]]
+
+    def refill_piece_bag(self):
+        """7種類のミノを1セットとしてシャッフルし、バッグに追加する"""
+        new_bag = list(range(len(TETROMINOS)))
+        self.rng.shuffle(new_bag)
+        self.piece_bag.extend(new_bag)
+
+    def get_next_piece(self):
+        """バッグから次のピースを取得する。バッグが空の場合は補充する。"""
+        # バッグが空の場合は補充
+        if not self.piece_bag:
+            self.refill_piece_bag()
+
+        # バッグから次のピースのインデックスを取得
+        piece_index = self.piece_bag.pop(0)
+
+        piece = {
+            "shape": [row[:] for row in TETROMINOS[piece_index]["shape"]],
+            "color": self.get_block_color(piece_index),
+            "x": GRID_WIDTH // 2 - len(TETROMINOS[piece_index]["shape"][0]) // 2,
+            "y": 0,
+            "rotation": 0,
+            "index": piece_index,
+        }
+        return piece
+
+    def get_ghost_piece(self):
+        if not self.current_piece:
+            return None
+
+        # 現在のピースの深いコピー
+        ghost = {
+            "shape": [row[:] for row in self.current_piece["shape"]],
+            "color": self.current_piece["color"],
+            "x": self.current_piece["x"],
+            "y": self.current_piece["y"],
+            "rotation": self.current_piece["rotation"],
+        }
+
+        # 可能な限り下に移動
+        while self.valid_move(ghost, y_offset=1):
+            ghost["y"] += 1
+
+        return ghost
+
+    def valid_move(self, piece, x_offset=0, y_offset=0, new_shape=None):
+        # 移動や回転が有効かチェック
+        if not piece:
+            return False
+
+        shape_to_check = new_shape if new_shape else piece["shape"]
+
+        for y, row in enumerate(shape_to_check):
+            for x, cell in enumerate(row):
+                if cell:
+                    new_x = piece["x"] + x + x_offset
+                    new_y = piece["y"] + y + y_offset
+
+                    # 範囲チェック
+                    if new_x < 0 or new_x >= GRID_WIDTH or new_y >= GRID_HEIGHT:
+                        return False
+
+                    # 既存ブロックとの衝突チェック（グリッド内の場合のみ）
+                    if new_y >= 0 and self.grid[new_y][new_x] is not None:
+                        return False
+
+        return True
+
+    # 修正：接地状態をチェックする新しいメソッド
+    def is_piece_on_ground(self):
+        """現在のピースが接地しているかチェック"""
+        if not self.current_piece:
+            return False
+        return not self.valid_move(self.current_piece, y_offset=1)
+
+    # 修正：ロックディレイをリセットする新しいメソッド
+    def reset_lock_delay(self):
+        """ロックディレイをリセット（インフィニティシステム）"""
+        if self.is_on_ground and self.lock_delay_resets < self.max_lock_delay_resets:
+            self.lock_delay = 0
+            self.lock_delay_resets += 1
+            self.last_move_reset_lock = True
+            return True
+        return False
+
+
+    def rotate(self, clockwise=True):
+        if self.game_over or self.paused or not self.current_piece:
+            return
+
+        self._on_rotate()
+
+        # 元の状態を保存
+        original_rotation = self.current_piece["rotation"]
+        original_shape = [row[:] for row in self.current_piece["shape"]]
+        original_x = self.current_piece["x"]
+        original_y = self.current_piece["y"]
+
+        # 新しい回転状態を計算
+        if clockwise:
+            new_rotation = (original_rotation + 1) % 4
+            # I型テトロミノの特殊な回転パターン
+            if self.current_piece["index"] == 0:  # I型
+                if original_rotation == 0:  # 水平から垂直へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                    ]
+                elif original_rotation == 1:  # 垂直から水平へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 0, 0],
+                        [0, 0, 0, 0],
+                        [1, 1, 1, 1],
+                        [0, 0, 0, 0],
+                    ]
+                elif original_rotation == 2:  # 水平から垂直へ
+                    self.current_piece["shape"] = [
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                    ]
+                elif original_rotation == 3:  # 垂直から水平へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 0, 0],
+                        [1, 1, 1, 1],
+                        [0, 0, 0, 0],
+                        [0, 0, 0, 0],
+                    ]
+            else:
+                # 通常のテトロミノの回転
+                self.current_piece["shape"] = rotate_matrix(original_shape)
+        else:
+            new_rotation = (original_rotation - 1) % 4
+            # I型テトロミノの特殊な回転パターン
+            if self.current_piece["index"] == 0:  # I型
+                if original_rotation == 0:  # 水平から垂直へ
+                    self.current_piece["shape"] = [
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                        [0, 1, 0, 0],
+                    ]
+                elif original_rotation == 1:  # 垂直から水平へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 0, 0],
+                        [0, 0, 0, 0],
+                        [1, 1, 1, 1],
+                        [0, 0, 0, 0],
+                    ]
+                elif original_rotation == 2:  # 水平から垂直へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                        [0, 0, 1, 0],
+                    ]
+                elif original_rotation == 3:  # 垂直から水平へ
+                    self.current_piece["shape"] = [
+                        [0, 0, 0, 0],
+                        [1, 1, 1, 1],
+                        [0, 0, 0, 0],
+                        [0, 0, 0, 0],
+                    ]
+            else:
+                # 反時計回りの回転を実装
+                self.current_piece["shape"] = rotate_matrix_ccw(original_shape)
+
+        self.current_piece["rotation"] = new_rotation
+
+        # 壁や他のブロックとの衝突をチェック
+        # まず基本的な位置で回転が可能かチェック
+        if self.valid_move(self.current_piece):
+            # 基本回転では通常スピンにならない（キックが必要）
+            self.current_spin_type = None
+
+            # 修正：回転時のロックディレイリセット
+            if self.is_on_ground:
+                self.reset_lock_delay()
+
+            # ゴーストピースの更新
+            self.ghost_piece = self.get_ghost_piece()
+            return
+
+        # 基本位置で回転できない場合、キックテストを実行
+        # キック用のパターンキー
+        kick_key = f"{original_rotation}{new_rotation}"
+
+        # I型ピースと他の形状で異なるキックパターンを使用
+        if self.current_piece["index"] == 0:  # I型
+            kicks = I_KICKS[kick_key]
+        else:
+            kicks = KICKS[kick_key]
+
+        # キックテストを実行
+        for kick_x, kick_y in kicks:
+            if self.valid_move(self.current_piece, x_offset=kick_x, y_offset=kick_y):
+                self.current_piece["x"] += kick_x
+                self.current_piece["y"] += kick_y
+
+                # キック成功時のみスピンチェック（キックによる回転がスピンの条件）
+                is_spin, spin_type = self.check_spin_after_kick(original_x, original_y, kick_x, kick_y)
+                self.current_spin_type = spin_type
+
+                # ゴーストピースの更新
+                self.ghost_piece = self.get_ghost_piece()
+                return
+
+        # 回転が不可能な場合は元に戻す
+        self.current_piece["shape"] = original_shape
+        self.current_piece["rotation"] = original_rotation
+        self.current_piece["x"] = original_x
+        self.current_piece["y"] = original_y
+        # 回転失敗時はスピン状態をリセット
+        self.current_spin_type = None
+
+    def check_spin_after_kick(self, original_x, original_y, kick_x, kick_y):
+        """キック後のスピン判定をチェックする（キックが発生した場合のみスピンとする）"""
+        if not self.current_piece:
+            return False, None
+
+        piece_index = self.current_piece["index"]
+        
+        # S型とZ型のみキック時にスピン判定
+        if piece_index == 5:  # S型
+            return True, "S-Spin"
+        elif piece_index == 6:  # Z型
+            return True, "Z-Spin"
+        elif piece_index == 2:  # T型
+            # T型は従来の判定を使用
+            is_spin, spin_type = self.check_t_spin(self.current_piece["x"], self.current_piece["y"])
+            return is_spin, spin_type
+        elif piece_index == 0:  # I型
+            # I型も従来の判定を使用
+            is_spin, spin_type = self.check_i_spin(self.current_piece["x"], self.current_piece["y"])
+            return is_spin, spin_type
+        elif piece_index == 3:  # J型
+            is_spin, spin_type = self.check_j_spin(self.current_piece["x"], self.current_piece["y"])
+            return is_spin, spin_type
+        elif piece_index == 4:  # L型
+            is_spin, spin_type = self.check_l_spin(self.current_piece["x"], self.current_piece["y"])
+            return is_spin, spin_type
+        
+        return False, None
+
+    def check_spin(self):
+        """全テトロミノのスピン判定をチェックする"""
+        if not self.current_piece:
+            self.is_tspin = False
+            return False, None
+
+        piece_index = self.current_piece["index"]
+        piece_x, piece_y = self.current_piece["x"], self.current_piece["y"]
+
+        # スピン判定結果
+        spin_type = None
+        is_spin = False
+
+        if piece_index == 0:  # I型
+            is_spin, spin_type = self.check_i_spin(piece_x, piece_y)
+        elif piece_index == 1:  # O型
+            is_spin, spin_type = self.check_o_spin(piece_x, piece_y)
+        elif piece_index == 2:  # T型
+            is_spin, spin_type = self.check_t_spin(piece_x, piece_y)
+        elif piece_index == 3:  # J型
+            is_spin, spin_type = self.check_j_spin(piece_x, piece_y)
+        elif piece_index == 4:  # L型
+            is_spin, spin_type = self.check_l_spin(piece_x, piece_y)
+        elif piece_index == 5:  # S型
+            is_spin, spin_type = self.check_s_spin(piece_x, piece_y)
+        elif piece_index == 6:  # Z型
+            is_spin, spin_type = self.check_z_spin(piece_x, piece_y)
+
+        # T-Spinフラグは後方互換性のため維持
+        self.is_tspin = piece_index == 2 and is_spin
+
+        return is_spin, spin_type
+
+    def check_t_spin(self, t_x, t_y):
+        """T-Spinの条件をチェックする"""
+        # T型の中心座標
+        center_x = t_x + 1
+        center_y = t_y + 1
+
+        # 4隅の座標
+        corners = [
+            (center_x - 1, center_y - 1),  # 左上
+            (center_x + 1, center_y - 1),  # 右上
+            (center_x - 1, center_y + 1),  # 左下
+            (center_x + 1, center_y + 1),  # 右下
+        ]
+
+        corners_filled = 0
+        for cx, cy in corners:
+            if (
+                cx < 0
+                or cx >= GRID_WIDTH
+                or cy < 0
+                or cy >= GRID_HEIGHT
+                or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+            ):
+                corners_filled += 1
+
+        # T-Spinの条件：3つ以上の隅が埋まっている
+        is_spin = corners_filled >= 3
+        return is_spin, "T-Spin" if is_spin else None
+
+    def check_i_spin(self, i_x, i_y):
+        """I-Spinの条件をチェックする"""
+        rotation = self.current_piece["rotation"]
+
+        # I型は4x4グリッドの中心付近をチェック
+        if rotation % 2 == 0:  # 水平状態
+            center_x = i_x + 2
+            center_y = i_y + 1
+        else:  # 垂直状態
+            center_x = i_x + 1
+            center_y = i_y + 2
+
+        # I型の周囲8マスをチェック
+        surrounding_filled = 0
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                if dx == 0 and dy == 0:
+                    continue
+                cx, cy = center_x + dx, center_y + dy
+                if (
+                    cx < 0
+                    or cx >= GRID_WIDTH
+                    or cy < 0
+                    or cy >= GRID_HEIGHT
+                    or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+                ):
+                    surrounding_filled += 1
+
+        # I-Spinの条件：周囲の6マス以上が埋まっている
+        is_spin = surrounding_filled >= 6
+        return is_spin, "I-Spin" if is_spin else None
+
+    def check_j_spin(self, j_x, j_y):
+        """J-Spinの条件をチェックする"""
+        # J型の中心座標（3x3グリッドの中心）
+        center_x = j_x + 1
+        center_y = j_y + 1
+
+        # 4隅の座標
+        corners = [
+            (center_x - 1, center_y - 1),  # 左上
+            (center_x + 1, center_y - 1),  # 右上
+            (center_x - 1, center_y + 1),  # 左下
+            (center_x + 1, center_y + 1),  # 右下
+        ]
+
+        corners_filled = 0
+        for cx, cy in corners:
+            if (
+                cx < 0
+                or cx >= GRID_WIDTH
+                or cy < 0
+                or cy >= GRID_HEIGHT
+                or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+            ):
+                corners_filled += 1
+
+        # J-Spinの条件：3つ以上の隅が埋まっている
+        is_spin = corners_filled >= 3
+        return is_spin, "J-Spin" if is_spin else None
+
+    def check_l_spin(self, l_x, l_y):
+        """L-Spinの条件をチェックする"""
+        # L型の中心座標（3x3グリッドの中心）
+        center_x = l_x + 1
+        center_y = l_y + 1
+
+        # 4隅の座標
+        corners = [
+            (center_x - 1, center_y - 1),  # 左上
+            (center_x + 1, center_y - 1),  # 右上
+            (center_x - 1, center_y + 1),  # 左下
+            (center_x + 1, center_y + 1),  # 右下
+        ]
+
+        corners_filled = 0
+        for cx, cy in corners:
+            if (
+                cx < 0
+                or cx >= GRID_WIDTH
+                or cy < 0
+                or cy >= GRID_HEIGHT
+                or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+            ):
+                corners_filled += 1
+
+        # L-Spinの条件：3つ以上の隅が埋まっている
+        is_spin = corners_filled >= 3
+        return is_spin, "L-Spin" if is_spin else None
+
+    def check_s_spin(self, s_x, s_y):
+        """S-Spinの条件をチェックする"""
+        rotation = self.current_piece["rotation"]
+        
+        # S型のスピン判定は回転状態によって判定する位置が異なる
+        if rotation == 0 or rotation == 2:  # 水平状態
+            # 水平のS型の場合、上下の特定位置をチェック
+            check_positions = [
+                (s_x, s_y - 1),      # 上側中央
+                (s_x + 1, s_y - 1),  # 上側右
+                (s_x + 1, s_y + 2),  # 下側右
+                (s_x + 2, s_y + 2),  # 下側右端
+            ]
+        else:  # 垂直状態 (rotation == 1 or rotation == 3)
+            # 垂直のS型の場合、左右の特定位置をチェック
+            check_positions = [
+                (s_x - 1, s_y),      # 左側上
+                (s_x - 1, s_y + 1),  # 左側下
+                (s_x + 2, s_y + 1),  # 右側下
+                (s_x + 2, s_y + 2),  # 右側下端
+            ]
+
+        filled_count = 0
+        for cx, cy in check_positions:
+            if (
+                cx < 0
+                or cx >= GRID_WIDTH
+                or cy < 0
+                or cy >= GRID_HEIGHT
+                or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+            ):
+                filled_count += 1
+
+        # S-Spinの条件：3つ以上の特定位置が埋まっている
+        is_spin = filled_count >= 3
+        return is_spin, "S-Spin" if is_spin else None
+
+    def check_z_spin(self, z_x, z_y):
+        """Z-Spinの条件をチェックする"""
+        rotation = self.current_piece["rotation"]
+        
+        # Z型のスピン判定は回転状態によって判定する位置が異なる
+        if rotation == 0 or rotation == 2:  # 水平状態
+            # 水平のZ型の場合、上下の特定位置をチェック
+            check_positions = [
+                (z_x + 1, z_y - 1),  # 上側中央
+                (z_x + 2, z_y - 1),  # 上側右
+                (z_x, z_y + 2),      # 下側左
+                (z_x + 1, z_y + 2),  # 下側中央
+            ]
+        else:  # 垂直状態 (rotation == 1 or rotation == 3)
+            # 垂直のZ型の場合、左右の特定位置をチェック
+            check_positions = [
+                (z_x - 1, z_y + 1),  # 左側中
+                (z_x - 1, z_y + 2),  # 左側下
+                (z_x + 2, z_y),      # 右側上
+                (z_x + 2, z_y + 1),  # 右側中
+            ]
+
+        filled_count = 0
+        for cx, cy in check_positions:
+            if (
+                cx < 0
+                or cx >= GRID_WIDTH
+                or cy < 0
+                or cy >= GRID_HEIGHT
+                or (cy >= 0 and cx >= 0 and self.grid[cy][cx] is not None)
+            ):
+                filled_count += 1
+
+        # Z-Spinの条件：3つ以上の特定位置が埋まっている
+        is_spin = filled_count >= 3
+        return is_spin, "Z-Spin" if is_spin else None
+
+    def check_o_spin(self, o_x, o_y):
+        """O-Spinの条件をチェックする（O型は回転しないため常にFalse）"""
+        # O型は回転しないため、スピンは発生しない
+        return False, None
+
+    def move(self, direction):
+        """ピースを左右に移動する"""
+        if self.game_over or self.paused or not self.current_piece:
+            return False
+
+        if self.valid_move(self.current_piece, x_offset=direction):
+            self.current_piece["x"] += direction
+            # ゴーストピースの更新
+            self.ghost_piece = self.get_ghost_piece()
+
+            # 移動時はスピン状態をリセット（回転後の移動でスピンが無効になる）
+            self.current_spin_type = None
+
+            # 修正：移動時のロックディレイリセット
+            if self.is_on_ground:
+                self.reset_lock_delay()
+
+            self._on_move()
+            return True
+        return False
+
+    def shift_to_wall(self, direction):
+        """ピースを壁（または障害物）まで一気に移動し、移動したマス数を返す（ARR 0 用）"""
+        if self.game_over or self.paused or not self.current_piece:
+            return 0
+
+        distance = 0
+        while self.valid_move(self.current_piece, x_offset=direction * (distance + 1)):
+            distance += 1
+        if distance == 0:
+            return 0
+
+        # 途中のマスごとの処理はせず、最後の位置にまとめて反映する
+        self.current_piece["x"] += direction * distance
+        self.ghost_piece = self.get_ghost_piece()
+        self.current_spin_type = None
+        if self.is_on_ground:
+            self.reset_lock_delay()
+        self._on_move()
+        return distance
+
+    def hold_piece(self):
+        """現在のピースをホールドする"""
+        if self.game_over or self.paused or not self.current_piece or not self.can_hold:
+            return
+
+        self._on_hold()
+
+        # 初回ホールドの場合
+        if self.held_piece is None:
+            self.held_piece = {
+                "shape": [
+                    row[:] for row in TETROMINOS[self.current_piece["index"]]["shape"]
+                ],
+                "color": self.get_block_color(self.current_piece["index"]),
+                "index": self.current_piece["index"],
+                "rotation": 0,
+            }
+            # 次のピースを取得
+            self.current_piece = self.next_pieces.pop(0)
+            self.next_pieces.append(self.get_next_piece())
+        else:
+            # ホールドピースと現在のピースを交換
+            temp = self.held_piece
+            self.held_piece = {
+                "shape": [
+                    row[:] for row in TETROMINOS[self.current_piece["index"]]["shape"]
+                ],
+                "color": self.get_block_color(self.current_piece["index"]),
+                "index": self.current_piece["index"],
+                "rotation": 0,
+            }
+            self.current_piece = {
+                "shape": [row[:] for row in TETROMINOS[temp["index"]]["shape"]],
+                "color": self.get_block_color(temp["index"]),
+                "x": GRID_WIDTH // 2 - len(TETROMINOS[temp["index"]]["shape"][0]) // 2,
+                "y": 0,
+                "rotation": 0,
+                "index": temp["index"],
+            }
+
+        # ホールド使用フラグを設定
+        self.can_hold = False
+        self.has_used_hold = True
+
+        # ゴーストピースの更新
+        self.ghost_piece = self.get_ghost_piece()
+
+    def drop(self):
+        """ピースを一番下まで落とす（ハードドロップ）"""
+        if self.game_over or self.paused or not self.current_piece:
+            return
+
+        # 落下距離を計算（スコア計算用）
+        drop_distance = 0
+
+        # 可能な限り下に移動
+        while self.valid_move(self.current_piece, y_offset=1):
+            self.current_piece["y"] += 1
+            drop_distance += 1
+
+        # ハードドロップボーナス（2点/セル）
+        self.score += drop_distance * 2
+
+        # ピースを固定
+        self.lock_piece()
+
+    def lock_piece(self):
+        """現在のピースをグリッドに固定する"""
+        # ピースが存在しない場合は何もしない
+        if not self.current_piece:
+            return
+
+        # スピンチェックは回転時に既に実行済みなので、ここでは再実行しない
+        # current_spin_typeの値をそのまま使用
+
+        # 現在のピースをグリッドに追加
+        for y, row in enumerate(self.current_piece["shape"]):
+            for x, cell in enumerate(row):
+                if cell:
+                    block_grid_y = self.current_piece["y"] + y
+                    block_grid_x = self.current_piece["x"] + x
+
+                    # グリッド範囲内かチェック
+                    if (
+                        0 <= block_grid_y < GRID_HEIGHT
+                        and 0 <= block_grid_x < GRID_WIDTH
+                    ):
+                        self.grid[block_grid_y][block_grid_x] = self.current_piece[
+                            "color"
+                        ]
+                        self._on_block_placed(
+                            block_grid_x, block_grid_y, self.current_piece["color"]
+                        )
+
+        self._on_piece_locked()
+
+        # ピース統計の更新
+        self.pieces_stats[self.current_piece["index"]] += 1
+
+        # ラインクリアチェック
+        self.check_lines()
+
+        # 修正：ロックディレイシステムをリセット
+        self.lock_delay = 0
+        self.lock_delay_resets = 0
+        self.is_on_ground = False
+        self.last_move_reset_lock = False
+        self.has_ever_been_grounded = False
+
+        # ホールドリセット
+        self.can_hold = True
+
+        # 次のピースを取得
+        self.current_piece = self.next_pieces.pop(0)
+        self.next_pieces.append(self.get_next_piece())
+
+        # スピン状態をリセット
+        self.current_spin_type = None
+
+        # ゴーストピースの更新
+        self.ghost_piece = self.get_ghost_piece()
+
+        # ゲームオーバーチェック（新しいピースが配置できない場合）
+        if not self.valid_move(self.current_piece):
+            self.game_over = True
+            self._on_game_over()
+
+    def check_lines(self):
+        """完成したラインをチェックして消去する"""
+        lines_to_clear = []
+        for y in range(GRID_HEIGHT):
+            if all(cell is not None for cell in self.grid[y]):
+                lines_to_clear.append(y)
+
+        lines_count = len(lines_to_clear)
+        # オンライン対戦用のライン消去数を記録
+        self.lines_cleared_this_frame = lines_count
+
+        if lines_count == 0:
+            # ラインが消去されない場合はコンボをリセット
+            self.combo = 0
+            return
+
+        # スコア計算
+        # スピンボーナス
+        spin_bonus = 0
+        if self.current_spin_type:
+            self.spin_count[self.current_spin_type] += 1
+
+            # スピンタイプ別ボーナス
+            if self.current_spin_type == "T-Spin":
+                spin_bonus = 400 * self.level
+            elif self.current_spin_type == "I-Spin":
+                spin_bonus = 300 * self.level
+            elif self.current_spin_type in ["J-Spin", "L-Spin"]:
+                spin_bonus = 250 * self.level
+            elif self.current_spin_type in ["S-Spin", "Z-Spin"]:
+                spin_bonus = 200 * self.level
+
+        # ライン消去ボーナス
+        line_bonus = 0
+        if lines_count == 1:
+            line_bonus = 100 * self.level
+        elif lines_count == 2:
+            line_bonus = 300 * self.level
+        elif lines_count == 3:
+            line_bonus = 500 * self.level
+        elif lines_count == 4:
+            line_bonus = 800 * self.level
+
+        # 合計スコア
+        self.score += line_bonus + spin_bonus
+
+        # 対戦用の攻撃力
+        self.pending_attack += calculate_attack(lines_count, self.current_spin_type)
+
+        # コンボボーナス
+        self.combo += 1
+        if self.combo > 1:
+            combo_bonus = 50 * self.combo * self.level
+            self.score += combo_bonus
+
+        # レベルアップ処理
+        self.lines_cleared += lines_count
+        old_level = self.level
+        self.level = self.lines_cleared // 10 + 1
+        if self.level > old_level:
+            # 落下速度の更新
+            self.fall_speed = max(0.05, 1 - ((self.level - 1) * 0.05))
+
+        # 消去前のグリッドでエフェクトを出せるよう、置き換え前に通知
+        self._on_lines_cleared(lines_to_clear, self.level > old_level)
+
+        # 改善: 一時的なグリッドを作成して、ラインクリア後の状態を正確に計算
+        new_grid = []
+        # 消去されないラインだけを新しいグリッドに追加
+        for y in range(GRID_HEIGHT):
+            if y not in lines_to_clear:
+                new_grid.append(self.grid[y])
+
+        # 消去されたライン数だけ上に空のラインを追加
+        for _ in range(lines_count):
+            new_grid.insert(0, [None for _ in range(GRID_WIDTH)])
+
+        # 新しいグリッドで置き換え
+        self.grid = new_grid
+
+        # スプリントモードのクリア条件チェック
+        if self.game_mode == "sprint" and self.lines_cleared >= self.lines_target:
+            self.game_clear = True
+
+    def add_garbage_lines(self, count, hole_col):
+        """最下段にガベージラインを追加する（hole_col の列だけ空ける）"""
+        if not 0 <= hole_col < GRID_WIDTH:
+            raise ValueError(f"ガベージの穴の列が範囲外です: {hole_col}")
+        if count <= 0:
+            return
+
+        # 盤面の高さを超える分はガベージ自体が上からあふれるのでゲームオーバー
+        overflow = count > GRID_HEIGHT
+        count = min(count, GRID_HEIGHT)
+
+        # 行単位でずらす（上からあふれる行にブロックがあればゲームオーバー）
+        overflow = overflow or any(cell is not None for row in self.grid[:count] for cell in row)
+        del self.grid[:count]
+        for _ in range(count):
+            row = [GARBAGE_COLOR] * GRID_WIDTH
+            row[hole_col] = None
+            self.grid.append(row)
+
+        # 押し上げで操作中のピースが埋まったら、重ならない位置までピースも押し上げる
+        if self.current_piece:
+            lifted = 0
+            while lifted < count and not self.valid_move(self.current_piece):
+                self.current_piece["y"] -= 1
+                lifted += 1
+
+        # ゴーストピースの更新
+        self.ghost_piece = self.get_ghost_piece()
+
+        if overflow and not self.game_over:
+            self.game_over = True
+            self._on_game_over()
+
+    def add_random_garbage(self, count):
+        """穴位置をガベージ用の乱数で決めてガベージラインを追加する（同じ攻撃の穴は揃える）"""
+        self.add_garbage_lines(count, self.garbage.next_hole())
+
+    def update(self, dt):
+        """ゲームの状態を更新する"""
+        if self.game_over or self.paused:
+            return
+
+        # フレーム毎の初期化
+        self.lines_cleared_this_frame = 0
+
+        # ゲーム時間の更新
+        self.time_played += dt
+
+        # 時間制限のチェック（ウルトラモード）
+        if self.time_limit and self.time_played >= self.time_limit:
+            self.game_over = True
+            return
+
+        # 落下処理
+        self.fall_time += dt
+        fall_speed = self.fall_speed / (
+            1 + (self.soft_drop * 9)
+        )  # ソフトドロップで10倍速く
+
+        # 修正：接地状態の更新
+        was_on_ground = self.is_on_ground
+        self.is_on_ground = self.is_piece_on_ground()
+
+        # 新しく接地した場合のみ、ロックディレイリセット回数をリセット
+        if not was_on_ground and self.is_on_ground:
+            # 初回接地時のみリセット回数をリセット
+            first_contact = not self.has_ever_been_grounded
+            if first_contact:
+                self.lock_delay_resets = 0
+                self.has_ever_been_grounded = True
+            self._on_grounded(first_contact)
+            self.last_move_reset_lock = False
+
+        if self.fall_time >= fall_speed:
+            self.fall_time = 0
+            # 下に移動できるかチェック
+            if self.valid_move(self.current_piece, y_offset=1):
+                self.current_piece["y"] += 1
+                # 自然落下時のみロックディレイをリセット（リセット回数は保持）
+                if not self.is_on_ground:
+                    self.lock_delay = 0
+                    # リセット回数は保持（一度接地したピースの延命回数を維持）
+            else:
+                # 修正：接地している場合、ロックディレイを増加
+                if self.is_on_ground:
+                    self.lock_delay += dt
+
+                    # レベルに応じたロックディレイの調整
+                    adjusted_lock_delay = self.max_lock_delay
+                    if self.level >= 20:
+                        adjusted_lock_delay = max(
+                            0.1, self.max_lock_delay - (self.level - 20) * 0.01
+                        )
+
+                    # ロックディレイが最大値に達した場合、ピースを固定
+                    if self.lock_delay >= adjusted_lock_delay:
+                        self.lock_piece()
+
+        # 接地状態でもロックディレイを進める（移動やローテーション後の処理用）
+        elif not self.valid_move(self.current_piece, y_offset=1):
+            self.lock_delay += dt
+            if self.lock_delay >= self.max_lock_delay:
+                self.lock_piece()
+
+    def apply_action(self, action, **kwargs):
+        """アクション（GameAction の値）をエンジンに適用する"""
+        if action == "move_left":
+            self.move(-1)
+        elif action == "move_right":
+            self.move(1)
+        elif action == "rotate_cw":
+            self.rotate(True)
+        elif action == "rotate_ccw":
+            self.rotate(False)
+        elif action == "soft_drop":
+            self.soft_drop = True
+        elif action == "soft_drop_end":
+            self.soft_drop = False
+        elif action == "hard_drop":
+            self.drop()
+        elif action == "hold":
+            self.hold_piece()
+        elif action == "garbage":
+            # 穴位置はガベージ用の乱数で決める（共有シードなので相手側でも一致する）。
+            # 入力に穴位置が含まれていても使わない
+            self.add_random_garbage(kwargs.get("lines", 1))
+
+    def step(self, actions=()):
+        """固定ティックを1つ進める（そのティックの入力を先に適用する）"""
+        for action, data in actions:
+            self.apply_action(action, **data)
+        self.update(TICK_DT)
+        self.tick += 1
+
+    def snapshot(self):
+        """ロールバック用に現在の状態を保存する"""
+        state = {
+            key: _copy_value(value)
+            for key, value in self.__dict__.items()
+            if key not in self.SNAPSHOT_EXCLUDE
+        }
+        state["rng"] = self.rng.getstate()
+        state["garbage"] = self.garbage.getstate()
+        return state
+
+    def restore(self, state):
+        """snapshot() で保存した状態に戻す（同じスナップショットを何度でも使える）"""
+        for key, value in state.items():
+            if key == "rng":
+                self.rng.setstate(value)
+            elif key == "garbage":
+                self.garbage.setstate(value)
+            else:
+                setattr(self, key, _copy_value(value))
+
+    def get_state(self):
+        """盤面の要約を返す（対戦相手表示・サーバー配信用）"""
+        piece = self.current_piece
+        return {
+            "grid": self.grid,
+            "score": self.score,
+            "level": self.level,
+            "lines_cleared": self.lines_cleared,
+            "current_piece": {
+                "shape": piece["shape"] if piece else None,
+                "x": piece["x"] if piece else 0,
+                "y": piece["y"] if piece else 0,
+                "color": piece["color"] if piece else None,
+            },
+            "game_over": self.game_over,
+            "tick": self.tick,
+        }
+
+    # ----------------------------------------------------------------
+    # フック（サブクラスで音声・エフェクトを実装する）
+    # ----------------------------------------------------------------
+    def _on_move(self):
+        """ピースが移動した"""
+
+    def _on_rotate(self):
+        """回転操作が行われた"""
+
+    def _on_hold(self):
+        """ホールド操作が行われた"""
+
+    def _on_block_placed(self, x, y, color):
+        """ブロックが1つグリッドに固定された"""
+
+    def _on_piece_locked(self):
+        """ピースの固定が完了した"""
+
+    def _on_lines_cleared(self, lines_to_clear, leveled_up):
+        """ラインが消去される（グリッド置き換え前に呼ばれる）"""
+
+    def _on_grounded(self, first_contact):
+        """ピースが接地した"""
+
+    def _on_game_over(self):
+        """ゲームオーバーになった"""
+
+
+class AttackQueue:
+    """到着時刻つきのガベージの待ち行列
+
+    エントリは [到着時刻, ライン数] で到着順に並ぶ（時刻はティックでも秒でもよい）。
+    相殺は先頭（最も古い攻撃）から行うので償却 O(1)、到着の判定も先頭を見るだけで、
+    フレームごとに全エントリの残り時間を減らす必要はない。合計ライン数は total で持つ。
+    """
+
+    def __init__(self, entries=()):
+        self.entries = deque()
+        self.total = 0
+        for due, lines in entries:
+            self.push(due, lines)
+
+    def push(self, due, lines):
+        """攻撃を追加する"""
+        if lines <= 0:
+            return
+        entries = self.entries
+        if not entries or entries[-1][0] <= due:
+            entries.append([due, lines])
+        else:
+            # 到着時刻が前後した（ネットワーク越しの予告など）：後ろから挿入位置を探す
+            index = len(entries)
+            while index > 0 and entries[index - 1][0] > due:
+                index -= 1
+            entries.insert(index, [due, lines])
+        self.total += lines
+
+    def cancel(self, lines):
+        """古い攻撃から lines ライン分を相殺し、相殺しきれなかった残りを返す"""
+        entries = self.entries
+        while lines > 0 and entries:
+            head = entries[0]
+            amount = min(lines, head[1])
+            head[1] -= amount
+            self.total -= amount
+            lines -= amount
+            if head[1] <= 0:
+                entries.popleft()
+        return lines
+
+    def pop_due(self, now):
+        """now までに到着した攻撃のライン数を到着順に取り出す"""
+        arrived = []
+        entries = self.entries
+        while entries and entries[0][0] <= now:
+            _, lines = entries.popleft()
+            self.total -= lines
+            arrived.append(lines)
+        return arrived
+
+    def remaining(self, now, limit=None):
+        """[到着までの残り時間, ライン数] のリスト（表示用、limit 件まで）"""
+        result = []
+        for due, lines in self.entries:
+            if limit is not None and len(result) >= limit:
+                break
+            result.append([due - now, lines])
+        return result
+
+    def copy(self):
+        queue = AttackQueue()
+        queue.entries = deque([due, lines] for due, lines in self.entries)
+        queue.total = self.total
+        return queue
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"AttackQueue({list(self.entries)!r})"
+
+
+class VersusMatch:
+    """対戦の決定的シミュレーション（ガベージのやり取りを含む）
+
+    全員の入力列が同じなら、どの端末で実行しても同じ結果になる。
+    攻撃の相殺と送信は全員分をまとめて処理するため、プレイヤーの並び順にも依存しない。
+    """
+
+    def __init__(self, engines, attack_delay_ticks=ATTACK_DELAY_TICKS):
+        self.engines = engines
+        self.attack_delay_ticks = attack_delay_ticks
+        # プレイヤーごとの受信予定ガベージ（到着時刻はティック）
+        self.incoming = [AttackQueue() for _ in engines]
+        self.tick = 0
+
+    def step(self, inputs):
+        """全員の入力（プレイヤー順のリスト）を適用して1ティック進める"""
+        attacks = []
+        for engine, actions in zip(self.engines, inputs):
+            engine.step(actions)
+            attacks.append(engine.pending_attack)
+            engine.pending_attack = 0
+
+        # 先に全員分の相殺を行い、その後で残りを相手に送る
+        remaining = [self._cancel_incoming(i, attack) for i, attack in enumerate(attacks)]
+        for i, attack in enumerate(remaining):
+            if attack <= 0:
+                continue
+            for j in range(len(self.engines)):
+                if j != i:
+                    self.incoming[j].push(self.tick + self.attack_delay_ticks, attack)
+
+        # 到着したガベージを適用
+        for index, queue in enumerate(self.incoming):
+            for lines in queue.pop_due(self.tick):
+                self._deliver_garbage(index, lines)
+
+        self.tick += 1
+
+    def _deliver_garbage(self, index, lines):
+        """到着したガベージを盤面に追加する（サブクラスで配送方法を変更できる）"""
+        engine = self.engines[index]
+        if not engine.game_over:
+            engine.add_random_garbage(lines)
+
+    def _cancel_incoming(self, index, attack):
+        """受信予定のガベージを古い順に相殺し、残りの攻撃力を返す"""
+        return self.incoming[index].cancel(attack)
+
+    def pending_garbage(self, index):
+        """受信予定のガベージ [残りティック, ライン数] のリスト"""
+        return self.incoming[index].remaining(self.tick)
+
+    def get_winner(self):
+        """勝者のインデックス（決着していなければ None）"""
+        alive = [i for i, engine in enumerate(self.engines) if not engine.game_over]
+        if len(alive) == 1:
+            return alive[0]
+        return None
+
+    def snapshot(self):
+        """全員の状態とガベージキューを保存する"""
+        return {
+            "engines": [engine.snapshot() for engine in self.engines],
+            "incoming": [queue.copy() for queue in self.incoming],
+            "tick": self.tick,
+        }
+
+    def restore(self, state):
+        """snapshot() で保存した状態に戻す"""
+        for engine, engine_state in zip(self.engines, state["engines"]):
+            engine.restore(engine_state)
+        self.incoming = [queue.copy() for queue in state["incoming"]]
+        self.tick = state["tick"]
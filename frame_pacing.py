@@ -0,0 +1,134 @@
+# フレームの進め方（シミュレーションと描画の分離・描画レートの指定）
+#
+# 既定の "lockstep" では従来どおり 60fps で入力・更新・描画を1回ずつ行う。
+# "fixed" ではゲームのルール（落下・ロックディレイなど）を固定の刻み（sim_rate）で進め、
+# 描画は render_mode に従う。描画が遅れても経過時間分の刻みをまとめて進めるため、
+# 落下やロックディレイの時間がフレームの長さに左右されない。キー入力は届いた時刻を含む
+# 刻みの直前に適用するため（step_ends）、描画が遅れても入力とルールの順序は入れ替わらない。
+#   render_mode "fixed": render_fps で描画、"uncapped": 上限なし、"vsync": 垂直同期に合わせる
+#
+# フレームを待つ間も短い間隔でイベントを取り出し、キー入力に届いた時刻を付けるため、
+# 待ちの間キューに溜まっていた時間も入力遅延の計測や DAS の計算に含まれる。
+#
+# 設定（settings.json）: loop_mode, sim_rate, render_mode, render_fps
+import math
+from typing import List
+
+import pygame
+
+# フレームの進め方
+LOOP_MODES = ("lockstep", "fixed")
+
+# 描画レートの指定
+RENDER_MODES = ("fixed", "uncapped", "vsync")
+
+# 固定刻みのシミュレーションレート（回/秒）
+DEFAULT_SIM_RATE = 240
+
+# lockstep と render_mode "fixed" の描画レート
+DEFAULT_RENDER_FPS = 60
+
+# 1フレームで進める時間の上限（秒）。ウィンドウのドラッグなどで止まった後に
+# 大量の刻みを一度に進めて、さらに遅れるのを防ぐ
+MAX_FRAME_TIME = 0.25
+
+# フレームを待つ間にイベントを取り出す間隔（ミリ秒）
+EVENT_POLL_INTERVAL = 2
+
+# 届いた時刻を付けるイベント
+STAMPED_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+
+
+class FramePacer:
+    """フレームの待ち時間とシミュレーションの刻み数の計算
+
+    tick でフレームの間隔を空けて経過時間を返し、fixed_step のときは advance で
+    経過時間を溜めて sim_dt ごとの刻み数を返す。溜まった端数は次のフレームに持ち越し、
+    alpha（端数 / sim_dt）は描画時点が最後の刻みからどれだけ進んでいるかを表す。
+    イベントは tick の待ちの間に取り出して溜めておき、take_events で受け取る。
+    """
+
+    def __init__(self, loop_mode: str = "lockstep", sim_rate: float = DEFAULT_SIM_RATE,
+                 render_mode: str = "fixed", render_fps: int = DEFAULT_RENDER_FPS):
+        self.loop_mode = loop_mode if loop_mode in LOOP_MODES else "lockstep"
+        self.render_mode = render_mode if render_mode in RENDER_MODES else "fixed"
+        self.sim_dt = 1 / max(1, sim_rate)
+        self.render_fps = render_fps
+        self.accumulator = 0.0
+        self.last_frame = pygame.time.get_ticks()
+        self.events: List[pygame.event.Event] = []
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "FramePacer":
+        return cls(settings.get("loop_mode", "lockstep"),
+                   settings.get("sim_rate", DEFAULT_SIM_RATE),
+                   settings.get("render_mode", "fixed"),
+                   settings.get("render_fps", DEFAULT_RENDER_FPS))
+
+    @property
+    def fixed_step(self) -> bool:
+        """ルールを固定の刻みで進めるか"""
+        return self.loop_mode == "fixed"
+
+    @property
+    def frame_rate(self) -> int:
+        """tick で待つ描画レート（0 は待たない）"""
+        if not self.fixed_step:
+            return DEFAULT_RENDER_FPS
+        if self.render_mode == "fixed":
+            return self.render_fps
+        # uncapped は待たない。vsync は flip が垂直同期を待つ（その間はイベントを取り出せない）
+        return 0
+
+    def tick(self) -> float:
+        """次のフレームまで待ち、前のフレームからの経過時間（秒）を返す"""
+        fps = self.frame_rate
+        if fps > 0:
+            deadline = self.last_frame + 1000 / fps
+            while True:
+                self.poll_events()
+                remaining = deadline - pygame.time.get_ticks()
+                if remaining <= 0:
+                    break
+                pygame.time.wait(min(EVENT_POLL_INTERVAL, math.ceil(remaining)))
+
+        now = pygame.time.get_ticks()
+        dt = (now - self.last_frame) / 1000.0
+        self.last_frame = now
+        return dt
+
+    def poll_events(self):
+        """届いているイベントを取り出して溜める（キー入力には届いた時刻をミリ秒で付ける）"""
+        now = pygame.time.get_ticks()
+        for event in pygame.event.get():
+            if event.type in STAMPED_EVENTS and getattr(event, "timestamp", None) is None:
+                event.timestamp = now
+            self.events.append(event)
+
+    def take_events(self) -> List[pygame.event.Event]:
+        """前のフレームからのイベントを届いた順に受け取る"""
+        self.poll_events()
+        events, self.events = self.events, []
+        return events
+
+    def advance(self, dt: float) -> int:
+        """dt を溜めて、このフレームで進めるシミュレーションの刻み数を返す"""
+        self.accumulator += min(dt, MAX_FRAME_TIME)
+        steps = int(self.accumulator / self.sim_dt)
+        self.accumulator -= steps * self.sim_dt
+        return steps
+
+    def step_ends(self, dt: float, now: float) -> List[float]:
+        """advance と同じく dt を溜め、このフレームで進める刻みそれぞれの終わりの時刻（秒）を返す
+
+        刻みは now で終わるフレームの経過時間を前から順に区切ったもので、最後の刻みの
+        終わりは now から端数（accumulator）だけ前になる。この時刻までに届いた入力を
+        その刻みの前に適用する。
+        """
+        start = now - self.accumulator - min(dt, MAX_FRAME_TIME)
+        return [start + (index + 1) * self.sim_dt for index in range(self.advance(dt))]
+
+    @property
+    def alpha(self) -> float:
+        """最後の刻みから描画時点までの進み（0〜1）"""
+        return self.accumulator / self.sim_dt
@@ -18,6 +18,9 @@ const (
 	MessageConnect      = "connect"
 	MessageDisconnect   = "disconnect"
 	MessageHeartbeat    = "heartbeat"
+	MessagePing         = "ping"
+	MessagePong         = "pong"
+	MessageBatch        = "batch"
 	MessageCreateRoom   = "create_room"
 	MessageJoinRoom     = "join_room"
 	MessageLeaveRoom    = "leave_room"
@@ -273,11 +276,40 @@ func (s *TetrisServer) processMessage(player *Player, message *Message) error {
 	case MessageHeartbeat:
 		// Heartbeat is automatically handled by updating LastHeartbeat
 		return nil
+	case MessagePing:
+		return s.handlePing(player, message.Data, time.Now())
+	case MessageBatch:
+		return s.handleBatch(player, message.Data)
 	default:
 		return s.sendError(player, "UNKNOWN_MESSAGE", fmt.Sprintf("不明なメッセージタイプ: %s", message.Type))
 	}
 }
 
+// Handle batch message (messages produced in one client tick)
+func (s *TetrisServer) handleBatch(player *Player, data map[string]interface{}) error {
+	items, _ := data["messages"].([]interface{})
+	for _, item := range items {
+		fields, ok := item.(map[string]interface{})
+		if !ok {
+			continue
+		}
+		msgType, _ := fields["type"].(string)
+		if msgType == "" || msgType == MessageBatch {
+			continue
+		}
+		message := &Message{Type: msgType}
+		message.Timestamp, _ = fields["timestamp"].(float64)
+		message.Data, _ = fields["data"].(map[string]interface{})
+		if message.Data == nil {
+			message.Data = map[string]interface{}{}
+		}
+		if err := s.processMessage(player, message); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
 // Handle connect message
 func (s *TetrisServer) handleConnect(player *Player, data map[string]interface{}) error {
 	if name, ok := data["player_name"].(string); ok {
@@ -302,6 +334,22 @@ func (s *TetrisServer) handleConnect(player *Player, data map[string]interface{}
 	return s.sendMessage(player, response)
 }
 
+// Handle ping (reply with NTP-style timestamps, see network/clock.py)
+func (s *TetrisServer) handlePing(player *Player, data map[string]interface{}, receivedAt time.Time) error {
+	response := &Message{
+		Type:      MessagePong,
+		Timestamp: float64(time.Now().UnixNano()) / 1e9,
+		Data: map[string]interface{}{
+			"ping_id":             data["ping_id"],
+			"client_time":         data["client_time"],
+			"server_receive_time": float64(receivedAt.UnixNano()) / 1e9,
+			"server_send_time":    float64(time.Now().UnixNano()) / 1e9,
+		},
+	}
+
+	return s.sendMessage(player, response)
+}
+
 // Handle disconnect message
 func (s *TetrisServer) handleDisconnect(player *Player) error {
 	player.Connected = false
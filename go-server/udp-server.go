@@ -17,6 +17,9 @@ const (
 	MessageConnect      = "connect"
 	MessageDisconnect   = "disconnect"
 	MessageHeartbeat    = "heartbeat"
+	MessageAck          = "ack"
+	MessagePing         = "ping"
+	MessagePong         = "pong"
 	MessageCreateRoom   = "create_room"
 	MessageJoinRoom     = "join_room"
 	MessageLeaveRoom    = "leave_room"
@@ -37,18 +40,331 @@ type Message struct {
 	Data      map[string]interface{} `json:"data"`
 	PlayerID  string                 `json:"player_id,omitempty"`
 	Sequence  uint32                 `json:"sequence,omitempty"`
+
+	// Reliability header (see network/reliability.py)
+	Ack              uint32  `json:"ack,omitempty"`
+	AckBits          uint32  `json:"ack_bits,omitempty"`
+	ReliableSequence *uint32 `json:"reliable_sequence,omitempty"`
+}
+
+// Reliability settings (same values as network/reliability.py)
+const (
+	ackBitCount       = 32
+	initialRTO        = 500 * time.Millisecond
+	minRTO            = 50 * time.Millisecond
+	maxRTO            = 2 * time.Second
+	maxRetries        = 10
+	ackDelay          = 20 * time.Millisecond
+	maxOutOfOrder     = 256
+	reliabilityPeriod = 10 * time.Millisecond
+)
+
+// sequenceGreater reports whether a is newer than b (wrap-around aware)
+func sequenceGreater(a, b uint32) bool {
+	return a != b && a-b < 1<<31
+}
+
+// isLatestWins reports whether only the newest message of its kind matters
+func isLatestWins(message *Message) bool {
+	// Ping/pong are never retransmitted (a retransmit would distort RTT)
+	if message.Type == MessageHeartbeat || message.Type == MessagePing || message.Type == MessagePong {
+		return true
+	}
+	if message.Type == MessageGameState {
+		event, _ := message.Data["event"].(string)
+		return event == "game_state" || event == "authoritative_state"
+	}
+	return false
+}
+
+type sentPacket struct {
+	sentAt      time.Time
+	reliableSeq *uint32
+	retransmit  bool
+}
+
+type pendingMessage struct {
+	message *Message
+	sentAt  time.Time
+	retries int
+	rto     time.Duration
+}
+
+// ReliableChannel tracks acks, retransmission and ordering for one peer
+type ReliableChannel struct {
+	mu sync.Mutex
+
+	localSequence        uint32
+	nextReliableSequence uint32
+	sentPackets          map[uint32]sentPacket
+	pending              map[uint32]*pendingMessage
+
+	remoteSequence   uint32
+	hasRemote        bool
+	ackBits          uint32
+	expectedReliable uint32
+	outOfOrder       map[uint32]*Message
+	latest           map[string]uint32
+	ackPendingSince  time.Time
+
+	srtt   time.Duration
+	rttvar time.Duration
+	hasRTT bool
+	rto    time.Duration
+
+	Retransmissions int
+	Failed          bool
+}
+
+// NewReliableChannel creates a channel with initial RTO
+func NewReliableChannel() *ReliableChannel {
+	return &ReliableChannel{
+		sentPackets: make(map[uint32]sentPacket),
+		pending:     make(map[uint32]*pendingMessage),
+		outOfOrder:  make(map[uint32]*Message),
+		latest:      make(map[string]uint32),
+		rto:         initialRTO,
+	}
+}
+
+// Prepare stamps a copy of the message with sequence and ack header
+func (c *ReliableChannel) Prepare(message *Message) *Message {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+
+	now := time.Now()
+	packet := *message
+	packet.ReliableSequence = nil
+	if !isLatestWins(message) {
+		seq := c.nextReliableSequence
+		c.nextReliableSequence++
+		packet.ReliableSequence = &seq
+		stored := packet
+		c.pending[seq] = &pendingMessage{message: &stored, sentAt: now, rto: c.rto}
+	}
+	c.stamp(&packet, now, false)
+	return &packet
+}
+
+// stamp sets packet sequence and ack fields (caller holds lock)
+func (c *ReliableChannel) stamp(packet *Message, now time.Time, retransmit bool) {
+	c.localSequence++
+	packet.Sequence = c.localSequence
+	if c.hasRemote {
+		packet.Ack = c.remoteSequence
+		packet.AckBits = c.ackBits
+	}
+	c.ackPendingSince = time.Time{}
+
+	if packet.Type != MessageAck {
+		c.sentPackets[c.localSequence] = sentPacket{sentAt: now, reliableSeq: packet.ReliableSequence, retransmit: retransmit}
+		delete(c.sentPackets, c.localSequence-ackBitCount*4)
+	}
+}
+
+// Receive processes acks and returns the messages ready for delivery
+func (c *ReliableChannel) Receive(message *Message) []*Message {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+
+	now := time.Now()
+	if message.Ack != 0 {
+		c.processAcks(message.Ack, message.AckBits, now)
+	}
+
+	if message.Sequence == 0 {
+		// Peer without reliability layer
+		return []*Message{message}
+	}
+
+	if message.Type == MessageConnect && message.ReliableSequence != nil && *message.ReliableSequence == 0 {
+		// Reconnect from the same address starts a new session
+		c.hasRemote = false
+		c.ackBits = 0
+		c.expectedReliable = 0
+		c.outOfOrder = make(map[uint32]*Message)
+		c.latest = make(map[string]uint32)
+	}
+
+	if message.ReliableSequence != nil {
+		ahead := *message.ReliableSequence - c.expectedReliable
+		if ahead >= maxOutOfOrder && ahead < 1<<31 {
+			// Does not fit the reorder buffer: do not ack, wait for retransmit
+			return nil
+		}
+	}
+
+	if !c.recordReceived(message.Sequence) {
+		if message.ReliableSequence != nil && c.ackPendingSince.IsZero() {
+			c.ackPendingSince = now
+		}
+		return nil
+	}
+
+	if message.Type == MessageAck {
+		return nil
+	}
+
+	if message.ReliableSequence == nil {
+		event, _ := message.Data["event"].(string)
+		key := message.Type + "/" + event
+		if last, ok := c.latest[key]; ok && !sequenceGreater(message.Sequence, last) {
+			return nil
+		}
+		c.latest[key] = message.Sequence
+		return []*Message{message}
+	}
+
+	if c.ackPendingSince.IsZero() {
+		c.ackPendingSince = now
+	}
+
+	seq := *message.ReliableSequence
+	if seq != c.expectedReliable {
+		if sequenceGreater(seq, c.expectedReliable) {
+			c.outOfOrder[seq] = message
+		}
+		return nil
+	}
+
+	delivered := []*Message{message}
+	c.expectedReliable++
+	for {
+		next, ok := c.outOfOrder[c.expectedReliable]
+		if !ok {
+			break
+		}
+		delete(c.outOfOrder, c.expectedReliable)
+		delivered = append(delivered, next)
+		c.expectedReliable++
+	}
+	return delivered
+}
+
+// recordReceived updates ack state and reports whether the packet is new
+func (c *ReliableChannel) recordReceived(sequence uint32) bool {
+	if !c.hasRemote {
+		c.hasRemote = true
+		c.remoteSequence = sequence
+		c.ackBits = 0
+		return true
+	}
+
+	if sequenceGreater(sequence, c.remoteSequence) {
+		shift := sequence - c.remoteSequence
+		if shift > ackBitCount {
+			c.ackBits = 0
+		} else {
+			c.ackBits = uint32((uint64(c.ackBits)<<shift | 1<<(shift-1)) & 0xFFFFFFFF)
+		}
+		c.remoteSequence = sequence
+		return true
+	}
+
+	distance := c.remoteSequence - sequence
+	if distance == 0 || distance > ackBitCount {
+		return false
+	}
+	bit := uint32(1) << (distance - 1)
+	if c.ackBits&bit != 0 {
+		return false
+	}
+	c.ackBits |= bit
+	return true
+}
+
+// processAcks marks acknowledged packets and updates RTT
+func (c *ReliableChannel) processAcks(ack, ackBits uint32, now time.Time) {
+	c.acknowledge(ack, now)
+	for i := uint32(0); i < ackBitCount; i++ {
+		if ackBits&(1<<i) != 0 {
+			c.acknowledge(ack-1-i, now)
+		}
+	}
+}
+
+func (c *ReliableChannel) acknowledge(sequence uint32, now time.Time) {
+	record, ok := c.sentPackets[sequence]
+	if !ok {
+		return
+	}
+	delete(c.sentPackets, sequence)
+	// Karn's algorithm: skip RTT samples from retransmitted packets
+	if !record.retransmit {
+		c.updateRTT(now.Sub(record.sentAt))
+	}
+	if record.reliableSeq != nil {
+		delete(c.pending, *record.reliableSeq)
+	}
+}
+
+func (c *ReliableChannel) updateRTT(sample time.Duration) {
+	if !c.hasRTT {
+		c.hasRTT = true
+		c.srtt = sample
+		c.rttvar = sample / 2
+	} else {
+		diff := c.srtt - sample
+		if diff < 0 {
+			diff = -diff
+		}
+		c.rttvar = (3*c.rttvar + diff) / 4
+		c.srtt = (7*c.srtt + sample) / 8
+	}
+	c.rto = c.srtt + 4*c.rttvar
+	if c.rto < minRTO {
+		c.rto = minRTO
+	}
+	if c.rto > maxRTO {
+		c.rto = maxRTO
+	}
+}
+
+// Poll returns packets to retransmit and a standalone ack if needed
+func (c *ReliableChannel) Poll() []*Message {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+
+	now := time.Now()
+	var packets []*Message
+	for _, pending := range c.pending {
+		if now.Sub(pending.sentAt) < pending.rto {
+			continue
+		}
+		if pending.retries >= maxRetries {
+			c.Failed = true
+			continue
+		}
+		pending.retries++
+		pending.sentAt = now
+		pending.rto *= 2
+		if pending.rto > maxRTO {
+			pending.rto = maxRTO
+		}
+		c.Retransmissions++
+		packet := *pending.message
+		c.stamp(&packet, now, true)
+		packets = append(packets, &packet)
+	}
+
+	if !c.ackPendingSince.IsZero() && now.Sub(c.ackPendingSince) >= ackDelay {
+		ack := &Message{Type: MessageAck, Timestamp: float64(now.UnixNano()) / 1e9}
+		c.stamp(ack, now, false)
+		packets = append(packets, ack)
+	}
+	return packets
 }
 
 // Player structure for UDP
 type UDPPlayer struct {
-	ID           string           `json:"id"`
-	Name         string           `json:"name"`
-	Addr         *net.UDPAddr     `json:"-"`
-	RoomID       string           `json:"room_id"`
-	Connected    bool             `json:"connected"`
-	LastSeen     time.Time        `json:"-"`
-	LastSequence uint32           `json:"-"`
-	mu           sync.RWMutex     `json:"-"`
+	ID        string           `json:"id"`
+	Name      string           `json:"name"`
+	Addr      *net.UDPAddr     `json:"-"`
+	RoomID    string           `json:"room_id"`
+	Connected bool             `json:"connected"`
+	LastSeen  time.Time        `json:"-"`
+	Channel   *ReliableChannel `json:"-"`
+	mu        sync.RWMutex     `json:"-"`
 }
 
 // Room structure (same as TCP)
@@ -120,6 +436,7 @@ func (s *UDPTetrisServer) Start() error {
 	go s.packetProcessor()
 	go s.heartbeatLoop()
 	go s.cleanupLoop()
+	go s.reliabilityLoop()
 	
 	return nil
 }
@@ -197,20 +514,16 @@ func (s *UDPTetrisServer) handlePacket(packet *UDPPacket) {
 	player := s.getOrCreatePlayer(packet.Addr)
 	player.LastSeen = time.Now()
 	
-	// Handle sequence numbers for ordering (optional)
-	if message.Sequence != 0 && message.Sequence <= player.LastSequence {
-		log.Printf("古いパケットを無視: Seq=%d, LastSeq=%d", message.Sequence, player.LastSequence)
-		return
-	}
-	player.LastSequence = message.Sequence
-	
-	log.Printf("メッセージ処理開始: Type=%s from Player=%s", message.Type, player.ID)
-	
-	// Process message
-	if err := s.processMessage(player, &message); err != nil {
-		log.Printf("メッセージ処理エラー from %s: %v", packet.Addr, err)
-	} else {
-		log.Printf("メッセージ処理完了: Type=%s", message.Type)
+	// Acks, duplicate removal and ordered delivery
+	for _, delivered := range player.Channel.Receive(&message) {
+		log.Printf("メッセージ処理開始: Type=%s from Player=%s", delivered.Type, player.ID)
+		
+		// Process message
+		if err := s.processMessage(player, delivered); err != nil {
+			log.Printf("メッセージ処理エラー from %s: %v", packet.Addr, err)
+		} else {
+			log.Printf("メッセージ処理完了: Type=%s", delivered.Type)
+		}
 	}
 }
 
@@ -232,6 +545,7 @@ func (s *UDPTetrisServer) getOrCreatePlayer(addr *net.UDPAddr) *UDPPlayer {
 		Addr:      addr,
 		Connected: true,
 		LastSeen:  time.Now(),
+		Channel:   NewReliableChannel(),
 	}
 	
 	s.players[playerID] = player
@@ -249,6 +563,11 @@ func (s *UDPTetrisServer) sendMessage(player *UDPPlayer, message *Message) error
 		return fmt.Errorf("プレイヤーが接続されていません")
 	}
 	
+	return s.writePacket(player, player.Channel.Prepare(message))
+}
+
+// Write a stamped packet to player
+func (s *UDPTetrisServer) writePacket(player *UDPPlayer, message *Message) error {
 	data, err := json.Marshal(message)
 	if err != nil {
 		log.Printf("メッセージ変換エラー: %v", err)
@@ -295,6 +614,8 @@ func (s *UDPTetrisServer) processMessage(player *UDPPlayer, message *Message) er
 		return s.handleChatMessage(player, message.Data)
 	case MessageHeartbeat:
 		return nil // Already handled by updating LastSeen
+	case MessagePing:
+		return s.handlePing(player, message.Data, player.LastSeen)
 	default:
 		return s.sendError(player, "UNKNOWN_MESSAGE", fmt.Sprintf("不明なメッセージタイプ: %s", message.Type))
 	}
@@ -325,6 +646,22 @@ func (s *UDPTetrisServer) handleConnect(player *UDPPlayer, data map[string]inter
 	return s.sendMessage(player, response)
 }
 
+// Handle ping (reply with NTP-style timestamps, see network/clock.py)
+func (s *UDPTetrisServer) handlePing(player *UDPPlayer, data map[string]interface{}, receivedAt time.Time) error {
+	response := &Message{
+		Type:      MessagePong,
+		Timestamp: float64(time.Now().UnixNano()) / 1e9,
+		Data: map[string]interface{}{
+			"ping_id":             data["ping_id"],
+			"client_time":         data["client_time"],
+			"server_receive_time": float64(receivedAt.UnixNano()) / 1e9,
+			"server_send_time":    float64(time.Now().UnixNano()) / 1e9,
+		},
+	}
+
+	return s.sendMessage(player, response)
+}
+
 // Handle disconnect
 func (s *UDPTetrisServer) handleDisconnect(player *UDPPlayer) error {
 	s.disconnectPlayer(player)
@@ -519,21 +856,28 @@ func (s *UDPTetrisServer) handleListRooms(player *UDPPlayer) error {
 	return s.sendMessage(player, response)
 }
 
+// withSender copies all payload fields (tick, lines, ...) and adds the sender
+func withSender(player *UDPPlayer, data map[string]interface{}) map[string]interface{} {
+	forwarded := make(map[string]interface{}, len(data)+2)
+	for key, value := range data {
+		forwarded[key] = value
+	}
+	forwarded["player_id"] = player.ID
+	forwarded["player_name"] = player.Name
+	return forwarded
+}
+
 // Handle player action (high frequency, low latency)
 func (s *UDPTetrisServer) handlePlayerAction(player *UDPPlayer, data map[string]interface{}) error {
 	if player.RoomID == "" {
 		return nil
 	}
 	
-	// Fire and forget for low latency
-	go s.broadcastToRoom(player.RoomID, &Message{
+	// Broadcast synchronously so reliable sequence numbers follow arrival order
+	s.broadcastToRoom(player.RoomID, &Message{
 		Type:      MessagePlayerAction,
 		Timestamp: float64(time.Now().UnixNano()) / 1e9,
-		Data: map[string]interface{}{
-			"player_id":   player.ID,
-			"player_name": player.Name,
-			"action":      data["action"],
-		},
+		Data:      withSender(player, data),
 	}, player.ID)
 	
 	return nil
@@ -545,18 +889,11 @@ func (s *UDPTetrisServer) handleGameState(player *UDPPlayer, data map[string]int
 		return nil
 	}
 	
-	// Fire and forget for low latency
-	go s.broadcastToRoom(player.RoomID, &Message{
+	// Broadcast synchronously so reliable sequence numbers follow arrival order
+	s.broadcastToRoom(player.RoomID, &Message{
 		Type:      MessageGameState,
 		Timestamp: float64(time.Now().UnixNano()) / 1e9,
-		Data: map[string]interface{}{
-			"player_id":   player.ID,
-			"player_name": player.Name,
-			"event":       data["event"],
-			"grid":        data["grid"],
-			"score":       data["score"],
-			"level":       data["level"],
-		},
+		Data:      withSender(player, data),
 	}, player.ID)
 	
 	return nil
@@ -612,10 +949,11 @@ func (s *UDPTetrisServer) broadcastToRoom(roomID string, message *Message, exclu
 	}
 	s.roomMutex.RUnlock()
 	
-	// Send to all players concurrently for minimum latency
+	// Stamp in order (reliable sequence), then send to all players concurrently for minimum latency
 	for _, player := range players {
+		packet := player.Channel.Prepare(message)
 		go func(p *UDPPlayer) {
-			if err := s.sendMessage(p, message); err != nil {
+			if err := s.writePacket(p, packet); err != nil {
 				log.Printf("ブロードキャスト送信エラー (Player %s): %v", p.ID, err)
 			}
 		}(player)
@@ -669,6 +1007,37 @@ func (s *UDPTetrisServer) heartbeatLoop() {
 	}
 }
 
+// Reliability loop (retransmit unacked messages and send standalone acks)
+func (s *UDPTetrisServer) reliabilityLoop() {
+	ticker := time.NewTicker(reliabilityPeriod)
+	defer ticker.Stop()
+	
+	for {
+		select {
+		case <-ticker.C:
+			s.playerMutex.RLock()
+			players := make([]*UDPPlayer, 0, len(s.players))
+			for _, player := range s.players {
+				players = append(players, player)
+			}
+			s.playerMutex.RUnlock()
+			
+			for _, player := range players {
+				for _, packet := range player.Channel.Poll() {
+					s.writePacket(player, packet)
+				}
+				if player.Channel.Failed {
+					log.Printf("再送の上限に達しました: Player=%s", player.ID)
+					s.disconnectPlayer(player)
+				}
+			}
+			
+		case <-s.quit:
+			return
+		}
+	}
+}
+
 // Cleanup loop
 func (s *UDPTetrisServer) cleanupLoop() {
 	ticker := time.NewTicker(5 * time.Minute)
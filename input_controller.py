@@ -0,0 +1,84 @@
+# 左右移動の入力処理（DAS/ARR）
+#
+# オフライン（main.py）とオンライン（online_game.py）の両方で使う。
+# キーを押した・離した時刻から DAS の溜まり具合と ARR の移動回数を計算するため、
+# 移動のタイミングがフレームの区切りに丸められず、1フレームより短い ARR も扱える。
+from typing import Dict, Tuple
+
+# DAS（押しっぱなしで自動移動が始まるまでの時間）と ARR（自動移動の間隔）の既定値（秒）
+DEFAULT_DAS = 0.167
+DEFAULT_ARR = 0.033
+
+# ARR が 0 のときの移動量（壁まで一気に移動する）
+SHIFT_TO_WALL = -1
+
+# 1回の取り出しで返す移動回数の上限（一時停止などで時間が空いた場合）
+MAX_SHIFTS_PER_POLL = 10
+
+
+def event_time(event, default: float) -> float:
+    """イベントの発生時刻（秒）。イベントに時刻がなければ default（受け取った時刻）"""
+    timestamp = getattr(event, "timestamp", None)
+    return timestamp / 1000 if timestamp is not None else default
+
+
+class MoveInputController:
+    """左右移動キーの状態と DAS/ARR の計算
+
+    キーを押したときに1回移動し（呼び出し側で行う）、押した時刻から DAS 経過後は
+    ARR ごとに移動する。poll は「押した時刻からの経過時間で決まる移動回数 - 移動済みの回数」
+    を返すため、フレームの長さによらず移動の回数とタイミングが一定になる。
+    左右同時押しは移動しない。片方を離して残った方向は、離した時刻から溜め直す。
+    """
+
+    def __init__(self, das: float = DEFAULT_DAS, arr: float = DEFAULT_ARR):
+        self.das = das
+        self.arr = arr
+        # 方向（-1 / 1） -> 押した時刻
+        self.held: Dict[int, float] = {}
+        self.direction = 0
+        self.charge_start = 0.0
+        self.shifts_done = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "MoveInputController":
+        return cls(settings.get("das", DEFAULT_DAS), settings.get("arr", DEFAULT_ARR))
+
+    def press(self, direction: int, timestamp: float):
+        """移動キーを押した（最初の1マスの移動は呼び出し側で行う）"""
+        self.held[direction] = timestamp
+        self._update_direction(timestamp)
+
+    def release(self, direction: int, timestamp: float):
+        """移動キーを離した"""
+        if self.held.pop(direction, None) is not None:
+            self._update_direction(timestamp)
+
+    def reset(self):
+        """すべてのキーを離した状態に戻す（画面の切り替え時など）"""
+        self.held.clear()
+        self.direction = 0
+        self.shifts_done = 0
+
+    def _update_direction(self, timestamp: float):
+        direction = next(iter(self.held)) if len(self.held) == 1 else 0
+        if direction != self.direction:
+            self.direction = direction
+            self.charge_start = timestamp
+            self.shifts_done = 0
+
+    def is_charged(self, now: float) -> bool:
+        """DAS が溜まっているか"""
+        return self.direction != 0 and now - self.charge_start >= self.das
+
+    def poll(self, now: float) -> Tuple[int, int]:
+        """now までに行うべき自動移動 (方向, 回数)。ARR が 0 なら回数は SHIFT_TO_WALL"""
+        if not self.is_charged(now):
+            return 0, 0
+        if self.arr <= 0:
+            return self.direction, SHIFT_TO_WALL
+
+        due = int((now - self.charge_start - self.das) / self.arr) + 1
+        count = min(due - self.shifts_done, MAX_SHIFTS_PER_POLL)
+        self.shifts_done = due
+        return self.direction, count
@@ -0,0 +1,119 @@
+# 入力遅延の計測（キーを押してから、その結果を含むフレームが表示されるまでの時間）
+#
+# 環境変数 TETRIS_INPUT_LATENCY=1 で有効にすると、ゲーム中の操作キーで盤面（操作中のピース・
+# ホールド）が実際に変わったときだけ、キーが届いた時刻と操作（key_bindings の名前）を記録し、
+# その変化を描画したフレームの flip 完了時に遅延を求める。壁で止まった移動などは記録しない。
+# ソフトドロップは次の落下まで盤面が変わらないため対象外。
+# 一定間隔と終了時に操作ごとのパーセンタイルをログに出し、各サンプルはバイナリトレース
+# （TETRIS_TRACE）にも記録する。描画やフレーム間隔の変更の比較に使う。
+# キーが届いた時刻は FramePacer がフレーム待ちの間に取り出して付けるため、待ちの間キューに
+# 溜まっていた時間も含まれる（vsync の flip 中に届いた分は flip の後に取り出した時刻になる）。
+import atexit
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from logger import get_logger, trace
+
+log = get_logger(__name__)
+
+# 計測を有効にする環境変数
+LATENCY_ENV = "TETRIS_INPUT_LATENCY"
+
+# パーセンタイルをログに出す間隔（秒）
+REPORT_INTERVAL = 10.0
+
+# 操作ごとに保持するサンプル数（古いものから捨てる）
+MAX_SAMPLES = 5000
+
+# 出力するパーセンタイル
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+    """昇順に並んだサンプルのパーセンタイル（最近傍順位法）"""
+    index = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+class InputLatencyProbe:
+    """キー入力から表示までの遅延の計測
+
+    操作を適用する前に watch でエンジンの状態を取り、適用した後に input を呼ぶ。
+    状態が変わっていれば、その変化はこのフレームで描画されるため、flip の直後の
+    frame_presented で遅延を求める。無効のときは何も記録しない。
+    """
+
+    def __init__(self, enabled: bool = False, report_interval: float = REPORT_INTERVAL):
+        self.enabled = enabled
+        self.report_interval = report_interval
+        # 表示待ちの (操作, キー入力の時刻)
+        self.pending: List[Tuple[str, float]] = []
+        # 操作 -> 遅延のサンプル（秒）
+        self.samples: Dict[str, Deque[float]] = {}
+        self.last_report: Optional[float] = None
+        if enabled:
+            atexit.register(self.report)
+
+    @classmethod
+    def from_env(cls) -> "InputLatencyProbe":
+        return cls(os.environ.get(LATENCY_ENV, "") not in ("", "0"))
+
+    @staticmethod
+    def _signature(engine) -> Tuple[Any, ...]:
+        """操作で変わる表示上の状態（ピースの固定・入れ替えは別のピースとして区別する）"""
+        piece = engine.current_piece
+        held = engine.held_piece
+        return (
+            (id(piece), piece["x"], piece["y"], piece["rotation"]) if piece else None,
+            held["index"] if held else None,
+            engine.game_over,
+        )
+
+    def watch(self, engine) -> Optional[Tuple[Any, ...]]:
+        """操作を適用する前の状態（無効なら None）"""
+        return self._signature(engine) if self.enabled else None
+
+    def input(self, action: str, timestamp: float, engine, before: Optional[Tuple[Any, ...]]):
+        """操作を適用した後に呼ぶ。状態が変わっていればキー入力の時刻を記録する"""
+        if before is not None and self._signature(engine) != before:
+            self.pending.append((action, timestamp))
+
+    def frame_presented(self, now: float):
+        """フレームを表示した（flip の直後に呼ぶ）"""
+        if not self.enabled:
+            return
+        if self.last_report is None:
+            self.last_report = now
+
+        for action, timestamp in self.pending:
+            latency = now - timestamp
+            self.samples.setdefault(action, deque(maxlen=MAX_SAMPLES)).append(latency)
+            trace("input_latency", latency)
+        self.pending.clear()
+
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            self.report()
+
+    def percentiles(self, action: Optional[str] = None) -> Dict[str, float]:
+        """遅延のパーセンタイルと最大値（秒）。action を省略すると全操作をまとめる"""
+        if action is None:
+            values = sorted(v for samples in self.samples.values() for v in samples)
+        else:
+            values = sorted(self.samples.get(action, ()))
+        if not values:
+            return {}
+        result = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+        result["max"] = values[-1]
+        result["count"] = len(values)
+        return result
+
+    def report(self):
+        """操作ごとと全体の遅延をログに出力"""
+        for action in [None, *sorted(self.samples)]:
+            stats = self.percentiles(action)
+            if not stats:
+                continue
+            summary = " ".join(f"{key} {stats[key] * 1000:.1f}ms" for key in [f"p{p}" for p in PERCENTILES] + ["max"])
+            log.info("入力遅延 [%s] %s (%d件)", action or "全体", summary, stats["count"])
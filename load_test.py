@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# 負荷試験ツール（多数のボットクライアントでサーバーに接続し、遅延・スループット・エラー率を計測）
+import abc
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+from network.protocol import Protocol, MessageType
+from network.framing import LENGTH_SIZE, MAX_FRAME_SIZE, encode_frame
+from network.reliability import ReliableChannel
+from network.clock import PING_INTERVAL
+
+# ボット1体あたりのゲーム状態送信レート（Hz、OnlineGame と同じ）
+STATE_RATE = 30
+
+# 攻撃を送る平均間隔（秒）
+ATTACK_INTERVAL = 2.0
+
+# 応答を待つ時間（秒）
+RESPONSE_TIMEOUT = 10.0
+
+# UDP の再送・ACK 処理の間隔（秒、UDPTetrisClient と同じ）
+RELIABILITY_INTERVAL = 0.01
+
+# 盤面サイズ
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+
+
+def percentile(values: List[float], p: float) -> float:
+    """パーセンタイル（values はソート済み）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class LoadStats:
+    """全ボットの計測値の集計"""
+
+    def __init__(self):
+        self.sent = defaultdict(int)
+        self.received = defaultdict(int)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = defaultdict(int)
+        # 計測名 -> 秒単位のサンプル
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.connected = 0
+        self.in_room = 0
+        self.started_at = time.time()
+
+    def record_sent(self, msg_type: str, size: int):
+        self.sent[msg_type] += 1
+        self.bytes_sent += size
+
+    def record_received(self, msg_type: str, size: int):
+        self.received[msg_type] += 1
+        self.bytes_received += size
+
+    def record_error(self, code: str):
+        self.errors[code] += 1
+
+    def record_latency(self, name: str, seconds: float):
+        self.latencies[name].append(seconds)
+
+    def report(self, elapsed: float) -> str:
+        """結果を表にする"""
+        total_sent = sum(self.sent.values())
+        total_received = sum(self.received.values())
+        total_errors = sum(self.errors.values())
+        lines = [
+            f"経過時間: {elapsed:.1f} 秒  接続: {self.connected}  ルーム参加: {self.in_room}",
+            f"送信: {total_sent} メッセージ ({total_sent / elapsed:.0f}/秒, {self.bytes_sent / elapsed / 1024:.0f} KB/秒)",
+            f"受信: {total_received} メッセージ ({total_received / elapsed:.0f}/秒, {self.bytes_received / elapsed / 1024:.0f} KB/秒)",
+            f"エラー: {total_errors} ({total_errors / max(1, total_sent) * 100:.2f}% of 送信)",
+        ]
+        for code, count in sorted(self.errors.items()):
+            lines.append(f"  {code}: {count}")
+
+        lines.append(f"{'計測':<16}{'件数':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+        for name, samples in sorted(self.latencies.items()):
+            values = sorted(samples)
+            lines.append(f"{name:<18}{len(values):>8}" + "".join(
+                f"{percentile(values, p) * 1000:>10.2f}" for p in (50, 90, 99, 100)))
+
+        lines.append("メッセージ種別（送信 / 受信）:")
+        for msg_type in sorted(set(self.sent) | set(self.received)):
+            lines.append(f"  {msg_type:<16}{self.sent[msg_type]:>10}{self.received[msg_type]:>10}")
+        return "\n".join(lines)
+
+
+class Bot(abc.ABC):
+    """1つのクライアント接続（TetrisClient / UDPTetrisClient と同じメッセージを送る）"""
+
+    def __init__(self, index: int, stats: LoadStats):
+        self.index = index
+        self.stats = stats
+        self.player_id = ""
+        self.running = True
+        self.waiters: Dict[str, asyncio.Future] = {}
+        self.ping_sent: Dict[int, float] = {}
+        self.next_ping_id = 0
+
+    @abc.abstractmethod
+    async def open(self, host: str, port: int):
+        """サーバーに接続する"""
+
+    @abc.abstractmethod
+    def send(self, message: str):
+        """メッセージを1つ送信する"""
+
+    def close(self):
+        self.running = False
+
+    def handle_message(self, message: Dict[str, Any], size: int):
+        """受信したメッセージを集計し、待っている応答があれば完了させる"""
+        msg_type = message.get("type")
+        data = message.get("data", {})
+        if msg_type == MessageType.BATCH.value:
+            for inner in data.get("messages", []):
+                self.handle_message(inner, 0)
+            self.stats.bytes_received += size
+            return
+
+        self.stats.record_received(msg_type, size)
+        now = time.time()
+        if msg_type == MessageType.PONG.value:
+            sent_at = self.ping_sent.pop(data.get("ping_id"), None)
+            if sent_at is not None:
+                self.stats.record_latency("ping_rtt", now - sent_at)
+        elif msg_type == MessageType.GAME_STATE.value and "timestamp" in data:
+            # 同じホストの時計なので送信者のタイムスタンプから中継遅延がわかる
+            self.stats.record_latency(f"relay_{data.get('event')}", now - data["timestamp"])
+        elif msg_type == MessageType.ERROR.value:
+            self.stats.record_error(data.get("error_code", "UNKNOWN"))
+            for future in self.waiters.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(data.get("error_code", "ERROR")))
+            self.waiters.clear()
+            return
+        elif msg_type == MessageType.CONNECT.value:
+            self.player_id = data.get("player_id", self.player_id)
+
+        future = self.waiters.pop(msg_type, None)
+        if future and not future.done():
+            future.set_result(message)
+
+    async def request(self, message: str, response_type: MessageType, latency_name: str):
+        """メッセージを送って応答を待ち、応答時間を記録"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[response_type.value] = future
+        started = time.time()
+        self.send(message)
+        response = await asyncio.wait_for(future, RESPONSE_TIMEOUT)
+        self.stats.record_latency(latency_name, time.time() - started)
+        return response
+
+    async def play(self, duration: float, state_rate: float, attack_interval: float):
+        """ゲーム状態の定期送信・攻撃・PING を duration 秒続ける"""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + duration
+        interval = 1.0 / state_rate
+        next_state = loop.time() + random.random() * interval  # 送信タイミングを分散
+        next_ping = loop.time()
+        next_attack = loop.time() + random.expovariate(1.0 / attack_interval)
+        grid = self._make_grid()
+
+        while self.running and loop.time() < end:
+            now = loop.time()
+            if now >= next_state:
+                self.send(Protocol.create_game_state_message(self._make_state(grid)))
+                next_state += interval
+            if now >= next_attack:
+                self.send(Protocol.create_game_state_message({
+                    "event": "attack", "lines": random.choice((1, 2, 4)), "timestamp": time.time()}))
+                next_attack += random.expovariate(1.0 / attack_interval)
+            if now >= next_ping:
+                ping_id = self.next_ping_id
+                self.next_ping_id += 1
+                self.ping_sent[ping_id] = time.time()
+                self.send(Protocol.create_ping_message({"ping_id": ping_id, "client_time": time.time()}))
+                next_ping += PING_INTERVAL
+            await asyncio.sleep(max(0.0, min(next_state, next_attack, next_ping, end) - loop.time()))
+
+    @staticmethod
+    def _make_grid() -> List[List[Any]]:
+        """実際の対戦に近い大きさの盤面（下半分が埋まった状態）"""
+        grid = [[0] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+        for y in range(GRID_HEIGHT // 2, GRID_HEIGHT):
+            for x in range(GRID_WIDTH):
+                if random.random() < 0.8:
+                    grid[y][x] = [random.randrange(256), random.randrange(256), random.randrange(256)]
+        return grid
+
+    @staticmethod
+    def _make_state(grid: List[List[Any]]) -> Dict[str, Any]:
+        """OnlineGame._send_game_state と同じ形のゲーム状態"""
+        return {
+            "event": "game_state",
+            "grid": grid,
+            "score": random.randrange(100000),
+            "level": 1,
+            "lines_cleared": 0,
+            "current_piece": {"shape": [[1, 1], [1, 1]], "x": 4, "y": random.randrange(18), "color": [255, 255, 0]},
+            "timestamp": time.time(),
+        }
+
+
+class TcpBot(Bot):
+    """TetrisClient と同じ長さ付きフレームの TCP 接続"""
+
+    def __init__(self, index: int, stats: LoadStats):
+        super().__init__(index, stats)
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+
+    async def open(self, host: str, port: int):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.reader_task = asyncio.create_task(self._receive_loop(reader))
+
+    def send(self, message: str):
+        if not self.running or self.writer is None or self.writer.is_closing():
+            return
+        frame = encode_frame(message.encode('utf-8'))
+        self.writer.write(frame)
+        self.stats.record_sent(Protocol.message_type(message), len(frame))
+
+    async def _receive_loop(self, reader: asyncio.StreamReader):
+        try:
+            while self.running:
+                length = int.from_bytes(await reader.readexactly(LENGTH_SIZE), byteorder='big')
+                if length <= 0 or length > MAX_FRAME_SIZE:
+                    self.stats.record_error("BAD_FRAME")
+                    break
+                body = await reader.readexactly(length)
+                message = Protocol.parse_message(body.decode('utf-8'))
+                if message:
+                    self.handle_message(message, LENGTH_SIZE + length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if self.running:
+                self.stats.record_error("DISCONNECTED")
+        except asyncio.CancelledError:
+            pass
+
+    def close(self):
+        super().close()
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+class UdpBot(Bot, asyncio.DatagramProtocol):
+    """UDPTetrisClient と同じ信頼性ヘッダー付きの UDP 接続"""
+
+    def __init__(self, index: int, stats: LoadStats):
+        super().__init__(index, stats)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.channel = ReliableChannel()
+
+    async def open(self, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, remote_addr=(host, port))
+
+    def send(self, message: str):
+        if not self.running or self.transport is None:
+            return
+        message_dict = json.loads(message)
+        message_dict["player_id"] = self.player_id
+        self._send_packet(self.channel.prepare(message_dict))
+
+    def _send_packet(self, packet: Dict[str, Any]):
+        data = json.dumps(packet).encode('utf-8')
+        self.transport.sendto(data)
+        self.stats.record_sent(packet["type"], len(data))
+
+    def poll(self):
+        """再送と ACK 専用パケットを送る"""
+        for packet in self.channel.poll():
+            packet["player_id"] = self.player_id
+            self._send_packet(packet)
+        if self.channel.failed and self.running:
+            self.stats.record_error("RETRY_LIMIT")
+            self.running = False
+
+    def datagram_received(self, data: bytes, addr):
+        message = Protocol.parse_message(data.decode('utf-8'))
+        if not message:
+            return
+        delivered = self.channel.receive(message)
+        for index, inner in enumerate(delivered):
+            self.handle_message(inner, len(data) if index == 0 else 0)
+
+    def error_received(self, exc: Exception):
+        self.stats.record_error(type(exc).__name__)
+
+    def close(self):
+        super().close()
+        if self.transport:
+            self.transport.close()
+
+
+async def run_pair(index: int, args, stats: LoadStats, bots: List[Bot]):
+    """2体のボットでルームを作って対戦状態の通信を続ける"""
+    bot_class = UdpBot if args.protocol == "udp" else TcpBot
+    creator, joiner = bot_class(index * 2, stats), bot_class(index * 2 + 1, stats)
+    bots.extend((creator, joiner))
+    room_id = f"load-{args.run_id}-{index}"
+
+    try:
+        for bot in (creator, joiner):
+            started = time.time()
+            await bot.open(args.host, args.port)
+            await bot.request(Protocol.create_connect_message(f"bot{bot.index}"), MessageType.CONNECT, "connect")
+            stats.connected += 1
+            stats.record_latency("connect_all", time.time() - started)
+
+        await creator.request(Protocol.create_room_message(room_id), MessageType.CREATE_ROOM, "create_room")
+        await joiner.request(Protocol.create_join_room_message(room_id), MessageType.JOIN_ROOM, "join_room")
+        stats.in_room += 2
+
+        await asyncio.gather(
+            creator.play(args.duration, args.state_rate, args.attack_interval),
+            joiner.play(args.duration, args.state_rate, args.attack_interval),
+        )
+        # 最後の送信の中継を待ってから退出
+        await asyncio.sleep(0.5)
+        for bot in (creator, joiner):
+            bot.send(Protocol.create_message(MessageType.LEAVE_ROOM))
+            bot.send(Protocol.create_message(MessageType.DISCONNECT))
+    except (asyncio.TimeoutError, RuntimeError, OSError) as e:
+        stats.record_error(type(e).__name__ if not isinstance(e, RuntimeError) else str(e))
+    finally:
+        await asyncio.sleep(0.1)
+        for bot in (creator, joiner):
+            bot.close()
+
+
+async def reliability_loop(bots: List[Bot]):
+    """UDP ボットの再送・ACK をまとめて処理"""
+    while True:
+        await asyncio.sleep(RELIABILITY_INTERVAL)
+        for bot in bots:
+            if isinstance(bot, UdpBot) and bot.running:
+                bot.poll()
+
+
+async def report_loop(stats: LoadStats, interval: float):
+    """途中経過を表示"""
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.time() - stats.started_at
+        print(f"[{elapsed:6.1f}s] 接続 {stats.connected}  送信 {sum(stats.sent.values())}  "
+              f"受信 {sum(stats.received.values())}  エラー {sum(stats.errors.values())}")
+
+
+async def run_load(args) -> LoadStats:
+    """ボットを ramp 体/秒で起動し、全員の終了を待つ"""
+    stats = LoadStats()
+    bots: List[Bot] = []
+    background = [asyncio.create_task(report_loop(stats, args.report_interval))]
+    if args.protocol == "udp":
+        background.append(asyncio.create_task(reliability_loop(bots)))
+
+    pairs = []
+    for index in range(args.clients // 2):
+        pairs.append(asyncio.create_task(run_pair(index, args, stats, bots)))
+        await asyncio.sleep(2 / args.ramp)
+    await asyncio.gather(*pairs)
+
+    for task in background:
+        task.cancel()
+    return stats
+
+
+def start_local_server(args) -> subprocess.Popen:
+    """ループバックで start_server.py を別プロセスとして起動"""
+    command = [sys.executable, "start_server.py", str(args.port), args.host]
+    if args.protocol == "udp":
+        command.append("--udp")
+    if args.workers > 1:
+        command += ["--workers", str(args.workers)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="テトリスサーバーの負荷試験")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--protocol", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--clients", type=int, default=100, help="ボット数（2体で1ルーム）")
+    parser.add_argument("--duration", type=float, default=30.0, help="対戦状態の送信を続ける秒数")
+    parser.add_argument("--ramp", type=float, default=50.0, help="1秒あたりに接続するボット数")
+    parser.add_argument("--state-rate", type=float, default=STATE_RATE, help="ゲーム状態の送信レート（Hz）")
+    parser.add_argument("--attack-interval", type=float, default=ATTACK_INTERVAL, help="攻撃の平均間隔（秒）")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="途中経過の表示間隔（秒）")
+    parser.add_argument("--spawn-server", action="store_true", help="ループバックにサーバーを起動して試験する")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn-server で起動するワーカー数")
+    args = parser.parse_args()
+    args.run_id = f"{int(time.time())}-{random.randrange(10000)}"
+
+    server = start_local_server(args) if args.spawn_server else None
+    try:
+        stats = asyncio.run(run_load(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print("-" * 60)
+    print(stats.report(time.time() - stats.started_at))
+
+
+if __name__ == "__main__":
+    main()
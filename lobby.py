@@ -1,5 +1,6 @@
 # オンライン対戦ロビー画面
 import pygame
+import random
 import threading
 import time
 from typing import Dict, List, Optional, Callable
@@ -8,13 +9,19 @@ try:
     from network.client import TetrisClient
     from network.udp_client import UDPTetrisClient
     from network.protocol import MessageType
+    from network.matchmaking import DEFAULT_RATING
 except ImportError:
     # モジュールが見つからない場合のフォールバック
     TetrisClient = None
     UDPTetrisClient = None
     MessageType = None
+    DEFAULT_RATING = 1000
 import config
 from config import scale_factor, font, small_font, big_font
+from engine import GARBAGE_MESSINESS
+from logger import get_logger
+
+log = get_logger(__name__)
 
 
 class RoomInfo:
@@ -57,6 +64,8 @@ class OnlineLobby:
         self.chat_messages: List[Dict] = []
         self.matching_status = ""
         self.last_room_list_request = 0
+        # サーバーがルーム一覧の差分をプッシュしている間はポーリングしない
+        self.room_list_live = False
         
         # UI要素
         self.buttons = {}
@@ -114,7 +123,7 @@ class OnlineLobby:
             int(50 * scale_factor),
             int(50 * scale_factor),
             button_width, button_height,
-            "戻る", self._back_to_menu
+            "戻る", self._back
         )
         
         # ルーム画面のボタン
@@ -178,10 +187,14 @@ class OnlineLobby:
         # ロビー画面でルーム一覧を定期的に更新
         if self.current_screen == "lobby" and self.connected and self.client:
             current_time = time.time()
-            if current_time - self.last_room_list_request > 5:  # 5秒間隔
+            if not self.room_list_live and current_time - self.last_room_list_request > 5:  # 5秒間隔
                 print(f"ルーム一覧を要求中... (前回: {self.last_room_list_request:.1f}秒前)")
-                self.client.list_rooms()
+                self.client.list_rooms(subscribe=True)
                 self.last_room_list_request = current_time
+        elif self.room_list_live:
+            # ルームにいる間はプッシュが止まるので、ロビーに戻ったら取り直す
+            self.room_list_live = False
+            self.last_room_list_request = 0
         # キーボード入力処理
         for event in events:
             if event.type == pygame.KEYDOWN:
@@ -202,6 +215,8 @@ class OnlineLobby:
                         self._back_to_menu()
                     elif self.current_screen == "room":
                         self._leave_room()
+                    elif self.current_screen == "matching":
+                        self._cancel_quick_match()
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # 左クリック
@@ -292,6 +307,11 @@ class OnlineLobby:
         player_text = font.render(f"プレイヤー: {self.player_name}", True, config.theme["text"])
         screen.blit(player_text, (int(50 * scale_factor), int(100 * scale_factor)))
         
+        # 接続品質表示
+        if self.client:
+            quality_text = small_font.render(self._get_connection_quality_text(), True, config.theme["text"])
+            screen.blit(quality_text, (int(50 * scale_factor), int(130 * scale_factor)))
+        
         # ルームリスト
         self._draw_room_list(screen)
         
@@ -301,6 +321,14 @@ class OnlineLobby:
         self.buttons["quick_match"].draw(screen)
         self.buttons["back_lobby"].draw(screen)
     
+    def _get_connection_quality_text(self) -> str:
+        """RTT・ジッター・損失率から接続品質の表示文字列を作成"""
+        info = self.client.get_latency_info()
+        if info.get("srtt") is None:
+            return f"接続品質: {info.get('quality', '計測中')}"
+        return (f"接続品質: {info['quality']}  RTT {info['srtt'] * 1000:.0f}ms  "
+                f"ジッター {info['jitter'] * 1000:.0f}ms  損失 {info['loss_rate'] * 100:.0f}%")
+    
     def _draw_room_list(self, screen: pygame.Surface):
         """ルームリストを描画"""
         list_y = int(150 * scale_factor)
@@ -474,9 +502,19 @@ class OnlineLobby:
     
     def _start_quick_match(self):
         """クイックマッチ開始"""
+        if not (self.client and self.connected):
+            return
         self.current_screen = "matching"
         self.matching_status = "対戦相手を探しています..."
-        # TODO: マッチメイキング実装
+        # サーバーの待ち行列に登録し、相手が見つかると MATCHMAKING(matched) が届く
+        self.client.enqueue_match(config.settings.get("online_rating", DEFAULT_RATING))
+    
+    def _cancel_quick_match(self):
+        """クイックマッチを取り消してロビーに戻る"""
+        if self.client and self.connected:
+            self.client.cancel_match()
+        self.current_screen = "lobby"
+        self.matching_status = ""
     
     def _leave_room(self):
         """ルーム退出"""
@@ -488,15 +526,29 @@ class OnlineLobby:
     def _start_game(self):
         """ゲーム開始"""
         if self.client and self.connected:
-            # ゲーム開始メッセージを送信
+            # ゲーム開始メッセージを送信（ピース順を揃えるシードと同期方式も共有）
+            seed = random.randrange(2 ** 32)
+            sync_mode = config.settings.get("online_sync_mode", "state")
+            garbage_messiness = config.settings.get("garbage_messiness", GARBAGE_MESSINESS)
             start_msg = {
                 "event": "start_game",
-                "timestamp": time.time()
+                "seed": seed,
+                "sync_mode": sync_mode,
+                "garbage_messiness": garbage_messiness,
+                "timestamp": self.client.server_time()
             }
             self.client.send_game_state(start_msg)
             
             if self.on_game_start:
-                self.on_game_start(self.client)
+                self.on_game_start(self.client, seed=seed, sync_mode=sync_mode,
+                                   garbage_messiness=garbage_messiness)
+    
+    def _back(self):
+        """戻るボタン（マッチング中は取り消し、それ以外はメニューへ）"""
+        if self.current_screen == "matching":
+            self._cancel_quick_match()
+        else:
+            self._back_to_menu()
     
     def _back_to_menu(self):
         """メニューに戻る"""
@@ -532,6 +584,7 @@ class OnlineLobby:
     def _on_disconnected(self, reason: str):
         """切断コールバック"""
         self.connected = False
+        self.room_list_live = False
         self.current_screen = "connect"
         self.matching_status = f"切断: {reason}"
     
@@ -543,9 +596,7 @@ class OnlineLobby:
         msg_type = message.get("type")
         data = message.get("data", {})
         
-        print(f"ロビー受信メッセージ: Type={msg_type}, Data={data}")
-        print(f"現在の画面: {self.current_screen}")
-        print(f"MessageType.CREATE_ROOM.value: {MessageType.CREATE_ROOM.value}")
+        log.debug("ロビー受信メッセージ: Type=%s, Data=%s (現在の画面: %s)", msg_type, data, self.current_screen)
         
         # 接続成功時の処理
         if msg_type == MessageType.CONNECT.value and data.get("success"):
@@ -566,35 +617,61 @@ class OnlineLobby:
                 self.current_screen = "room"
         
         elif msg_type == MessageType.LIST_ROOMS.value:
-            # ルーム一覧更新
-            rooms_data = data.get("rooms", [])
-            self.rooms.clear()
-            for room_data in rooms_data:
-                room_id = room_data.get("room_id", "")
-                if room_id:
-                    self.rooms[room_id] = RoomInfo(
-                        room_id=room_id,
-                        players=room_data.get("players", []),
-                        max_players=room_data.get("max_players", 2),
-                        has_password=room_data.get("has_password", False)
-                    )
+            if data.get("event") == "delta":
+                # 購読中に届くルームの追加・変更・削除
+                for room_data in data.get("added", []) + data.get("changed", []):
+                    self._update_room_info(room_data)
+                for room_id in data.get("removed", []):
+                    self.rooms.pop(room_id, None)
+            else:
+                # ルーム一覧更新（version があればサーバーが以降の変更をプッシュする）
+                rooms_data = data.get("rooms", [])
+                self.rooms.clear()
+                for room_data in rooms_data:
+                    self._update_room_info(room_data)
+                self.room_list_live = "version" in data
+        
+        elif msg_type == MessageType.MATCHMAKING.value:
+            event = data.get("event")
+            if event == "queued" and self.current_screen == "matching":
+                self.matching_status = f"対戦相手を探しています... (待機 {data.get('waiting', 1)}人)"
+            elif event == "matched":
+                self.current_room_id = data.get("room_id", "")
+                self.current_screen = "room"
+                self.matching_status = f"対戦相手: {data.get('opponent_name', '')}"
+                # 先に待っていた側がホストとしてゲームを開始する
+                if data.get("host"):
+                    self._start_game()
         
         elif msg_type == MessageType.ROOM_INFO.value:
             # ルーム情報更新
             pass
         
         elif msg_type == MessageType.GAME_STATE.value:
-            print(f"GAME_STATEメッセージ受信: {data}")
+            log.debug("GAME_STATEメッセージ受信: %s", data)
             # ゲーム開始処理
             event = data.get("event")
             if event in ["start_game", "game_start"]:
                 print("ゲーム開始イベント検出 - オンラインゲームを開始")
                 if self.on_game_start:
-                    self.on_game_start(self.client)
+                    self.on_game_start(self.client, seed=data.get("seed"),
+                                       sync_mode=data.get("sync_mode"),
+                                       garbage_messiness=data.get("garbage_messiness"))
         
         elif msg_type == MessageType.ERROR.value:
             self.matching_status = data.get("error_message", "エラーが発生しました")
     
+    def _update_room_info(self, room_data: Dict):
+        """受信したルームの要約を一覧に反映"""
+        room_id = room_data.get("room_id", "")
+        if room_id:
+            self.rooms[room_id] = RoomInfo(
+                room_id=room_id,
+                players=room_data.get("players", []),
+                max_players=room_data.get("max_players", 2),
+                has_password=room_data.get("has_password", False)
+            )
+    
     def _on_error(self, error_code: str, error_message: str):
         """エラーコールバック"""
         self.matching_status = f"エラー: {error_message}"
@@ -0,0 +1,176 @@
+# ログ出力（レベル・遅延フォーマット・頻度制限・バイナリトレース）
+#
+# フレームループや受信スレッドから呼ぶ箇所は print ではなくここのロガーを使う。
+#   log = get_logger(__name__)
+#   log.debug("受信: %s", message)   # レベルが無効なら文字列を組み立てない
+#   trace("udp_recv", len(data))     # TETRIS_TRACE を設定したときだけ記録
+#
+# 環境変数
+#   TETRIS_LOG_LEVEL: 出力するレベル（DEBUG / INFO / WARNING / ERROR、既定は INFO）
+#   TETRIS_TRACE: バイナリトレースの出力先ファイル（未設定なら記録しない）
+import atexit
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# ルートのロガー名（各モジュールはこの下の子ロガーを使う）
+ROOT_LOGGER = "tetris"
+
+# 同じ呼び出し箇所から RATE_LIMIT_INTERVAL 秒あたりに出力する件数の上限
+RATE_LIMIT_INTERVAL = 1.0
+RATE_LIMIT_BURST = 10
+
+# バイナリトレースのレコード：時刻(double)・イベント番号(uint16)・値の数(uint16)・値(double × 値の数)
+TRACE_HEADER = struct.Struct("<dHH")
+# イベント名の定義レコード（イベント番号 0xFFFF・名前の長さ、その後に UTF-8 の名前）
+TRACE_NAME_EVENT = 0xFFFF
+
+# トレースをファイルに書き出す前に溜めるバイト数
+TRACE_BUFFER_SIZE = 64 * 1024
+
+
+class RateLimitFilter(logging.Filter):
+    """呼び出し箇所ごとに出力件数を制限するフィルター
+
+    上限を超えた分は捨て、次に出力できたときに省略した件数を添える。
+    """
+
+    def __init__(self, interval: float = RATE_LIMIT_INTERVAL, burst: int = RATE_LIMIT_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (ファイル, 行) -> [区間の開始時刻, 区間内の件数, 省略した件数]
+        self.sites: Dict[Tuple[str, int], list] = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] >= self.interval:
+                suppressed = site[2] if site else 0
+                self.sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                return False
+
+        if suppressed:
+            record.msg = f"{record.msg} （直前 {suppressed} 件省略）"
+        return True
+
+
+class BinaryTraceSink:
+    """高頻度のイベントを固定長のバイナリで記録するシンク
+
+    文字列にせず数値のまま struct でバッファに詰め、一定量たまったらまとめて書き出す。
+    イベント名は最初に記録したときに番号との対応を1回だけ書く。
+    """
+
+    def __init__(self, path: str, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.file = open(path, "ab")
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.event_ids: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, event: str, *values: float):
+        with self.lock:
+            event_id = self.event_ids.get(event)
+            if event_id is None:
+                event_id = len(self.event_ids)
+                self.event_ids[event] = event_id
+                name = event.encode("utf-8")
+                self.buffer += TRACE_HEADER.pack(time.time(), TRACE_NAME_EVENT, len(name)) + name
+                self.buffer += struct.pack("<H", event_id)
+
+            self.buffer += TRACE_HEADER.pack(time.time(), event_id, len(values))
+            if values:
+                self.buffer += struct.pack(f"<{len(values)}d", *values)
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        """バッファを書き出す（ロック取得済みで呼ぶ）"""
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer.clear()
+
+    def close(self):
+        with self.lock:
+            if self.buffer:
+                self._flush()
+            self.file.close()
+
+
+def read_trace(path: str):
+    """バイナリトレースを (時刻, イベント名, 値のタプル) として順に読み出す"""
+    names: Dict[int, str] = {}
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + TRACE_HEADER.size <= len(data):
+        timestamp, event_id, count = TRACE_HEADER.unpack_from(data, offset)
+        offset += TRACE_HEADER.size
+        if event_id == TRACE_NAME_EVENT:
+            name = data[offset:offset + count].decode("utf-8")
+            offset += count
+            (defined_id,) = struct.unpack_from("<H", data, offset)
+            offset += 2
+            names[defined_id] = name
+            continue
+        values = struct.unpack_from(f"<{count}d", data, offset)
+        offset += 8 * count
+        yield timestamp, names.get(event_id, str(event_id)), values
+
+
+_configured = False
+_config_lock = threading.Lock()
+_trace_sink: Optional[BinaryTraceSink] = None
+
+
+def _configure():
+    """ルートのロガーとトレースを環境変数から1回だけ設定"""
+    global _configured, _trace_sink
+    with _config_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(os.environ.get("TETRIS_LOG_LEVEL", "INFO").upper())
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+        handler.addFilter(RateLimitFilter())
+        root.addHandler(handler)
+        root.propagate = False
+
+        trace_path = os.environ.get("TETRIS_TRACE")
+        if trace_path:
+            _trace_sink = BinaryTraceSink(trace_path)
+            atexit.register(_trace_sink.close)
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """モジュール用のロガーを取得（tetris.<name>）"""
+    if not _configured:
+        _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def set_level(level: str):
+    """出力するレベルを変更（"DEBUG" など）"""
+    if not _configured:
+        _configure()
+    logging.getLogger(ROOT_LOGGER).setLevel(level.upper())
+
+
+def trace(event: str, *values: float):
+    """バイナリトレースにイベントを記録（TETRIS_TRACE 未設定なら何もしない）"""
+    if _trace_sink is not None:
+        _trace_sink.record(event, *values)
@@ -3,6 +3,9 @@ import sys
 import config
 import key_config
 import os
+from input_controller import MoveInputController, SHIFT_TO_WALL, event_time
+from input_latency import InputLatencyProbe
+from frame_pacing import FramePacer
 
 # Pygameの初期化
 pygame.init()
@@ -11,7 +14,8 @@ pygame.init()
 def main():
     # スクリーンの初期化
     screen = config.initialize_screen(config.settings.get("fullscreen", False))
-    clock = pygame.time.Clock()
+    # フレームの進め方（loop_mode が "fixed" ならルールを固定の刻みで進める）
+    pacer = FramePacer.from_settings(config.settings)
 
     # フォントの初期化
     config.init_fonts()
@@ -31,14 +35,11 @@ def main():
     print(f"現在のキー設定 - 左: {current_left}, 右: {current_right}")
     print("これらは正常なSDL2キーコードです")
 
-    # DAS/ARR用の変数（初期化確認）
-    das_timer = 0
-    arr_timer = 0
-    das_delay = 0.167  # 約10フレーム@60fps
-    arr_delay = 0.033  # 約2フレーム@60fps
-    last_move_direction = 0
+    # 左右移動の DAS/ARR（キーを押した時刻から計算する）
+    move_input = MoveInputController.from_settings(config.settings)
 
-    print(f"DAS/ARR変数初期化完了 - das_delay: {das_delay}, arr_delay: {arr_delay}")
+    # 入力遅延の計測（TETRIS_INPUT_LATENCY=1 のときだけ記録する）
+    latency_probe = InputLatencyProbe.from_env()
 
     # キー状態管理（イベント駆動）
     keys_held = {}  # キーが押されている状態を管理
@@ -103,25 +104,90 @@ def main():
                 online_game = None
         game_state = new_state
     
-    def start_online_game(client):
+    def start_online_game(client, seed=None, sync_mode=None, garbage_messiness=None):
         nonlocal online_game, game_state
         print("start_online_game関数が呼ばれました")
         from online_game import OnlineGame
-        online_game = OnlineGame(config.screen_width, config.screen_height, client)
-        online_game.start_game()
+        online_game = OnlineGame(config.screen_width, config.screen_height, client, sync_mode=sync_mode,
+                                 garbage_messiness=garbage_messiness, latency_probe=latency_probe)
+        online_game.start_game(seed=seed)
         print(f"ゲーム状態を変更: {game_state} -> online_game")
         game_state = "online_game"
 
+    def apply_game_key(event, now):
+        """ゲーム中のキー操作（移動・回転・ドロップ・ホールド・ソフトドロップ）をエンジンに適用"""
+        key_bindings = config.settings.get("key_bindings", {})
+        timestamp = event_time(event, now)
+
+        if event.type == pygame.KEYUP:
+            # 左右移動キーの解放とソフトドロップの解除
+            if event.key == key_bindings.get("move_left", pygame.K_LEFT):
+                move_input.release(-1, timestamp)
+            elif event.key == key_bindings.get("move_right", pygame.K_RIGHT):
+                move_input.release(1, timestamp)
+            elif event.key == key_bindings.get("soft_drop", pygame.K_DOWN):
+                game.soft_drop = False
+            return
+
+        # 計測モード：操作の前の状態（操作で盤面が変わったときだけ遅延を記録する）
+        before = latency_probe.watch(game)
+
+        # 左右移動（初回移動 + DAS の溜め開始）
+        if event.key == key_bindings.get("move_left", pygame.K_LEFT):
+            game.move(-1)
+            move_input.press(-1, timestamp)
+        elif event.key == key_bindings.get("move_right", pygame.K_RIGHT):
+            game.move(1)
+            move_input.press(1, timestamp)
+
+        # 時計回りの回転
+        elif event.key == key_bindings.get("rotate_cw", pygame.K_UP):
+            game.rotate(clockwise=True)
+
+        # 反時計回りの回転
+        elif event.key == key_bindings.get("rotate_ccw", pygame.K_z):
+            game.rotate(clockwise=False)
+
+        # ハードドロップ
+        elif event.key == key_bindings.get("hard_drop", pygame.K_SPACE):
+            game.drop()
+
+        # ホールド
+        elif event.key == key_bindings.get("hold", pygame.K_c):
+            game.hold_piece()
+
+        # ソフトドロップ
+        elif event.key == key_bindings.get("soft_drop", pygame.K_DOWN):
+            game.soft_drop = True
+
+        action = next((name for name, code in key_bindings.items() if code == event.key), None)
+        if action:
+            latency_probe.input(action, timestamp, game, before)
+
+    def auto_shift(now):
+        """DAS/ARR処理（前回から now までに溜まった回数だけ移動）"""
+        direction, count = move_input.poll(now)
+        if count == SHIFT_TO_WALL:
+            game.shift_to_wall(direction)
+        else:
+            for _ in range(count):
+                if not game.move(direction):
+                    break
+
+    # 固定刻みのループで、届いた時刻の刻みまで適用を待っているゲーム中のキーイベント
+    pending_game_keys = []
+
     # メインゲームループ
     while True:
-        dt = clock.tick(60) / 1000.0  # フレーム間の時間（秒）
+        dt = pacer.tick()  # フレーム間の時間（秒）
 
         # マウス位置の取得
         mouse_pos = pygame.mouse.get_pos()
         mouse_clicked = False
 
-        # イベント処理
-        events = pygame.event.get()
+        # イベント処理（キー入力はフレーム待ちの間に届いた時刻が付いている）
+        events = pacer.take_events()
+        now = pygame.time.get_ticks() / 1000
         for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -142,41 +208,14 @@ def main():
 
                 # ゲームプレイ中のキー操作
                 if game_state == "game" and game:
-                    key_bindings = config.settings.get("key_bindings", {})
-
-                    # 左右移動（初回移動 + DAS/ARRタイマー開始）
-                    if event.key == key_bindings.get("move_left", pygame.K_LEFT):
-                        game.move(-1)
-                        # DAS/ARRタイマーを初期化
-                        das_timer = 0
-                        arr_timer = 0
-                        last_move_direction = -1
-                    elif event.key == key_bindings.get("move_right", pygame.K_RIGHT):
-                        game.move(1)
-                        # DAS/ARRタイマーを初期化
-                        das_timer = 0
-                        arr_timer = 0
-                        last_move_direction = 1
-
-                    # 時計回りの回転
-                    elif event.key == key_bindings.get("rotate_cw", pygame.K_UP):
-                        game.rotate(clockwise=True)
-
-                    # 反時計回りの回転
-                    elif event.key == key_bindings.get("rotate_ccw", pygame.K_z):
-                        game.rotate(clockwise=False)
-
-                    # ハードドロップ
-                    elif event.key == key_bindings.get("hard_drop", pygame.K_SPACE):
-                        game.drop()
-
-                    # ホールド
-                    elif event.key == key_bindings.get("hold", pygame.K_c):
-                        game.hold_piece()
-
                     # 一時停止
-                    elif event.key == key_bindings.get("pause", pygame.K_p):
+                    if event.key == config.settings.get("key_bindings", {}).get("pause", pygame.K_p):
                         game_state = "pause"
+                    elif pacer.fixed_step:
+                        # 固定刻みでは届いた時刻を含む刻みの直前に適用する
+                        pending_game_keys.append(event)
+                    else:
+                        apply_game_key(event, now)
 
                 # 設定画面でのスクロール
                 if game_state == "settings":
@@ -192,12 +231,19 @@ def main():
                 # キー状態を記録
                 keys_held[event.key] = False
 
-                # ソフトドロップの解除
                 if game_state == "game" and game:
-                    if event.key == config.settings.get("key_bindings", {}).get(
-                        "soft_drop", pygame.K_DOWN
-                    ):
-                        game.soft_drop = False
+                    # 左右移動キーの解放とソフトドロップの解除
+                    if pacer.fixed_step:
+                        pending_game_keys.append(event)
+                    else:
+                        apply_game_key(event, now)
+                else:
+                    # 左右移動キーの解放（どの画面でも記録する）
+                    key_bindings = config.settings.get("key_bindings", {})
+                    if event.key == key_bindings.get("move_left", pygame.K_LEFT):
+                        move_input.release(-1, event_time(event, now))
+                    elif event.key == key_bindings.get("move_right", pygame.K_RIGHT):
+                        move_input.release(1, event_time(event, now))
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # 左クリック
@@ -211,59 +257,19 @@ def main():
                     settings_scroll_offset -= 30 * config.scale_factor
                     settings_scroll_offset = max(settings_scroll_offset, -400)
 
-        # DAS/ARR処理（修正版）
-        if game_state == "game" and game:
+        # ソフトドロップと DAS/ARR 処理（固定刻みでは刻みごとに行う）
+        if game_state == "game" and game and not pacer.fixed_step:
             # ソフトドロップ
             soft_drop_key = config.settings.get("key_bindings", {}).get(
                 "soft_drop", pygame.K_DOWN
             )
             game.soft_drop = keys_held.get(soft_drop_key, False)
 
-            # DAS/ARR処理
-            move_left_key = config.settings.get("key_bindings", {}).get(
-                "move_left", pygame.K_LEFT
-            )
-            move_right_key = config.settings.get("key_bindings", {}).get(
-                "move_right", pygame.K_RIGHT
-            )
-
-            left_pressed = keys_held.get(move_left_key, False)
-            right_pressed = keys_held.get(move_right_key, False)
-
-            # 現在の方向を決定
-            current_direction = 0
-
-            if left_pressed and right_pressed:
-                # 同時押し時は何もしない（ニュートラル）
-                current_direction = 0
-            elif left_pressed:
-                current_direction = -1
-            elif right_pressed:
-                current_direction = 1
-
-            if current_direction != 0:
-                # 方向が変わった場合のみタイマーリセット
-                if last_move_direction != current_direction:
-                    das_timer = 0
-                    arr_timer = 0
-                    last_move_direction = current_direction
-
-                # DASタイマーを進める
-                das_timer += dt
-
-                # DAS完了後の高速移動
-                if das_timer >= das_delay:
-                    arr_timer += dt
-
-                    # ARRの間隔で移動
-                    if arr_timer >= arr_delay:
-                        game.move(current_direction)
-                        arr_timer = 0
-            else:
-                # キーが押されていない場合はリセット
-                das_timer = 0
-                arr_timer = 0
-                last_move_direction = 0
+            # DAS/ARR処理（前のフレームから now までに溜まった回数だけ移動）
+            auto_shift(now)
+        elif game_state != "game":
+            # 画面を離れたら適用待ちのキーは捨てる
+            pending_game_keys.clear()
 
         # 画面の描画
         if game_state == "menu":
@@ -345,7 +351,18 @@ def main():
 
             if game:
                 # ゲームの更新
-                game.update(dt)
+                if pacer.fixed_step:
+                    # ルールは経過時間分の固定刻みで進め、エフェクトは描画のフレームごとに進める。
+                    # キー操作と DAS は届いた時刻を含む刻みの直前に適用し、描画が遅れても
+                    # 入力とルールの順序が実際の時刻どおりになるようにする
+                    for step_end in pacer.step_ends(dt, now):
+                        while pending_game_keys and event_time(pending_game_keys[0], now) < step_end:
+                            apply_game_key(pending_game_keys.pop(0), now)
+                        auto_shift(step_end)
+                        game.update_rules(pacer.sim_dt)
+                    game.update_effects(dt)
+                else:
+                    game.update(dt)
 
                 # ゲーム画面の描画
                 buttons = game.draw(screen)
@@ -510,6 +527,7 @@ def main():
 
         # 画面の更新
         pygame.display.flip()
+        latency_probe.frame_presented(pygame.time.get_ticks() / 1000)
 
     # ゲーム終了時の処理
     pygame.quit()
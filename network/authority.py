@@ -0,0 +1,215 @@
+# サーバー権威の対戦シミュレーション（pygame非依存）
+import threading
+from typing import Dict, List, Tuple, Any, Optional, Iterable
+from engine import TetrisEngine, VersusMatch, ATTACK_DELAY_TICKS, TICK_RATE, GARBAGE_MESSINESS
+from network.protocol import GameAction
+
+# 権威状態を配信する間隔（ティック数、10Hz）
+STATE_INTERVAL_TICKS = TICK_RATE // 10
+
+# 到着を通知したガベージをクライアントが適用するまでの猶予（過ぎたらサーバーが適用する）。
+# 猶予はクライアントが通知を受け取れる最初のティック（通知時点の確定済みティック）から数える
+GARBAGE_GRACE_TICKS = TICK_RATE
+
+# クライアントが受信した権威状態のティックより先に進めるティック数の上限（0.5秒）
+MAX_CLIENT_LEAD_TICKS = TICK_RATE // 2
+
+# サーバーのシミュレーションより先のティックとして受け付ける上限（30秒）
+MAX_TICKS_AHEAD = 30 * TICK_RATE
+
+# クライアントから受け付けるアクション
+ALLOWED_ACTIONS = frozenset(action.value for action in (
+    GameAction.MOVE_LEFT, GameAction.MOVE_RIGHT, GameAction.ROTATE_CW, GameAction.ROTATE_CCW,
+    GameAction.SOFT_DROP, GameAction.SOFT_DROP_END, GameAction.HARD_DROP, GameAction.HOLD,
+    GameAction.GARBAGE,
+))
+
+
+class _AuthoritativeVersus(VersusMatch):
+    """到着したガベージを即座に適用せず、クライアントの適用を待つ VersusMatch"""
+
+    def __init__(self, engines, confirmed_ticks: List[int], attack_delay_ticks=ATTACK_DELAY_TICKS):
+        super().__init__(engines, attack_delay_ticks)
+        # プレイヤーごとの確定済みティック（AuthoritativeMatch と共有）
+        self.confirmed_ticks = confirmed_ticks
+        # プレイヤーごとの未適用ガベージ [猶予の起点ティック, ライン数]（古い順）
+        self.owed: List[List[List[int]]] = [[] for _ in engines]
+        # プレイヤーごとの猶予切れでサーバーが適用したガベージのライン数（遅れて届く適用を照合する）
+        self.forced: List[List[int]] = [[] for _ in engines]
+        # 到着を通知するガベージ (プレイヤー番号, ライン数)
+        self.arrivals: List[Tuple[int, int]] = []
+
+    def _deliver_garbage(self, index, lines):
+        if self.engines[index].game_over:
+            return
+        # 相手を待っている間もクライアントは確定済みティックまで進んでいるので、
+        # 通知を受けて適用できるのはそれ以降のティックになる
+        self.owed[index].append([max(self.tick, self.confirmed_ticks[index]), lines])
+        self.arrivals.append((index, lines))
+
+
+class AuthoritativeMatch:
+    """サーバー側で各プレイヤーの入力列から対戦を再現するクラス
+
+    クライアントからは入力とティック番号だけを受け取り、全員の入力が確定した
+    ティックまでヘッドレスエンジンを進める。スコア・盤面・ガベージ・勝敗は
+    サーバーの計算結果を正とする。ルームごとのスレッドは持たず、
+    入力が届いたときに受信スレッドからまとめて進める。
+
+    ガベージはサーバーで到着が決まった時点でクライアントに通知し、クライアントは
+    受け取ったティックで GARBAGE アクションとして適用して送り返す。穴位置は
+    双方が共有シードのガベージ用乱数で決めるため、送られてきた穴位置は使わない。
+    """
+
+    def __init__(self, player_ids: Iterable[str], seed: int, game_mode: str = "marathon",
+                 attack_delay_ticks: int = ATTACK_DELAY_TICKS, garbage_messiness: float = GARBAGE_MESSINESS):
+        self.seed = seed
+        self.player_ids = list(player_ids)
+        self.index = {player_id: i for i, player_id in enumerate(self.player_ids)}
+        self.engines = [TetrisEngine(game_mode, seed=seed, garbage_messiness=garbage_messiness)
+                        for _ in self.player_ids]
+
+        # プレイヤーごと：ティック -> 入力リスト
+        self.pending_inputs: List[Dict[int, List[Tuple[str, Dict[str, Any]]]]] = [{} for _ in self.player_ids]
+        # プレイヤーごと：このティック未満の入力はすべて受信済み
+        self.confirmed_ticks = [0 for _ in self.player_ids]
+        self.match = _AuthoritativeVersus(self.engines, self.confirmed_ticks, attack_delay_ticks)
+
+        self.last_state_tick = 0
+        self.finished = False
+        self.winner: Optional[str] = None
+        self.result_reported = False
+        self.lock = threading.Lock()
+
+    @property
+    def tick(self) -> int:
+        """シミュレーション済みのティック"""
+        return self.match.tick
+
+    def add_input(self, player_id: str, tick: int, action: str, data: Optional[Dict[str, Any]] = None):
+        """プレイヤーの入力を追加（不正な入力・過去のティックは無視する）"""
+        index = self.index.get(player_id)
+        if index is None or action not in ALLOWED_ACTIONS:
+            return
+
+        with self.lock:
+            if tick < self.confirmed_ticks[index] or tick > self.match.tick + MAX_TICKS_AHEAD:
+                return
+            if action == GameAction.GARBAGE.value:
+                # ライン数のみ受け取り、実際に適用する量は進めるときに検証する
+                data = {"lines": int((data or {}).get("lines", 1))}
+            else:
+                data = {}
+            self.pending_inputs[index].setdefault(tick, []).append((action, data))
+            self.confirmed_ticks[index] = tick
+
+    def confirm(self, player_id: str, tick: int):
+        """プレイヤーが tick まで進んだことを記録"""
+        index = self.index.get(player_id)
+        if index is None:
+            return
+
+        with self.lock:
+            tick = min(tick, self.match.tick + MAX_TICKS_AHEAD)
+            if tick > self.confirmed_ticks[index]:
+                self.confirmed_ticks[index] = tick
+
+    def forfeit(self, player_id: str):
+        """切断・退出したプレイヤーを敗北扱いにする"""
+        index = self.index.get(player_id)
+        if index is None:
+            return
+
+        with self.lock:
+            self.engines[index].game_over = True
+
+    def advance(self) -> List[Tuple[str, int]]:
+        """全員の入力が確定したティックまで進め、到着したガベージ (player_id, ライン数) を返す"""
+        with self.lock:
+            if self.finished:
+                return []
+
+            # ゲームオーバーになったプレイヤーの入力は待たない
+            alive = [i for i, engine in enumerate(self.engines) if not engine.game_over]
+            target = min((self.confirmed_ticks[i] for i in alive), default=self.match.tick)
+
+            while self.match.tick < target and not self._check_finished():
+                self.match.step([self._take_inputs(i) for i in range(len(self.engines))])
+            self._check_finished()
+
+            arrivals = [(self.player_ids[i], lines) for i, lines in self.match.arrivals]
+            self.match.arrivals.clear()
+            return arrivals
+
+    def _take_inputs(self, index: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """現在のティックの入力を取り出し、ガベージ適用を検証する"""
+        tick = self.match.tick
+        owed = self.match.owed[index]
+        forced = self.match.forced[index]
+        inputs = []
+        for action, data in self.pending_inputs[index].pop(tick, ()):
+            if action == GameAction.GARBAGE.value:
+                lines = self._take_owed(owed, data["lines"])
+                if lines <= 0:
+                    # サーバーが先に適用した分の遅れた適用なら照合だけして捨てる
+                    # （それ以外は届いていないガベージなので適用させない）
+                    if forced and forced[0] == data["lines"]:
+                        forced.pop(0)
+                    continue
+                data = {"lines": lines}
+            inputs.append((action, data))
+
+        # 猶予を過ぎても適用されないガベージはサーバー側で適用する
+        while owed and owed[0][0] + GARBAGE_GRACE_TICKS <= tick:
+            lines = owed.pop(0)[1]
+            forced.append(lines)
+            inputs.append((GameAction.GARBAGE.value, {"lines": lines}))
+        return inputs
+
+    @staticmethod
+    def _take_owed(owed: List[List[int]], lines: int) -> int:
+        """最も古い未適用ガベージが lines と一致すれば取り出す（通知した攻撃単位で適用する）"""
+        if not owed or owed[0][1] != lines:
+            return 0
+        return owed.pop(0)[1]
+
+    def _check_finished(self) -> bool:
+        """決着したか判定する"""
+        alive = [i for i, engine in enumerate(self.engines) if not engine.game_over]
+        if len(alive) > 1:
+            return False
+        self.finished = True
+        self.winner = self.player_ids[alive[0]] if alive else None
+        return True
+
+    def pop_result(self) -> Tuple[bool, Optional[str]]:
+        """決着していれば一度だけ (True, 勝者ID) を返す（引き分けは勝者 None）"""
+        with self.lock:
+            if not self.finished or self.result_reported:
+                return False, None
+            self.result_reported = True
+            return True, self.winner
+
+    def should_send_state(self, interval: int = STATE_INTERVAL_TICKS) -> bool:
+        """前回の配信から interval ティック以上進んだか（決着時は必ず配信）"""
+        with self.lock:
+            if self.finished or self.match.tick - self.last_state_tick >= interval:
+                self.last_state_tick = self.match.tick
+                return True
+            return False
+
+    def get_state(self) -> Dict[str, Any]:
+        """全員の権威状態を取得（配信用）"""
+        with self.lock:
+            players = {}
+            for i, (player_id, engine) in enumerate(zip(self.player_ids, self.engines)):
+                state = engine.get_state()
+                state["grid"] = [row[:] for row in state["grid"]]
+                state["pending_garbage"] = self.match.pending_garbage(i)
+                players[player_id] = state
+            return {
+                "tick": self.match.tick,
+                "players": players,
+                "finished": self.finished,
+                "winner": self.winner,
+            }
@@ -1,10 +1,22 @@
 # クライアント側通信
 import socket
+import struct
 import threading
 import json
 import time
 from typing import Callable, Optional, Dict, Any
 from network.protocol import Protocol, MessageType, GameAction
+from network.clock import ClockSync, PING_INTERVAL
+from network.framing import FrameReader, FrameError, decode_frame
+from network.outbox import Outbox, COALESCE_EVENTS
+
+try:
+    # 送信バッファに残っているバイト数の取得（取得できない環境では send_backlog が 0 を返す）
+    import fcntl
+    import termios
+    SIOCOUTQ = termios.TIOCOUTQ
+except (ImportError, AttributeError):
+    SIOCOUTQ = None
 
 
 class TetrisClient:
@@ -14,6 +26,7 @@ class TetrisClient:
         self.socket: Optional[socket.socket] = None
         self.connected = False
         self.player_name = ""
+        self.player_id = ""  # サーバーが割り当てたID（接続応答で設定）
         self.room_id = ""
         
         # コールバック関数
@@ -25,6 +38,17 @@ class TetrisClient:
         # 受信スレッド
         self.receive_thread: Optional[threading.Thread] = None
         self.running = False
+        
+        # 通信品質の計測（PING/PONG）
+        self.clock = ClockSync()
+        self.ping_thread: Optional[threading.Thread] = None
+        
+        # ゲーム・ロビー・PING の各スレッドから同じソケットに書き込むため
+        self.send_lock = threading.Lock()
+        
+        # 送信のまとめ送り（有効時はゲームの送信を溜め、flush で1フレームにして送る）
+        self.batch_mode = False
+        self.outbox = Outbox()
     
     def connect(self, host: str, port: int, player_name: str) -> bool:
         """サーバーに接続"""
@@ -34,6 +58,9 @@ class TetrisClient:
             self.socket.connect((host, port))
             
             self.player_name = player_name
+            self.clock = ClockSync()
+            self.batch_mode = False
+            self.outbox = Outbox()
             self.connected = True
             self.running = True
             
@@ -45,6 +72,10 @@ class TetrisClient:
             self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
             self.receive_thread.start()
             
+            # PINGスレッドを開始
+            self.ping_thread = threading.Thread(target=self._ping_loop, daemon=True)
+            self.ping_thread.start()
+            
             if self.on_connected:
                 self.on_connected()
             
@@ -96,6 +127,20 @@ class TetrisClient:
                 self.on_error("ROOM_ERROR", f"ルーム参加エラー: {str(e)}")
             return False
     
+    def spectate_room(self, room_id: str, password: Optional[str] = None) -> bool:
+        """ルームを観戦（対戦中の盤面などが一定間隔でまとめて届く。やめるときは leave_room）"""
+        if not self.connected:
+            return False
+        
+        try:
+            message = Protocol.create_join_room_message(room_id, password, spectate=True)
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("ROOM_ERROR", f"観戦エラー: {str(e)}")
+            return False
+    
     def leave_room(self) -> bool:
         """ルームから退出"""
         if not self.connected:
@@ -111,6 +156,53 @@ class TetrisClient:
                 self.on_error("ROOM_ERROR", f"ルーム退出エラー: {str(e)}")
             return False
     
+    def list_rooms(self, subscribe: bool = False, **options) -> bool:
+        """ルーム一覧を取得（subscribe=True で以降の変更をプッシュで受け取る）"""
+        if not self.connected:
+            return False
+        
+        try:
+            if subscribe:
+                options["subscribe"] = True
+            message = Protocol.create_list_rooms_message(**options)
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("ROOM_ERROR", f"ルーム一覧取得エラー: {str(e)}")
+            return False
+    
+    def enqueue_match(self, rating: Optional[int] = None) -> bool:
+        """クイックマッチの待ち行列に登録（計測済みの RTT も送り、近い相手と組まれやすくする）"""
+        if not self.connected:
+            return False
+        
+        try:
+            kwargs = {"rtt": self.clock.srtt}
+            if rating is not None:
+                kwargs["rating"] = rating
+            message = Protocol.create_matchmaking_message("enqueue", **kwargs)
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("MATCH_ERROR", f"マッチング登録エラー: {str(e)}")
+            return False
+    
+    def cancel_match(self) -> bool:
+        """クイックマッチの待ち行列から抜ける"""
+        if not self.connected:
+            return False
+        
+        try:
+            message = Protocol.create_matchmaking_message("cancel")
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("MATCH_ERROR", f"マッチング取り消しエラー: {str(e)}")
+            return False
+    
     def send_game_action(self, action: GameAction, **kwargs) -> bool:
         """ゲームアクションを送信"""
         if not self.connected:
@@ -118,7 +210,7 @@ class TetrisClient:
         
         try:
             message = Protocol.create_action_message(action, **kwargs)
-            self._send_message(message)
+            self._queue_or_send(message)
             return True
         except Exception as e:
             if self.on_error:
@@ -132,7 +224,8 @@ class TetrisClient:
         
         try:
             message = Protocol.create_game_state_message(game_state)
-            self._send_message(message)
+            event = game_state.get("event")
+            self._queue_or_send(message, event if event in COALESCE_EVENTS else None)
             return True
         except Exception as e:
             if self.on_error:
@@ -153,6 +246,25 @@ class TetrisClient:
                 self.on_error("CHAT_ERROR", f"チャット送信エラー: {str(e)}")
             return False
     
+    def _queue_or_send(self, message: str, key: Optional[str] = None):
+        """まとめ送りが有効なら送信キューに積み、無効ならすぐに送信"""
+        if self.batch_mode:
+            self.outbox.add(message, key)
+        else:
+            self._send_message(message)
+    
+    def flush(self) -> bool:
+        """溜まっているメッセージを1回の書き込みで送信（ゲームの1ティックの最後に呼ぶ）"""
+        messages = self.outbox.take()
+        if not messages or not self.connected:
+            return False
+        
+        if len(messages) == 1:
+            self._send_message(messages[0])
+        else:
+            self._send_message(Protocol.create_batch_message(messages))
+        return True
+    
     def _send_message(self, message: str):
         """メッセージを送信（内部用）"""
         if self.socket and self.connected:
@@ -160,33 +272,29 @@ class TetrisClient:
                 # メッセージ長を先頭に付けて送信
                 message_bytes = message.encode('utf-8')
                 length = len(message_bytes)
-                self.socket.sendall(length.to_bytes(4, byteorder='big') + message_bytes)
+                with self.send_lock:
+                    self.socket.sendall(length.to_bytes(4, byteorder='big') + message_bytes)
             except Exception as e:
                 self._handle_connection_error(f"送信エラー: {str(e)}")
     
     def _receive_loop(self):
         """受信ループ（別スレッドで実行）"""
+        reader = FrameReader(self.socket)
         while self.running and self.connected:
             try:
-                # メッセージ長を受信
-                length_bytes = self._recv_exactly(4)
-                if not length_bytes:
-                    break
-                
-                message_length = int.from_bytes(length_bytes, byteorder='big')
-                if message_length <= 0 or message_length > 1024 * 1024:  # 1MBまで
-                    break
-                
-                # メッセージ本体を受信
-                message_bytes = self._recv_exactly(message_length)
-                if not message_bytes:
-                    break
-                
-                message_str = message_bytes.decode('utf-8')
-                message_data = Protocol.parse_message(message_str)
-                
-                if message_data and self.on_message_received:
-                    self.on_message_received(message_data)
+                # 1回の受信で届いている完全なメッセージをすべて取り出す
+                frames = reader.read_frames()
+            except socket.timeout:
+                continue
+            except (EOFError, FrameError, OSError):
+                break
+            
+            try:
+                received_at = time.time()
+                for frame in frames:
+                    message_data = Protocol.parse_message(decode_frame(frame))
+                    if message_data:
+                        self._handle_received(message_data, received_at)
                 
             except Exception as e:
                 if self.running:  # 正常終了時はエラーを報告しない
@@ -195,18 +303,35 @@ class TetrisClient:
         
         self._close_connection()
     
-    def _recv_exactly(self, size: int) -> Optional[bytes]:
-        """指定したサイズのデータを確実に受信"""
-        data = b''
-        while len(data) < size:
+    def _handle_received(self, message_data: Dict[str, Any], received_at: float):
+        """受信したメッセージを処理"""
+        # まとめ送りされたメッセージは1つずつ処理する
+        if message_data.get("type") == MessageType.BATCH.value:
+            for message in message_data.get("data", {}).get("messages", []):
+                if isinstance(message, dict) and "type" in message:
+                    self._handle_received(message, received_at)
+            return
+        
+        # PONGは計測に使い、アプリケーションには渡さない
+        if message_data.get("type") == MessageType.PONG.value:
+            self.clock.on_pong(message_data.get("data", {}), received_at)
+            return
+        
+        # 接続応答で割り当てられたプレイヤーIDを記録
+        if message_data.get("type") == MessageType.CONNECT.value:
+            self.player_id = message_data.get("data", {}).get("player_id", self.player_id)
+        
+        if self.on_message_received:
+            self.on_message_received(message_data)
+    
+    def _ping_loop(self):
+        """PINGループ（RTT・ジッター・時刻オフセットの計測）"""
+        while self.running and self.connected:
             try:
-                chunk = self.socket.recv(size - len(data))
-                if not chunk:
-                    return None
-                data += chunk
-            except:
-                return None
-        return data
+                self._send_message(Protocol.create_ping_message(self.clock.create_ping()))
+            except Exception:
+                break
+            time.sleep(PING_INTERVAL)
     
     def _handle_connection_error(self, error_message: str):
         """接続エラーを処理"""
@@ -233,6 +358,30 @@ class TetrisClient:
         """接続状態を取得"""
         return self.connected
     
+    def server_time(self) -> float:
+        """サーバーの時刻（推定）を取得"""
+        return self.clock.server_time()
+    
+    def send_backlog(self) -> float:
+        """送信バッファに残っている量（バッファサイズに対する割合。取得できない環境では 0）"""
+        if SIOCOUTQ is None or not (self.socket and self.connected):
+            return 0.0
+        try:
+            (unsent,) = struct.unpack('i', fcntl.ioctl(self.socket.fileno(), SIOCOUTQ, bytes(4)))
+            size = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        except OSError:
+            return 0.0
+        return unsent / size if size > 0 else 0.0
+    
+    def get_latency_info(self) -> Dict[str, Any]:
+        """RTT・ジッター・損失率・時刻オフセットを取得"""
+        return {
+            "connected": self.connected,
+            "protocol": "TCP",
+            "quality": self.clock.quality(),
+            **self.clock.get_stats()
+        }
+    
     def get_player_name(self) -> str:
         """プレイヤー名を取得"""
         return self.player_name
@@ -0,0 +1,155 @@
+# 通信品質の計測とサーバー時刻の推定（PING/PONG）
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+# PING の送信間隔（秒）
+PING_INTERVAL = 1.0
+
+# この時間内に PONG が返らなければ損失とみなす（秒）
+PING_TIMEOUT = 3.0
+
+# 時刻オフセットの推定に使う直近のサンプル数
+OFFSET_SAMPLES = 8
+
+# 損失率の計算に使う直近の PING 数
+LOSS_WINDOW = 50
+
+
+class ClockSync:
+    """PING/PONG による RTT・ジッター・損失率の計測とサーバー時刻の推定
+
+    NTP と同じく4つの時刻（クライアント送信 t0・サーバー受信 t1・サーバー送信 t2・
+    クライアント受信 t3）から RTT = (t3 - t0) - (t2 - t1)、
+    オフセット = ((t1 - t0) + (t2 - t3)) / 2 を求める。オフセットは直近のサンプルのうち
+    RTT が最小のもの（経路の偏りが最も小さいもの）を採用する。
+    平滑化 RTT は RFC 6298、ジッターは RFC 3550 の計算式に従う。
+    """
+
+    def __init__(self, ping_timeout: float = PING_TIMEOUT):
+        self.ping_timeout = ping_timeout
+        self.next_ping_id = 0
+        # ping_id -> 送信時刻（ローカル）
+        self.outstanding: Dict[int, float] = {}
+        # 直近の (RTT, オフセット)
+        self.samples = deque(maxlen=OFFSET_SAMPLES)
+        # 直近の PING の結果（True = PONG 受信、False = 損失）
+        self.results = deque(maxlen=LOSS_WINDOW)
+
+        self.offset = 0.0
+        self.last_rtt: Optional[float] = None
+        self.min_rtt: Optional[float] = None
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.jitter = 0.0
+
+        self.pings_sent = 0
+        self.pongs_received = 0
+        self.lock = threading.Lock()
+
+    def create_ping(self) -> Dict[str, Any]:
+        """送信する PING のデータを作成"""
+        with self.lock:
+            self._expire_outstanding()
+            ping_id = self.next_ping_id
+            self.next_ping_id += 1
+            now = time.time()
+            self.outstanding[ping_id] = now
+            self.pings_sent += 1
+            return {"ping_id": ping_id, "client_time": now}
+
+    @staticmethod
+    def create_pong(ping_data: Dict[str, Any], received_at: float) -> Dict[str, Any]:
+        """サーバー側：受信した PING に対する PONG のデータを作成"""
+        return {
+            "ping_id": ping_data.get("ping_id"),
+            "client_time": ping_data.get("client_time"),
+            "server_receive_time": received_at,
+            "server_send_time": time.time(),
+        }
+
+    def on_pong(self, data: Dict[str, Any], received_at: Optional[float] = None):
+        """受信した PONG から計測値を更新"""
+        t3 = received_at if received_at is not None else time.time()
+        with self.lock:
+            sent_at = self.outstanding.pop(data.get("ping_id"), None)
+            if sent_at is None:
+                return  # タイムアウト済み・重複
+
+            t0 = sent_at
+            t1 = data.get("server_receive_time", t0)
+            t2 = data.get("server_send_time", t1)
+            rtt = max(0.0, (t3 - t0) - (t2 - t1))
+            offset = ((t1 - t0) + (t2 - t3)) / 2
+
+            self.pongs_received += 1
+            self.results.append(True)
+            self._update_rtt(rtt)
+            self.samples.append((rtt, offset))
+            self.offset = min(self.samples)[1]
+
+    def _update_rtt(self, rtt: float):
+        """平滑化 RTT・RTT 変動・ジッターを更新"""
+        if self.last_rtt is not None:
+            # RFC 3550: J = J + (|D| - J) / 16
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+        self.last_rtt = rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def _expire_outstanding(self):
+        """タイムアウトした PING を損失として数える（ロック取得済みで呼ぶ）"""
+        now = time.time()
+        for ping_id in [i for i, sent_at in self.outstanding.items() if now - sent_at > self.ping_timeout]:
+            del self.outstanding[ping_id]
+            self.results.append(False)
+
+    def server_time(self, local_time: Optional[float] = None) -> float:
+        """ローカル時刻をサーバーの時刻に変換（省略時は現在時刻）"""
+        return (local_time if local_time is not None else time.time()) + self.offset
+
+    def local_time(self, server_time: float) -> float:
+        """サーバーの時刻をローカル時刻に変換"""
+        return server_time - self.offset
+
+    def loss_rate(self) -> float:
+        """直近の PING の損失率（0.0〜1.0）"""
+        with self.lock:
+            self._expire_outstanding()
+            if not self.results:
+                return 0.0
+            return self.results.count(False) / len(self.results)
+
+    def quality(self) -> str:
+        """接続品質の目安（ロビー表示用）"""
+        if self.srtt is None:
+            return "計測中"
+        loss = self.loss_rate()
+        if self.srtt < 0.05 and self.jitter < 0.01 and loss < 0.01:
+            return "良好"
+        if self.srtt < 0.15 and self.jitter < 0.03 and loss < 0.05:
+            return "普通"
+        return "不安定"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """計測値を取得（秒単位）"""
+        loss = self.loss_rate()
+        with self.lock:
+            return {
+                "rtt": self.last_rtt,
+                "srtt": self.srtt,
+                "rttvar": self.rttvar,
+                "min_rtt": self.min_rtt,
+                "jitter": self.jitter,
+                "clock_offset": self.offset,
+                "loss_rate": loss,
+                "pings_sent": self.pings_sent,
+                "pongs_received": self.pongs_received,
+            }
@@ -0,0 +1,238 @@
+# マルチプロセスサーバー（SO_REUSEPORT で1つのポートを複数のワーカーで共有）
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+# 引き継ぎメッセージのヘッダー（JSON 部分の長さ）のサイズ
+HANDOFF_HEADER_SIZE = 4
+
+# 引き継ぎの応答を待つ時間（秒）
+HANDOFF_TIMEOUT = 2.0
+
+# 停止時にワーカーの終了を待つ時間（秒）
+WORKER_STOP_TIMEOUT = 3.0
+
+
+def reuse_port_supported() -> bool:
+    """SO_REUSEPORT とソケットの受け渡し（SCM_RIGHTS）が使える環境か"""
+    return hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "send_fds") and hasattr(socket, "AF_UNIX")
+
+
+class RoomRegistry:
+    """ワーカー間で共有するルームの所有者表
+
+    共有ディレクトリにルームごとのファイル（中身は所有ワーカー番号）を置く。
+    作成は一時ファイルからのハードリンクで行うため、同じルームIDを複数のワーカーが
+    同時に作成しても1つだけが成功し、読み手が書きかけのファイルを見ることもない。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, room_id: str) -> str:
+        """ルームIDに対応するファイルのパス（任意の文字列を使えるようハッシュにする）"""
+        return os.path.join(self.path, hashlib.sha1(room_id.encode('utf-8')).hexdigest())
+
+    def claim(self, room_id: str, worker_index: int) -> bool:
+        """ルームの所有権を取得（既に他で作成されていれば False）"""
+        entry = self._entry_path(room_id)
+        temp = f"{entry}.{worker_index}.{threading.get_ident()}.tmp"
+        with open(temp, "w") as f:
+            f.write(str(worker_index))
+        try:
+            os.link(temp, entry)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(temp)
+
+    def owner(self, room_id: str) -> Optional[int]:
+        """ルームを所有しているワーカー番号（存在しなければ None）"""
+        try:
+            with open(self._entry_path(room_id)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def release(self, room_id: str, worker_index: int):
+        """所有しているルームを削除"""
+        if self.owner(room_id) != worker_index:
+            return
+        try:
+            os.unlink(self._entry_path(room_id))
+        except OSError:
+            pass
+
+
+class ClusterWorker:
+    """ワーカープロセス間の連携（ルームの所有者表と接続の引き継ぎ）
+
+    接続はカーネルが SO_REUSEPORT でワーカーに振り分けるため、対戦相手が別の
+    ワーカーに接続することがある。ルームは作成したワーカーが所有し、他のワーカーで
+    JOIN_ROOM を受けた場合はクライアントのソケット自体を UNIX ドメインソケット経由で
+    所有ワーカーに渡す。クライアントから見ると同じ TCP 接続のまま処理が続く。
+    """
+
+    def __init__(self, index: int, workers: int, ipc_dir: str):
+        self.index = index
+        self.workers = workers
+        self.ipc_dir = ipc_dir
+        self.registry = RoomRegistry(os.path.join(ipc_dir, "rooms"))
+        self.listener: Optional[socket.socket] = None
+        self.running = False
+
+    def socket_path(self, index: int) -> str:
+        """ワーカーの引き継ぎ受付ソケットのパス"""
+        return os.path.join(self.ipc_dir, f"worker-{index}.sock")
+
+    def start(self, on_handoff: Callable[[socket.socket, Dict[str, Any], bytes], None]):
+        """引き継ぎの受付を開始（on_handoff(クライアントソケット, プレイヤー情報, 未処理の受信データ)）"""
+        path = self.socket_path(self.index)
+        if os.path.exists(path):
+            os.unlink(path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen(16)
+        self.running = True
+        threading.Thread(target=self._accept_loop, args=(on_handoff,), daemon=True).start()
+
+    def stop(self):
+        """引き継ぎの受付を停止"""
+        self.running = False
+        if self.listener:
+            try:
+                self.listener.close()
+            except OSError:
+                pass
+            self.listener = None
+        try:
+            os.unlink(self.socket_path(self.index))
+        except OSError:
+            pass
+
+    def hand_off(self, owner: int, client_socket: socket.socket, player_state: Dict[str, Any],
+                 pending: bytes) -> bool:
+        """クライアントの接続を所有ワーカーに渡す（成功したら呼び出し側はソケットを閉じてよい）"""
+        header = json.dumps(player_state).encode('utf-8')
+        payload = len(header).to_bytes(HANDOFF_HEADER_SIZE, byteorder='big') + header + pending
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(HANDOFF_TIMEOUT)
+                conn.connect(self.socket_path(owner))
+                sent = socket.send_fds(conn, [payload], [client_socket.fileno()])
+                conn.sendall(payload[sent:])
+                conn.shutdown(socket.SHUT_WR)
+                return conn.recv(1) == b"\x01"
+        except OSError as e:
+            print(f"接続の引き継ぎに失敗 (worker {self.index} -> {owner}): {e}")
+            return False
+
+    def _accept_loop(self, on_handoff: Callable[[socket.socket, Dict[str, Any], bytes], None]):
+        """引き継ぎ受付ループ（別スレッドで実行）"""
+        while self.running:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                break
+            with conn:
+                try:
+                    conn.settimeout(HANDOFF_TIMEOUT)
+                    client_socket, player_state, pending = self._receive_handoff(conn)
+                except (OSError, ValueError) as e:
+                    print(f"接続の引き継ぎ受信エラー: {e}")
+                    continue
+                try:
+                    conn.sendall(b"\x01")
+                except OSError:
+                    client_socket.close()
+                    continue
+            on_handoff(client_socket, player_state, pending)
+
+    @staticmethod
+    def _receive_handoff(conn: socket.socket):
+        """引き継ぎメッセージを受信して (ソケット, プレイヤー情報, 未処理の受信データ) を返す"""
+        data, fds, _, _ = socket.recv_fds(conn, 64 * 1024, 1)
+        if not fds:
+            raise ValueError("ソケットが渡されていません")
+        client_socket = socket.socket(fileno=fds[0])
+
+        chunks = [data]
+        while True:
+            chunk = conn.recv(64 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        payload = b"".join(chunks)
+
+        header_end = HANDOFF_HEADER_SIZE + int.from_bytes(payload[:HANDOFF_HEADER_SIZE], byteorder='big')
+        player_state = json.loads(payload[HANDOFF_HEADER_SIZE:header_end])
+        return client_socket, player_state, payload[header_end:]
+
+
+def _worker_main(index: int, workers: int, ipc_dir: str, host: str, port: int, metrics_port: Optional[int]):
+    """ワーカープロセスのエントリポイント"""
+    from network.server import TetrisServer
+
+    server = TetrisServer(host, port, cluster=ClusterWorker(index, workers, ipc_dir), metrics_port=metrics_port)
+
+    def stop_worker(signum, frame):
+        server.stop()
+
+    signal.signal(signal.SIGINT, stop_worker)
+    signal.signal(signal.SIGTERM, stop_worker)
+    server.start()
+
+
+def run_workers(host: str, port: int, workers: int, metrics_port: Optional[int] = None) -> bool:
+    """ワーカープロセスを起動し、すべて終了するまで待つ（計測値のポートはワーカー番号だけずらす）"""
+    if not reuse_port_supported():
+        print("この環境では SO_REUSEPORT が使えないため、マルチプロセスモードは利用できません")
+        return False
+
+    ipc_dir = tempfile.mkdtemp(prefix="tetris-cluster-")
+    processes: List[multiprocessing.Process] = []
+    stopping = False
+
+    def stop_all(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    previous_int = signal.signal(signal.SIGINT, stop_all)
+    previous_term = signal.signal(signal.SIGTERM, stop_all)
+    try:
+        for index in range(workers):
+            process = multiprocessing.Process(target=_worker_main, args=(index, workers, ipc_dir, host, port, metrics_port),
+                                              name=f"tetris-worker-{index}")
+            process.start()
+            processes.append(process)
+        print(f"{workers} 個のワーカーを起動しました（共有ポート {port}）")
+
+        while not stopping and all(process.is_alive() for process in processes):
+            time.sleep(0.5)
+
+        # 1つでも終了したら全体を止める
+        stop_all(signal.SIGTERM, None)
+        deadline = time.time() + WORKER_STOP_TIMEOUT
+        for process in processes:
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        return True
+    finally:
+        signal.signal(signal.SIGINT, previous_int)
+        signal.signal(signal.SIGTERM, previous_term)
+        shutil.rmtree(ipc_dir, ignore_errors=True)
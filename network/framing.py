@@ -0,0 +1,115 @@
+# 長さ付きフレームの受信バッファ（4バイト長 + 本体）
+import socket
+from typing import List
+
+# フレーム長ヘッダーのサイズ
+LENGTH_SIZE = 4
+
+# 受信バッファの初期サイズ
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# 1フレームの最大サイズ（1MBまで）
+MAX_FRAME_SIZE = 1024 * 1024
+
+
+class FrameError(Exception):
+    """不正なフレーム長"""
+
+
+class FrameReader:
+    """再利用するバッファに recv_into で受信し、完全なフレームを切り出すクラス
+
+    1回の受信でバッファに溜まったフレームをすべて返すため、小さなメッセージが
+    続けて届いた場合はシステムコール1回で複数のメッセージを処理できる。
+    返すフレームはバッファの memoryview（コピーなし）なので、次に read_frames を
+    呼ぶまでに使い終えること。
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 max_frame_size: int = MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        # 未処理データの範囲 [start, end)
+        self.start = 0
+        self.end = 0
+
+    def read_frames(self) -> List[memoryview]:
+        """1回受信して完全なフレームの本体を返す（切断時は EOFError、不正な長さは FrameError）"""
+        self._make_room()
+        received = self.sock.recv_into(self.view[self.end:])
+        if received == 0:
+            raise EOFError("接続が閉じられました")
+        self.end += received
+        return self._split_frames()
+
+    def feed(self, data: bytes) -> List[memoryview]:
+        """受信済みのデータ（別ワーカーから引き継いだものなど）を追加して完全なフレームを返す"""
+        if not data:
+            return []
+        if self.end + len(data) > len(self.buffer):
+            pending = self.end - self.start
+            new_buffer = bytearray(max(len(self.buffer), pending + len(data)))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+            self.start = 0
+            self.end = pending
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return self._split_frames()
+
+    def pending_bytes(self) -> bytes:
+        """まだフレームとして切り出していない受信データ"""
+        return bytes(self.view[self.start:self.end])
+
+    def _split_frames(self) -> List[memoryview]:
+        """バッファから完全なフレームを切り出す"""
+        frames = []
+        while self.end - self.start >= LENGTH_SIZE:
+            length = int.from_bytes(self.view[self.start:self.start + LENGTH_SIZE], byteorder='big')
+            if length <= 0 or length > self.max_frame_size:
+                raise FrameError(f"不正なフレーム長: {length}")
+
+            frame_end = self.start + LENGTH_SIZE + length
+            if frame_end > self.end:
+                break
+            frames.append(self.view[self.start + LENGTH_SIZE:frame_end])
+            self.start = frame_end
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frames
+
+    def _make_room(self):
+        """末尾に受信できる空きを作る（未処理データを先頭に詰め、足りなければ拡張）"""
+        if self.end < len(self.buffer):
+            return
+
+        pending = self.end - self.start
+        needed = pending + LENGTH_SIZE
+        if pending >= LENGTH_SIZE:
+            length = int.from_bytes(self.view[self.start:self.start + LENGTH_SIZE], byteorder='big')
+            needed = max(needed, LENGTH_SIZE + min(length, self.max_frame_size) + 1)
+
+        if needed > len(self.buffer):
+            # 大きなフレーム用にバッファを拡張（以前に返した memoryview は古いバッファを指したまま）
+            new_buffer = bytearray(max(needed, len(self.buffer) * 2))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+
+def encode_frame(data: bytes) -> bytes:
+    """本体に長さヘッダーを付ける"""
+    return len(data).to_bytes(LENGTH_SIZE, byteorder='big') + data
+
+
+def decode_frame(frame: memoryview) -> str:
+    """フレーム本体を文字列にデコード"""
+    return str(frame, 'utf-8')
@@ -0,0 +1,107 @@
+# 相手盤面のジッターバッファ（到着順の並べ替え・遅れた再生・ピース位置の補間）
+import bisect
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# 相手の盤面を再生する遅れ（秒）。送信間隔とジッターを吸収できる長さにする
+RENDER_DELAY = 0.1
+
+# 溜めておくフレームの上限（超えたら古いものから捨てる）
+MAX_FRAMES = 32
+
+# これより大きく動いたピースは補間しない（ハードドロップなど）
+MAX_INTERPOLATE_CELLS = 3
+
+
+class JitterBuffer:
+    """相手から届いた game_state を並べ替えて一定時間遅れで再生するバッファ
+
+    フレームは送信側のシーケンス番号（なければタイムスタンプ）の順に並べ、再生済みより
+    古いフレームや重複は捨てる。再生する時刻は「現在のサーバー時刻 - delay」で、
+    その時刻以前の最新フレームを表示し、次のフレームとの間で操作中のピースの位置を
+    線形補間する。送信間隔を広げても相手の盤面が滑らかに動く。
+    """
+
+    def __init__(self, delay: float = RENDER_DELAY, max_frames: int = MAX_FRAMES):
+        self.delay = delay
+        self.max_frames = max_frames
+        # ((シーケンス番号, タイムスタンプ), フレーム)（キー順）
+        self.frames: List[Tuple[Tuple[int, float], Dict[str, Any]]] = []
+        # 最後に再生したフレームのキー（これ以前のフレームは遅れて届いても使わない）
+        self.played_key: Optional[Tuple[int, float]] = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(frame: Dict[str, Any]) -> Tuple[int, float]:
+        return frame.get("seq", 0), frame.get("timestamp", 0.0)
+
+    def push(self, frame: Dict[str, Any]) -> bool:
+        """フレームを追加（受信スレッドから呼ばれる）。遅れて届いた・重複したものは False"""
+        key = self._key(frame)
+        with self.lock:
+            if self.played_key is not None and key <= self.played_key:
+                self.dropped += 1
+                return False
+            index = bisect.bisect_left([entry[0] for entry in self.frames], key)
+            if index < len(self.frames) and self.frames[index][0] == key:
+                self.dropped += 1
+                return False
+            self.frames.insert(index, (key, frame))
+            if len(self.frames) > self.max_frames:
+                # 再生が追いつかない：古いフレームを飛ばす
+                del self.frames[:len(self.frames) - self.max_frames]
+                self.dropped += 1
+            return True
+
+    def sample(self, now: float) -> Optional[Dict[str, Any]]:
+        """now（サーバー時刻）に表示する相手の状態（まだ何も届いていなければ None）"""
+        render_time = now - self.delay
+        with self.lock:
+            if not self.frames:
+                return None
+
+            # render_time 以前の最新フレームまで進める（1つも来ていなければ最初のフレーム）
+            index = 0
+            while index + 1 < len(self.frames) and self.frames[index + 1][1].get("timestamp", 0.0) <= render_time:
+                index += 1
+            # 表示中のフレームより前はもう使わない
+            del self.frames[:index]
+            self.played_key, current = self.frames[0]
+            following = self.frames[1][1] if len(self.frames) > 1 else None
+
+        if following is None:
+            return current
+        return self._interpolate(current, following, render_time)
+
+    @staticmethod
+    def _interpolate(current: Dict[str, Any], following: Dict[str, Any], render_time: float) -> Dict[str, Any]:
+        """current と following の間で操作中のピースの位置を補間した状態"""
+        piece = current.get("current_piece") or {}
+        next_piece = following.get("current_piece") or {}
+        start = current.get("timestamp", 0.0)
+        end = following.get("timestamp", 0.0)
+        if (end <= start or render_time <= start or not piece.get("shape")
+                or piece.get("shape") != next_piece.get("shape")
+                or current.get("grid") != following.get("grid")):
+            # 固定・ホールドなどで別のピースになった場合は補間しない
+            return current
+
+        dx = next_piece.get("x", 0) - piece.get("x", 0)
+        dy = next_piece.get("y", 0) - piece.get("y", 0)
+        if (dx == 0 and dy == 0) or abs(dx) > MAX_INTERPOLATE_CELLS or abs(dy) > MAX_INTERPOLATE_CELLS:
+            return current
+
+        alpha = min(1.0, (render_time - start) / (end - start))
+        return {
+            **current,
+            "current_piece": {**piece, "x": piece.get("x", 0) + dx * alpha, "y": piece.get("y", 0) + dy * alpha}
+        }
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.played_key = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
@@ -0,0 +1,145 @@
+# マッチメイキング（レーティング・遅延の帯ごとの待ち行列と一定間隔のまとめてペアリング）
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# レーティング帯の幅
+RATING_BUCKET_WIDTH = 100
+
+# 待ち時間がこの秒数増えるごとに、許容するレーティング差を1帯分広げる
+WIDEN_SECONDS = 5.0
+
+# 許容するレーティング差の上限（帯の数）
+MAX_WIDEN_BUCKETS = 10
+
+# 遅延の帯（RTT の上限、秒）。これを超える RTT は最後の帯
+LATENCY_CLASSES = (0.05, 0.1, 0.2)
+
+# 待ち時間がこの秒数を超えたら遅延の帯が違う相手とも組む
+LATENCY_RELAX_SECONDS = 15.0
+
+# ペアリングを行う間隔（秒）
+MATCH_INTERVAL = 0.5
+
+# レーティングの既定値（クライアントが送らなかった場合）
+DEFAULT_RATING = 1000
+
+
+class MatchTicket:
+    """待ち行列の1エントリ"""
+
+    __slots__ = ("player_id", "rating", "rtt", "enqueued_at", "bucket")
+
+    def __init__(self, player_id: str, rating: int, rtt: Optional[float], enqueued_at: float):
+        self.player_id = player_id
+        self.rating = rating
+        self.rtt = rtt
+        self.enqueued_at = enqueued_at
+        self.bucket = (latency_class(rtt), rating // RATING_BUCKET_WIDTH)
+
+    def window(self, now: float) -> int:
+        """現在許容するレーティング差"""
+        widened = min(MAX_WIDEN_BUCKETS, int((now - self.enqueued_at) // WIDEN_SECONDS))
+        return RATING_BUCKET_WIDTH * (1 + widened)
+
+    def accepts(self, other: "MatchTicket", now: float) -> bool:
+        """other と組んでよいか"""
+        if abs(self.rating - other.rating) > min(self.window(now), other.window(now)):
+            return False
+        if self.bucket[0] == other.bucket[0]:
+            return True
+        return min(now - self.enqueued_at, now - other.enqueued_at) >= LATENCY_RELAX_SECONDS
+
+
+def latency_class(rtt: Optional[float]) -> int:
+    """RTT の帯（未計測は最も遅い帯）"""
+    if rtt is None:
+        return len(LATENCY_CLASSES)
+    for index, limit in enumerate(LATENCY_CLASSES):
+        if rtt < limit:
+            return index
+    return len(LATENCY_CLASSES)
+
+
+class MatchmakingQueue:
+    """クイックマッチの待ち行列
+
+    (遅延の帯, レーティング帯) ごとに登録順の辞書を持つため、登録・取り消しは O(1)。
+    ペアリングは一定間隔でまとめて行い、まず同じ帯の中で古い順に組み、
+    余った1人ずつ（帯の数以下）を待ち時間に応じて広げた範囲で隣の帯の相手と組む。
+    クライアントがルーム一覧をポーリングする必要はない。
+    """
+
+    def __init__(self):
+        # 帯 -> player_id -> チケット（登録順）
+        self.buckets: Dict[Tuple[int, int], Dict[str, MatchTicket]] = {}
+        self.tickets: Dict[str, MatchTicket] = {}
+        self.lock = threading.Lock()
+
+    def enqueue(self, player_id: str, rating: int = DEFAULT_RATING, rtt: Optional[float] = None,
+                now: Optional[float] = None) -> MatchTicket:
+        """待ち行列に追加（登録済みなら条件を更新し、待ち時間は引き継ぐ）"""
+        now = now if now is not None else time.time()
+        with self.lock:
+            previous = self._remove(player_id)
+            ticket = MatchTicket(player_id, rating, rtt, previous.enqueued_at if previous else now)
+            self._insert(ticket)
+            return ticket
+
+    def requeue(self, ticket: MatchTicket):
+        """組めなかったチケットを待ち時間を保ったまま戻す"""
+        with self.lock:
+            if ticket.player_id not in self.tickets:
+                self._insert(ticket)
+
+    def cancel(self, player_id: str) -> bool:
+        """待ち行列から削除"""
+        with self.lock:
+            return self._remove(player_id) is not None
+
+    def _insert(self, ticket: MatchTicket):
+        self.tickets[ticket.player_id] = ticket
+        self.buckets.setdefault(ticket.bucket, {})[ticket.player_id] = ticket
+
+    def _remove(self, player_id: str) -> Optional[MatchTicket]:
+        ticket = self.tickets.pop(player_id, None)
+        if ticket:
+            bucket = self.buckets[ticket.bucket]
+            del bucket[player_id]
+            if not bucket:
+                del self.buckets[ticket.bucket]
+        return ticket
+
+    def pair(self, now: Optional[float] = None) -> List[Tuple[MatchTicket, MatchTicket]]:
+        """組める相手同士を取り出す（古いチケットを優先）"""
+        now = now if now is not None else time.time()
+        pairs = []
+        with self.lock:
+            leftovers = []
+            for key in list(self.buckets):
+                bucket = self.buckets[key]
+                while len(bucket) >= 2:
+                    first = bucket[next(iter(bucket))]
+                    self._remove(first.player_id)
+                    second = bucket[next(iter(bucket))]
+                    self._remove(second.player_id)
+                    pairs.append((first, second))
+                if bucket:
+                    leftovers.append(bucket[next(iter(bucket))])
+
+            # 帯ごとに1人ずつ残った人を、レーティング順に隣同士で組む
+            leftovers.sort(key=lambda ticket: ticket.rating)
+            index = 0
+            while index + 1 < len(leftovers):
+                first, second = leftovers[index], leftovers[index + 1]
+                if first.accepts(second, now):
+                    self._remove(first.player_id)
+                    self._remove(second.player_id)
+                    pairs.append((first, second) if first.enqueued_at <= second.enqueued_at else (second, first))
+                    index += 2
+                else:
+                    index += 1
+        return pairs
+
+    def __len__(self) -> int:
+        return len(self.tickets)
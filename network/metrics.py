@@ -0,0 +1,298 @@
+# サーバーの計測値（メッセージ数・バイト数・処理時間・ロック待ち）と確認用 HTTP エンドポイント
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+
+# 定期ログの出力間隔（秒）
+LOG_INTERVAL = 60.0
+
+# パーセンタイル計算に使う直近のサンプル数
+SUMMARY_WINDOW = 1024
+
+# ルームごとのレートを求める期間（秒）と、そのためにカウンタを記録する間隔（秒）
+RATE_WINDOW = 10.0
+RATE_SAMPLE_INTERVAL = 1.0
+
+
+class Summary:
+    """所要時間の集計（件数・合計・最大と直近サンプルのパーセンタイル）"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self, window: int = SUMMARY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        """件数・平均・p50・p99・最大（秒）"""
+        values = sorted(self.samples)
+        if not values:
+            return {"count": self.count, "mean": 0.0, "p50": 0.0, "p99": 0.0, "max": self.max}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "p50": values[len(values) // 2],
+            "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+            "max": self.max,
+        }
+
+
+class TimedLock:
+    """取得までの待ち時間を計測するロック（threading.Lock と同じ使い方）"""
+
+    def __init__(self, name: str, metrics: "ServerMetrics"):
+        self.name = name
+        self.metrics = metrics
+        self.lock = threading.Lock()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        started = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            self.metrics.observe_lock_wait(self.name, time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ServerMetrics:
+    """サーバーの計測値
+
+    カウンタはメッセージ種別ごとの受信・送信数とバイト数、所要時間は処理・配信・
+    ロック待ちを集計する。ルームごとのフレーム数とティックは記録時に一定間隔で控えておき、
+    直近 RATE_WINDOW 秒の差分でレート（/秒）にする（取得しても状態は変わらないので、
+    定期ログと HTTP の取得が互いの値に影響しない）。現在値（プレイヤー数・送信キューの深さなど）は gauges に
+    登録した関数から取得時に読む。
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.messages_in = defaultdict(int)
+        self.bytes_in = defaultdict(int)
+        self.messages_out = defaultdict(int)
+        self.bytes_out = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.heartbeat_timeouts = 0
+
+        self.handle_time: Dict[str, Summary] = defaultdict(Summary)
+        self.fanout_time = Summary()
+        self.lock_wait: Dict[str, Summary] = defaultdict(Summary)
+
+        # ルームID -> [転送したフレーム数, 権威シミュレーションのティック]
+        self.room_counters: Dict[str, List[int]] = {}
+        # ルームID -> (記録時刻, フレーム数, ティック) の直近の記録（RATE_SAMPLE_INTERVAL ごと）
+        self.room_samples: Dict[str, Deque[Tuple[float, int, int]]] = {}
+
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.lock = threading.Lock()
+
+    # --- 記録 ---
+
+    def record_in(self, msg_type: str, size: int):
+        with self.lock:
+            self.messages_in[msg_type] += 1
+            self.bytes_in[msg_type] += size
+
+    def record_out(self, msg_type: str, size: int):
+        with self.lock:
+            self.messages_out[msg_type] += 1
+            self.bytes_out[msg_type] += size
+
+    def record_error(self, code: str):
+        with self.lock:
+            self.errors[code] += 1
+
+    def record_heartbeat_timeout(self, count: int = 1):
+        with self.lock:
+            self.heartbeat_timeouts += count
+
+    def observe_handle(self, msg_type: str, seconds: float):
+        with self.lock:
+            self.handle_time[msg_type].observe(seconds)
+
+    def observe_fanout(self, seconds: float):
+        with self.lock:
+            self.fanout_time.observe(seconds)
+
+    def observe_lock_wait(self, name: str, seconds: float):
+        with self.lock:
+            self.lock_wait[name].observe(seconds)
+
+    def record_room_frame(self, room_id: str):
+        with self.lock:
+            counters = self.room_counters.setdefault(room_id, [0, 0])
+            counters[0] += 1
+            self._sample_room(room_id, counters)
+
+    def record_room_tick(self, room_id: str, tick: int):
+        with self.lock:
+            counters = self.room_counters.setdefault(room_id, [0, 0])
+            counters[1] = tick
+            self._sample_room(room_id, counters)
+
+    def _sample_room(self, room_id: str, counters: List[int]):
+        """レート計算用にカウンタを控える（RATE_SAMPLE_INTERVAL ごと、ロック取得済みで呼ぶ）"""
+        now = time.time()
+        samples = self.room_samples.get(room_id)
+        if samples is None:
+            samples = deque(maxlen=int(RATE_WINDOW / RATE_SAMPLE_INTERVAL) + 2)
+            self.room_samples[room_id] = samples
+        elif now - samples[-1][0] < RATE_SAMPLE_INTERVAL:
+            return
+        samples.append((now, counters[0], counters[1]))
+
+    def remove_room(self, room_id: str):
+        with self.lock:
+            self.room_counters.pop(room_id, None)
+            self.room_samples.pop(room_id, None)
+
+    # --- 取得 ---
+
+    def _room_rates(self, now: float) -> Dict[str, Dict[str, float]]:
+        """直近 RATE_WINDOW 秒のルームごとのフレーム・ティックのレート（ロック取得済みで呼ぶ）"""
+        rates = {}
+        for room_id, (frames, tick) in self.room_counters.items():
+            # 期間内の最も古い記録からの差分（期間内に記録がなければ動いていないのでレートは 0）
+            base = next((sample for sample in self.room_samples[room_id] if sample[0] >= now - RATE_WINDOW), None)
+            if base is None:
+                rates[room_id] = {"frames_per_sec": 0.0, "ticks_per_sec": 0.0}
+                continue
+            sampled_at, last_frames, last_tick = base
+            elapsed = max(now - sampled_at, RATE_SAMPLE_INTERVAL)
+            rates[room_id] = {
+                "frames_per_sec": (frames - last_frames) / elapsed,
+                "ticks_per_sec": max(0, tick - last_tick) / elapsed,
+            }
+        return rates
+
+    def snapshot(self) -> Dict[str, Any]:
+        """すべての計測値を取得"""
+        now = time.time()
+        gauges = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception:
+                gauges[name] = None
+
+        with self.lock:
+            return {
+                "uptime": now - self.started_at,
+                "messages_in": dict(self.messages_in),
+                "bytes_in": dict(self.bytes_in),
+                "messages_out": dict(self.messages_out),
+                "bytes_out": dict(self.bytes_out),
+                "errors": dict(self.errors),
+                "heartbeat_timeouts": self.heartbeat_timeouts,
+                "handle_time": {t: s.snapshot() for t, s in self.handle_time.items()},
+                "fanout_time": self.fanout_time.snapshot(),
+                "lock_wait": {name: s.snapshot() for name, s in self.lock_wait.items()},
+                "rooms": self._room_rates(now),
+                "gauges": gauges,
+            }
+
+    @staticmethod
+    def render_text(snapshot: Dict[str, Any]) -> str:
+        """プレーンテキスト（1行1値、Prometheus のテキスト形式に近い書式）"""
+        lines = [f"uptime_seconds {snapshot['uptime']:.0f}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"{name} {value}")
+        for key in ("messages_in", "bytes_in", "messages_out", "bytes_out", "errors"):
+            for label, value in sorted(snapshot[key].items()):
+                lines.append(f'{key}{{type="{label}"}} {value}')
+        lines.append(f"heartbeat_timeouts {snapshot['heartbeat_timeouts']}")
+
+        def summary_lines(name: str, label: str, values: Dict[str, float]):
+            for stat in ("count", "mean", "p50", "p99", "max"):
+                value = values[stat] if stat == "count" else f"{values[stat] * 1000:.3f}"
+                suffix = "" if stat == "count" else "_ms"
+                lines.append(f'{name}_{stat}{suffix}{label} {value}')
+
+        for msg_type, values in sorted(snapshot["handle_time"].items()):
+            summary_lines("handle_time", f'{{type="{msg_type}"}}', values)
+        summary_lines("fanout_time", "", snapshot["fanout_time"])
+        for name, values in sorted(snapshot["lock_wait"].items()):
+            summary_lines("lock_wait", f'{{lock="{name}"}}', values)
+        for room_id, rates in sorted(snapshot["rooms"].items()):
+            for key, value in rates.items():
+                lines.append(f'room_{key}{{room="{room_id}"}} {value:.1f}')
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self) -> str:
+        """定期ログ用の1行"""
+        snap = self.snapshot()
+        elapsed = max(snap["uptime"], 1e-6)
+        gauges = snap["gauges"]
+        lock_p99 = max((s["p99"] for s in snap["lock_wait"].values()), default=0.0)
+        return (f"[metrics] players={gauges.get('players')} rooms={gauges.get('rooms')} "
+                f"in={sum(snap['messages_in'].values())} ({sum(snap['bytes_in'].values()) / elapsed / 1024:.1f}KB/s) "
+                f"out={sum(snap['messages_out'].values())} ({sum(snap['bytes_out'].values()) / elapsed / 1024:.1f}KB/s) "
+                f"fanout_p99={snap['fanout_time']['p99'] * 1000:.2f}ms lock_wait_p99={lock_p99 * 1000:.2f}ms "
+                f"heartbeat_timeouts={snap['heartbeat_timeouts']}")
+
+
+class MetricsEndpoint:
+    """計測値を返すローカル HTTP サーバー（/metrics はテキスト、/metrics.json は JSON）"""
+
+    def __init__(self, metrics: ServerMetrics, host: str = "127.0.0.1", port: int = 9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.httpd: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path in ("/", "/metrics"):
+                    body = ServerMetrics.render_text(metrics.snapshot()).encode('utf-8')
+                    content_type = "text/plain; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode('utf-8')
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # アクセスログは出さない
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print(f"計測値エンドポイント: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
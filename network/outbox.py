@@ -0,0 +1,41 @@
+# 送信メッセージのまとめ送り（1ティック分を1フレームにする）
+import threading
+from typing import List, Optional, Tuple
+
+# 新しいものが来たら古いものを捨ててよい GAME_STATE のイベント
+# （盤面の定期送信と、入力同期で進んだティックの通知）
+COALESCE_EVENTS = frozenset(("game_state", "input_tick"))
+
+
+class Outbox:
+    """接続ごとの送信キュー
+
+    1ティックの間に作られたメッセージを溜めておき、flush で1回の書き込みにまとめる。
+    同じキーの最新優先メッセージは古いものを取り除き、新しいものを末尾に置く
+    （入力の後に送ったティック通知が入力より先に届かないようにするため）。
+    """
+
+    def __init__(self):
+        # (キー, エンコード済みメッセージ)
+        self.messages: List[Tuple[Optional[str], str]] = []
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def add(self, message: str, key: Optional[str] = None):
+        """メッセージを追加（key が同じ古いメッセージは取り除く）"""
+        with self.lock:
+            if key is not None:
+                before = len(self.messages)
+                self.messages = [(k, m) for k, m in self.messages if k != key]
+                self.coalesced += before - len(self.messages)
+            self.messages.append((key, message))
+
+    def take(self) -> List[str]:
+        """溜まっているメッセージをすべて取り出す"""
+        with self.lock:
+            messages = [message for _, message in self.messages]
+            self.messages = []
+            return messages
+
+    def __len__(self) -> int:
+        return len(self.messages)
@@ -1,7 +1,8 @@
 # 通信プロトコル定義
 import json
+import time
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 
 class MessageType(Enum):
@@ -10,6 +11,10 @@ class MessageType(Enum):
     CONNECT = "connect"
     DISCONNECT = "disconnect"
     HEARTBEAT = "heartbeat"
+    ACK = "ack"  # UDP 信頼性レイヤーの ACK 専用パケット
+    PING = "ping"  # RTT・時刻オフセット計測
+    PONG = "pong"
+    BATCH = "batch"  # 1ティック分のメッセージをまとめたフレーム
     
     # ルーム関連
     CREATE_ROOM = "create_room"
@@ -17,6 +22,7 @@ class MessageType(Enum):
     LEAVE_ROOM = "leave_room"
     LIST_ROOMS = "list_rooms"
     ROOM_INFO = "room_info"
+    MATCHMAKING = "matchmaking"  # クイックマッチの登録・取り消しと結果通知
     
     # ゲーム関連
     GAME_START = "game_start"
@@ -38,23 +44,34 @@ class GameAction(Enum):
     ROTATE_CW = "rotate_cw"
     ROTATE_CCW = "rotate_ccw"
     SOFT_DROP = "soft_drop"
+    SOFT_DROP_END = "soft_drop_end"
     HARD_DROP = "hard_drop"
     HOLD = "hold"
     PLACE_PIECE = "place_piece"
+    GARBAGE = "garbage"  # 入力同期用：ガベージ追加（lines。穴位置は共有シードから決まる）
 
 
 class Protocol:
     """通信プロトコルクラス"""
     
     @staticmethod
-    def create_message(msg_type: MessageType, data: Optional[Dict[str, Any]] = None) -> str:
-        """メッセージを作成してJSON文字列として返す"""
-        message = {
+    def build_message(msg_type: MessageType, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """メッセージを辞書として作成（送信側でヘッダーを足してから1回だけエンコードする場合）"""
+        return {
             "type": msg_type.value,
-            "timestamp": __import__('time').time(),
+            "timestamp": time.time(),
             "data": data or {}
         }
-        return json.dumps(message)
+    
+    @staticmethod
+    def create_message(msg_type: MessageType, data: Optional[Dict[str, Any]] = None) -> str:
+        """メッセージを作成してJSON文字列として返す"""
+        return json.dumps(Protocol.build_message(msg_type, data))
+    
+    @staticmethod
+    def message_type(message: str) -> str:
+        """create_message で作ったメッセージの種別（先頭のキーが "type" なのでパースせずに取り出す）"""
+        return message.split('"', 4)[3]
     
     @staticmethod
     def parse_message(json_str: str) -> Optional[Dict[str, Any]]:
@@ -67,53 +84,130 @@ class Protocol:
         except (json.JSONDecodeError, ValueError):
             return None
     
+    # build_* はメッセージの辞書、create_* は同じ内容の JSON 文字列を返す
+    
     @staticmethod
-    def create_connect_message(player_name: str) -> str:
+    def build_connect_message(player_name: str) -> Dict[str, Any]:
         """接続メッセージを作成"""
-        return Protocol.create_message(MessageType.CONNECT, {
+        return Protocol.build_message(MessageType.CONNECT, {
             "player_name": player_name
         })
     
     @staticmethod
-    def create_room_message(room_id: str, password: Optional[str] = None) -> str:
+    def create_connect_message(player_name: str) -> str:
+        """接続メッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_connect_message(player_name))
+    
+    @staticmethod
+    def build_room_message(room_id: str, password: Optional[str] = None) -> Dict[str, Any]:
         """ルーム作成メッセージを作成"""
         data = {"room_id": room_id}
         if password:
             data["password"] = password
-        return Protocol.create_message(MessageType.CREATE_ROOM, data)
+        return Protocol.build_message(MessageType.CREATE_ROOM, data)
+    
+    @staticmethod
+    def create_room_message(room_id: str, password: Optional[str] = None) -> str:
+        """ルーム作成メッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_room_message(room_id, password))
     
     @staticmethod
-    def create_join_room_message(room_id: str, password: Optional[str] = None) -> str:
-        """ルーム参加メッセージを作成"""
+    def build_join_room_message(room_id: str, password: Optional[str] = None, spectate: bool = False) -> Dict[str, Any]:
+        """ルーム参加メッセージを作成（spectate=True で観戦者として参加）"""
         data = {"room_id": room_id}
         if password:
             data["password"] = password
-        return Protocol.create_message(MessageType.JOIN_ROOM, data)
+        if spectate:
+            data["spectate"] = True
+        return Protocol.build_message(MessageType.JOIN_ROOM, data)
     
     @staticmethod
-    def create_action_message(action: GameAction, **kwargs) -> str:
+    def create_join_room_message(room_id: str, password: Optional[str] = None, spectate: bool = False) -> str:
+        """ルーム参加メッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_join_room_message(room_id, password, spectate))
+    
+    @staticmethod
+    def build_action_message(action: GameAction, **kwargs) -> Dict[str, Any]:
         """ゲームアクションメッセージを作成"""
-        return Protocol.create_message(MessageType.PLAYER_ACTION, {
+        return Protocol.build_message(MessageType.PLAYER_ACTION, {
             "action": action.value,
             **kwargs
         })
     
     @staticmethod
-    def create_game_state_message(game_state: Dict[str, Any]) -> str:
+    def create_action_message(action: GameAction, **kwargs) -> str:
+        """ゲームアクションメッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_action_message(action, **kwargs))
+    
+    @staticmethod
+    def build_game_state_message(game_state: Dict[str, Any]) -> Dict[str, Any]:
         """ゲーム状態メッセージを作成"""
-        return Protocol.create_message(MessageType.GAME_STATE, game_state)
+        return Protocol.build_message(MessageType.GAME_STATE, game_state)
     
     @staticmethod
-    def create_chat_message(message: str) -> str:
+    def create_game_state_message(game_state: Dict[str, Any]) -> str:
+        """ゲーム状態メッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_game_state_message(game_state))
+    
+    @staticmethod
+    def build_matchmaking_message(action: str, **kwargs) -> Dict[str, Any]:
+        """マッチメイキングメッセージを作成（action: "enqueue" / "cancel"）"""
+        return Protocol.build_message(MessageType.MATCHMAKING, {
+            "action": action,
+            **kwargs
+        })
+    
+    @staticmethod
+    def create_matchmaking_message(action: str, **kwargs) -> str:
+        """マッチメイキングメッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_matchmaking_message(action, **kwargs))
+    
+    @staticmethod
+    def build_chat_message(message: str) -> Dict[str, Any]:
         """チャットメッセージを作成"""
-        return Protocol.create_message(MessageType.CHAT_MESSAGE, {
+        return Protocol.build_message(MessageType.CHAT_MESSAGE, {
             "message": message
         })
     
     @staticmethod
-    def create_list_rooms_message() -> str:
-        """ルーム一覧取得メッセージを作成"""
-        return Protocol.create_message(MessageType.LIST_ROOMS)
+    def create_chat_message(message: str) -> str:
+        """チャットメッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_chat_message(message))
+    
+    @staticmethod
+    def build_list_rooms_message(**options) -> Dict[str, Any]:
+        """ルーム一覧取得メッセージを作成
+
+        options: offset・limit（ページ）、available・no_password・query（絞り込み）、
+        subscribe（True でルームの追加・変更・削除をプッシュで受け取る）
+        """
+        return Protocol.build_message(MessageType.LIST_ROOMS, options)
+    
+    @staticmethod
+    def create_list_rooms_message(**options) -> str:
+        """ルーム一覧取得メッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_list_rooms_message(**options))
+    
+    @staticmethod
+    def build_ping_message(ping_data: Dict[str, Any]) -> Dict[str, Any]:
+        """PINGメッセージを作成"""
+        return Protocol.build_message(MessageType.PING, ping_data)
+    
+    @staticmethod
+    def create_ping_message(ping_data: Dict[str, Any]) -> str:
+        """PINGメッセージを作成（JSON文字列）"""
+        return json.dumps(Protocol.build_ping_message(ping_data))
+    
+    @staticmethod
+    def create_pong_message(pong_data: Dict[str, Any]) -> str:
+        """PONGメッセージを作成"""
+        return Protocol.create_message(MessageType.PONG, pong_data)
+    
+    @staticmethod
+    def create_batch_message(messages: List[str]) -> str:
+        """エンコード済みのメッセージをまとめて1つのメッセージにする（再パースしない）"""
+        header = json.dumps({"type": MessageType.BATCH.value, "timestamp": time.time()})
+        return header[:-1] + ', "data": {"messages": [' + ", ".join(messages) + ']}}'
     
     @staticmethod
     def create_error_message(error_code: str, error_message: str) -> str:
@@ -0,0 +1,300 @@
+# UDP 用の軽量な信頼性レイヤー（ACK・再送・順序保証）
+import threading
+import time
+from typing import Dict, List, Tuple, Any, Optional
+from network.protocol import MessageType
+
+# シーケンス番号は 32bit で周回する
+SEQUENCE_MODULO = 2 ** 32
+
+# ACK ビットフィールドで確認できる過去のパケット数
+ACK_BITS = 32
+
+# 再送タイムアウト（秒）
+INITIAL_RTO = 0.5
+MIN_RTO = 0.05
+MAX_RTO = 2.0
+
+# この回数再送しても ACK がなければ接続失敗とみなす
+MAX_RETRIES = 10
+
+# 送るものがないときに単独の ACK パケットを送るまでの待ち時間（秒）
+ACK_DELAY = 0.02
+
+# 順序待ちで保持する信頼メッセージの上限（これを超える先の番号は捨てて再送を待つ）
+MAX_OUT_OF_ORDER = 256
+
+# 信頼性レイヤーが送信時に付けるヘッダー（本体とは別にエンコードできる）
+HEADER_FIELDS = ("reliable_sequence", "sequence", "ack", "ack_bits")
+
+
+def sequence_greater(a: int, b: int) -> bool:
+    """周回を考慮して a が b より新しいか"""
+    return a != b and (a - b) % SEQUENCE_MODULO < SEQUENCE_MODULO // 2
+
+
+def is_latest_wins(message: Dict[str, Any]) -> bool:
+    """最新のものだけ届けばよいメッセージか（盤面状態・ハートビート・PING/PONG）"""
+    msg_type = message.get("type")
+    if msg_type in (MessageType.HEARTBEAT.value, MessageType.PING.value, MessageType.PONG.value):
+        # PING/PONG を再送すると RTT の計測値が狂うため再送しない
+        return True
+    if msg_type == MessageType.GAME_STATE.value:
+        return message.get("data", {}).get("event") in ("game_state", "authoritative_state")
+    return False
+
+
+class _PendingMessage:
+    """ACK 待ちの信頼メッセージ"""
+
+    __slots__ = ("message", "reliable_sequence", "sent_at", "retries", "rto")
+
+    def __init__(self, message: Dict[str, Any], reliable_sequence: int, sent_at: float, rto: float):
+        self.message = message
+        self.reliable_sequence = reliable_sequence
+        self.sent_at = sent_at
+        self.retries = 0
+        self.rto = rto
+
+
+class ReliableChannel:
+    """1対1の UDP 通信相手ごとの信頼性管理
+
+    全パケットに送信シーケンス番号（sequence）と、受信済みパケットの
+    ACK（ack = 最新の受信番号、ack_bits = その前 32 個の受信状況）を付ける。
+    信頼メッセージ（操作・攻撃・ルーム制御など）には別系列の番号（reliable_sequence）を付け、
+    ACK がなければ RTT から計算したタイムアウトで選択的に再送し、受信側では番号順に届ける。
+    盤面状態は再送せず、メッセージの種類ごとに最新のものだけを届ける。
+    """
+
+    def __init__(self, initial_rto: float = INITIAL_RTO, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+
+        # 送信側
+        self.local_sequence = 0
+        self.next_reliable_sequence = 0
+        # パケット番号 -> (送信時刻, 含まれる信頼メッセージ番号, 再送かどうか)
+        self.sent_packets: Dict[int, Tuple[float, Optional[int], bool]] = {}
+        # 信頼メッセージ番号 -> ACK 待ちメッセージ
+        self.pending: Dict[int, _PendingMessage] = {}
+
+        # 受信側
+        self.remote_sequence: Optional[int] = None
+        self.ack_bits = 0
+        self.expected_reliable_sequence = 0
+        self.out_of_order: Dict[int, Dict[str, Any]] = {}
+        # (type, event) -> 最後に届けた最新優先メッセージのパケット番号
+        self.latest_sequences: Dict[Tuple[Any, Any], int] = {}
+        self.ack_pending_since: Optional[float] = None
+
+        # RTT 推定（RFC 6298）
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = initial_rto
+
+        # 統計
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.retransmissions = 0
+        self.duplicates = 0
+        self.failed = False
+
+        self.lock = threading.Lock()
+
+    def prepare(self, message: Dict[str, Any], reliable: Optional[bool] = None) -> Dict[str, Any]:
+        """送信するメッセージにヘッダーを付ける（reliable 省略時は種類から判定）"""
+        if reliable is None:
+            reliable = not is_latest_wins(message)
+
+        with self.lock:
+            now = time.time()
+            reliable_sequence = None
+            if reliable:
+                reliable_sequence = self.next_reliable_sequence
+                self.next_reliable_sequence = (self.next_reliable_sequence + 1) % SEQUENCE_MODULO
+                message["reliable_sequence"] = reliable_sequence
+                self.pending[reliable_sequence] = _PendingMessage(message, reliable_sequence, now, self.rto)
+            return self._stamp(message, now, reliable_sequence, False)
+
+    def _stamp(self, message: Dict[str, Any], now: float, reliable_sequence: Optional[int],
+               retransmit: bool) -> Dict[str, Any]:
+        """パケット番号と ACK を付ける（ロック取得済みで呼ぶ）"""
+        self.local_sequence = (self.local_sequence + 1) % SEQUENCE_MODULO
+        message["sequence"] = self.local_sequence
+        if self.remote_sequence is not None:
+            message["ack"] = self.remote_sequence
+            message["ack_bits"] = self.ack_bits
+        self.ack_pending_since = None
+
+        if message.get("type") != MessageType.ACK.value:
+            self.sent_packets[self.local_sequence] = (now, reliable_sequence, retransmit)
+            # ACK ビットフィールドの範囲外になった古い記録は捨てる
+            stale = (self.local_sequence - ACK_BITS * 4) % SEQUENCE_MODULO
+            self.sent_packets.pop(stale, None)
+        self.packets_sent += 1
+        return message
+
+    def receive(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """受信したパケットを処理し、アプリケーションに渡すメッセージを返す"""
+        with self.lock:
+            now = time.time()
+            self.packets_received += 1
+            if "ack" in message:
+                self._process_acks(message["ack"], message.get("ack_bits", 0), now)
+
+            sequence = message.get("sequence")
+            if sequence is None:
+                # 信頼性レイヤーを使わない相手からのメッセージはそのまま届ける
+                return [message]
+
+            if message.get("type") == MessageType.CONNECT.value and message.get("reliable_sequence") == 0:
+                # 同じアドレスからの再接続は新しいセッションとして受信状態をやり直す
+                self._reset_receive_state()
+
+            reliable_sequence = message.get("reliable_sequence")
+            if reliable_sequence is not None and self._too_far_ahead(reliable_sequence):
+                return []  # バッファに入らないので ACK せず、再送を待つ
+
+            if not self._record_received(sequence):
+                self.duplicates += 1
+                if "reliable_sequence" in message and self.ack_pending_since is None:
+                    self.ack_pending_since = now  # 再送なので ACK を返し直す
+                return []
+
+            if message.get("type") == MessageType.ACK.value:
+                return []
+
+            if reliable_sequence is None:
+                return self._deliver_latest(message, sequence)
+
+            if self.ack_pending_since is None:
+                self.ack_pending_since = now
+            return self._deliver_ordered(message, reliable_sequence)
+
+    def _reset_receive_state(self):
+        """受信側の状態を初期化"""
+        self.remote_sequence = None
+        self.ack_bits = 0
+        self.expected_reliable_sequence = 0
+        self.out_of_order.clear()
+        self.latest_sequences.clear()
+
+    def _record_received(self, sequence: int) -> bool:
+        """受信したパケット番号を ACK 用に記録し、新規なら True を返す"""
+        if self.remote_sequence is None:
+            self.remote_sequence = sequence
+            self.ack_bits = 0
+            return True
+
+        if sequence_greater(sequence, self.remote_sequence):
+            shift = (sequence - self.remote_sequence) % SEQUENCE_MODULO
+            if shift > ACK_BITS:
+                self.ack_bits = 0
+            else:
+                self.ack_bits = ((self.ack_bits << shift) | (1 << (shift - 1))) & ((1 << ACK_BITS) - 1)
+            self.remote_sequence = sequence
+            return True
+
+        if sequence == self.remote_sequence:
+            return False
+        distance = (self.remote_sequence - sequence) % SEQUENCE_MODULO
+        if distance > ACK_BITS:
+            return False  # 古すぎて判定できない（信頼メッセージなら順序番号で重複を除く）
+        bit = 1 << (distance - 1)
+        if self.ack_bits & bit:
+            return False
+        self.ack_bits |= bit
+        return True
+
+    def _deliver_latest(self, message: Dict[str, Any], sequence: int) -> List[Dict[str, Any]]:
+        """最新優先メッセージは種類ごとに古いものを捨てる"""
+        key = (message.get("type"), message.get("data", {}).get("event"))
+        last = self.latest_sequences.get(key)
+        if last is not None and not sequence_greater(sequence, last):
+            return []
+        self.latest_sequences[key] = sequence
+        return [message]
+
+    def _too_far_ahead(self, reliable_sequence: int) -> bool:
+        """順序待ちバッファに入りきらない先の番号か"""
+        ahead = (reliable_sequence - self.expected_reliable_sequence) % SEQUENCE_MODULO
+        return MAX_OUT_OF_ORDER <= ahead < SEQUENCE_MODULO // 2
+
+    def _deliver_ordered(self, message: Dict[str, Any], reliable_sequence: int) -> List[Dict[str, Any]]:
+        """信頼メッセージを番号順に届ける（欠けている番号があれば待つ）"""
+        if reliable_sequence != self.expected_reliable_sequence:
+            if sequence_greater(reliable_sequence, self.expected_reliable_sequence):
+                self.out_of_order[reliable_sequence] = message
+            else:
+                self.duplicates += 1  # 既に届けた番号の再送
+            return []
+
+        delivered = [message]
+        self.expected_reliable_sequence = (self.expected_reliable_sequence + 1) % SEQUENCE_MODULO
+        while self.expected_reliable_sequence in self.out_of_order:
+            delivered.append(self.out_of_order.pop(self.expected_reliable_sequence))
+            self.expected_reliable_sequence = (self.expected_reliable_sequence + 1) % SEQUENCE_MODULO
+        return delivered
+
+    def _process_acks(self, ack: int, ack_bits: int, now: float):
+        """相手から届いた ACK で送信済みパケットを確認済みにする"""
+        self._acknowledge(ack, now)
+        for i in range(ACK_BITS):
+            if ack_bits & (1 << i):
+                self._acknowledge((ack - 1 - i) % SEQUENCE_MODULO, now)
+
+    def _acknowledge(self, sequence: int, now: float):
+        """1パケット分の ACK を処理"""
+        record = self.sent_packets.pop(sequence, None)
+        if record is None:
+            return
+        sent_at, reliable_sequence, retransmit = record
+        # 再送したパケットの RTT は曖昧なので使わない（Karn のアルゴリズム）
+        if not retransmit:
+            self._update_rtt(now - sent_at)
+        if reliable_sequence is not None:
+            self.pending.pop(reliable_sequence, None)
+
+    def _update_rtt(self, sample: float):
+        """RTT の平滑化と再送タイムアウトの更新"""
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """定期的に呼び、再送するパケットと必要なら ACK 専用パケットを返す"""
+        with self.lock:
+            now = time.time()
+            packets = []
+            for pending in sorted(self.pending.values(), key=lambda p: p.sent_at):
+                if now - pending.sent_at < pending.rto:
+                    continue
+                if pending.retries >= self.max_retries:
+                    self.failed = True
+                    continue
+                pending.retries += 1
+                pending.sent_at = now
+                pending.rto = min(MAX_RTO, pending.rto * 2)  # 指数バックオフ
+                self.retransmissions += 1
+                packets.append(self._stamp(dict(pending.message), now, pending.reliable_sequence, True))
+
+            if self.ack_pending_since is not None and now - self.ack_pending_since >= ACK_DELAY:
+                packets.append(self._stamp({"type": MessageType.ACK.value}, now, None, False))
+            return packets
+
+    def get_stats(self) -> Dict[str, Any]:
+        """信頼性レイヤーの統計を取得"""
+        with self.lock:
+            return {
+                "srtt": self.srtt,
+                "rto": self.rto,
+                "pending": len(self.pending),
+                "packets_sent": self.packets_sent,
+                "packets_received": self.packets_received,
+                "retransmissions": self.retransmissions,
+                "duplicates": self.duplicates,
+            }
@@ -0,0 +1,164 @@
+# ルーム一覧（エンコード済みのスナップショットのキャッシュ・ページ分割・差分のプッシュ）
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from network.protocol import Protocol, MessageType
+
+# 1ページの既定の件数と上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# 差分をまとめて購読者に送る間隔（秒）
+PUSH_INTERVAL = 0.5
+
+# キャッシュしておくページの数（条件の組み合わせが多くても際限なく増えないように）
+PAGE_CACHE_SIZE = 64
+
+
+class RoomDirectory:
+    """ルーム一覧
+
+    ルームの要約（room_id・players・max_players・has_password）をルームの変更時に
+    更新し、LIST_ROOMS の応答はページと絞り込み条件ごとにエンコード済みの文字列を
+    キャッシュして返す。キャッシュは一覧が変わったときだけ捨てるため、多数のロビーが
+    ポーリングしても一覧の組み立てと JSON 化は変更1回につき1回で済む。
+
+    購読中のクライアントには、一定間隔で溜まった差分（追加・変更・削除）を
+    1つのメッセージにまとめて送る。エンコードは購読者の数によらず1回。
+    """
+
+    def __init__(self):
+        # room_id -> 要約（作成順）
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.version = 0
+        self.subscribers: set = set()
+        # (offset, limit, 絞り込み条件) -> エンコード済みの応答
+        self._pages: "OrderedDict[Tuple, str]" = OrderedDict()
+        # 前回のプッシュ以降の差分：room_id -> ("added" / "changed" / "removed", 要約)
+        self._changes: Dict[str, Tuple[str, Optional[Dict[str, Any]]]] = {}
+        self.lock = threading.Lock()
+
+    # --- 更新 ---
+
+    def update(self, room_id: str, summary: Dict[str, Any]):
+        """ルームを追加・更新（内容が同じなら何もしない）"""
+        with self.lock:
+            previous = self.entries.get(room_id)
+            if previous == summary:
+                return
+            self.entries[room_id] = summary
+
+            pending = self._changes.get(room_id)
+            if previous is None and (pending is None or pending[0] != "removed"):
+                self._changes[room_id] = ("added", summary)
+            elif pending is not None and pending[0] == "added":
+                self._changes[room_id] = ("added", summary)
+            else:
+                self._changes[room_id] = ("changed", summary)
+            self._invalidate()
+
+    def remove(self, room_id: str):
+        """ルームを削除"""
+        with self.lock:
+            if self.entries.pop(room_id, None) is None:
+                return
+            pending = self._changes.get(room_id)
+            if pending is not None and pending[0] == "added":
+                # 購読者に届く前に消えたルームは通知しない
+                del self._changes[room_id]
+            else:
+                self._changes[room_id] = ("removed", None)
+            self._invalidate()
+
+    def _invalidate(self):
+        """一覧が変わったのでキャッシュを捨てる（ロック取得済みで呼ぶ）"""
+        self.version += 1
+        self._pages.clear()
+
+    # --- 取得 ---
+
+    def list_message(self, data: Dict[str, Any]) -> str:
+        """LIST_ROOMS 要求への応答（エンコード済み）
+
+        data: offset・limit と絞り込み条件（available: 空きのあるルームのみ、
+        no_password: パスワードなしのみ、query: ルームIDの部分一致）
+        """
+        offset, limit, filters = self._parse_request(data)
+        key = (offset, limit, filters)
+        with self.lock:
+            cached = self._pages.get(key)
+            if cached is not None:
+                self._pages.move_to_end(key)
+                return cached
+
+            rooms = list(self._filter(self.entries.values(), filters))
+            message = Protocol.create_message(MessageType.LIST_ROOMS, {
+                "rooms": rooms[offset:offset + limit],
+                "total": len(rooms),
+                "offset": offset,
+                "limit": limit,
+                "version": self.version
+            })
+            self._pages[key] = message
+            if len(self._pages) > PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+            return message
+
+    @staticmethod
+    def _parse_request(data: Dict[str, Any]) -> Tuple[int, int, Tuple]:
+        """要求からページ位置と絞り込み条件を取り出す（不正な値は既定値にする）"""
+        try:
+            offset = max(0, int(data.get("offset", 0)))
+        except (TypeError, ValueError):
+            offset = 0
+        try:
+            limit = min(MAX_PAGE_SIZE, max(1, int(data.get("limit", DEFAULT_PAGE_SIZE))))
+        except (TypeError, ValueError):
+            limit = DEFAULT_PAGE_SIZE
+        filters = (bool(data.get("available")), bool(data.get("no_password")), str(data.get("query") or ""))
+        return offset, limit, filters
+
+    @staticmethod
+    def _filter(entries: Iterable[Dict[str, Any]], filters: Tuple) -> Iterable[Dict[str, Any]]:
+        available, no_password, query = filters
+        for entry in entries:
+            if available and len(entry["players"]) >= entry["max_players"]:
+                continue
+            if no_password and entry["has_password"]:
+                continue
+            if query and query not in entry["room_id"]:
+                continue
+            yield entry
+
+    # --- 購読 ---
+
+    def subscribe(self, player_id: str):
+        with self.lock:
+            self.subscribers.add(player_id)
+
+    def unsubscribe(self, player_id: str):
+        with self.lock:
+            self.subscribers.discard(player_id)
+
+    def take_changes(self) -> Tuple[Optional[str], List[str]]:
+        """溜まった差分をまとめたメッセージと送信先の購読者を返す（差分がなければ None）"""
+        with self.lock:
+            if not self._changes:
+                return None, []
+            changes, self._changes = self._changes, {}
+            if not self.subscribers:
+                return None, []
+
+            delta = {"added": [], "changed": [], "removed": []}
+            for room_id, (kind, summary) in changes.items():
+                delta[kind].append(room_id if kind == "removed" else summary)
+            message = Protocol.create_message(MessageType.LIST_ROOMS, {
+                "event": "delta",
+                "version": self.version,
+                **delta
+            })
+            return message, list(self.subscribers)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,68 @@
+# ゲーム状態の送信レート制御（変化したときだけ送る・上限と生存確認・混雑時の間引き）
+from typing import Optional
+
+# 送信間隔の下限（最大レート 30 回/秒）
+MIN_SEND_INTERVAL = 1 / 30
+
+# 変化がなくてもこの間隔で送る（相手やサーバーに生存を伝える）
+KEEPALIVE_INTERVAL = 0.5
+
+# RTT が最小値からこれだけ増えたら経路に送信が溜まっているとみなす（秒）
+QUEUE_DELAY_LIMIT = 0.05
+
+# 送信が済んでいない量（送信バッファに対する割合）がこれを超えたら混雑とみなす
+BACKLOG_LIMIT = 0.25
+
+# レートを見直す間隔（秒）。RTT の計測間隔より短くしても反応は変わらない
+ADJUST_INTERVAL = 0.5
+
+# 混雑していないときに1回の見直しで上げる送信レート（回/秒）
+RECOVERY_STEP = 4.0
+
+
+class SendRateController:
+    """ゲーム状態を送るかどうかの判定
+
+    状態が変化したとき（移動・回転・固定・ガベージなど）だけ、送信間隔の下限を
+    空けて送る。変化がなくても KEEPALIVE_INTERVAL ごとには送る。
+    送信間隔は RTT の増加（最小 RTT からの差）か未送信量の増加で混雑を検知したら
+    倍にし（KEEPALIVE_INTERVAL まで）、混雑がなければレートを一定量ずつ上げて戻す（AIMD）。
+    """
+
+    def __init__(self, min_interval: float = MIN_SEND_INTERVAL,
+                 keepalive_interval: float = KEEPALIVE_INTERVAL):
+        self.min_interval = min_interval
+        self.keepalive_interval = keepalive_interval
+        self.interval = min_interval
+        self.last_send = 0.0
+        self.last_adjust = 0.0
+        self.congested = False
+
+    def should_send(self, now: float, changed: bool) -> bool:
+        """now に送信すべきか（changed: 前回の送信から状態が変わったか）"""
+        elapsed = now - self.last_send
+        if changed:
+            return elapsed >= self.interval
+        return elapsed >= self.keepalive_interval
+
+    def sent(self, now: float):
+        """送信したことを記録"""
+        self.last_send = now
+
+    def adjust(self, now: float, srtt: Optional[float], min_rtt: Optional[float], backlog: float):
+        """計測値から送信間隔を見直す（ADJUST_INTERVAL ごと）"""
+        if now - self.last_adjust < ADJUST_INTERVAL:
+            return
+        self.last_adjust = now
+
+        queue_delay = srtt - min_rtt if srtt is not None and min_rtt is not None else 0.0
+        self.congested = queue_delay > QUEUE_DELAY_LIMIT or backlog > BACKLOG_LIMIT
+        if self.congested:
+            self.interval = min(self.keepalive_interval, self.interval * 2)
+        else:
+            self.interval = max(self.min_interval, 1 / (self.rate + RECOVERY_STEP))
+
+    @property
+    def rate(self) -> float:
+        """現在の最大送信レート（回/秒）"""
+        return 1 / self.interval
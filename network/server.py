@@ -5,6 +5,30 @@ import time
 import json
 from typing import Dict, List, Optional, Any
 from network.protocol import Protocol, MessageType, GameAction
+from network.authority import AuthoritativeMatch
+from network.clock import ClockSync
+from network.framing import FrameReader, FrameError, LENGTH_SIZE, decode_frame, encode_frame
+from network.outbox import Outbox
+from network.cluster import ClusterWorker
+from network.metrics import ServerMetrics, TimedLock, MetricsEndpoint, LOG_INTERVAL
+from network.timers import TimerWheel
+from network.spectators import (SpectatorFeed, SendQueue, SPECTATOR_INTERVAL, SPECTATOR_INTERVAL_UNDER_LOAD,
+                                 SPECTATOR_LOAD_THRESHOLD)
+from network.outbox import COALESCE_EVENTS
+from network.room_directory import RoomDirectory, PUSH_INTERVAL
+from network.matchmaking import MatchmakingQueue, MatchTicket, MATCH_INTERVAL, DEFAULT_RATING
+
+# 最後の受信からこの時間が過ぎたプレイヤーを切断（秒）
+HEARTBEAT_TIMEOUT = 60.0
+
+# 空になったルームを確認する間隔（秒）
+ROOM_CHECK_INTERVAL = 60.0
+
+# タイマーを進める間隔（秒、タイムアウトの精度）
+TIMER_INTERVAL = 1.0
+
+# まとめ送りされたメッセージを処理している間の送信先（スレッドごと、処理中以外は None）
+_outbound = threading.local()
 
 
 class TetrisPlayer:
@@ -18,6 +42,29 @@ class TetrisPlayer:
         self.room_id = ""
         self.connected = True
         self.last_heartbeat = time.time()
+        # まとめ送りの処理中に溜める送信メッセージ
+        self.outbox = Outbox()
+        # 複数のスレッドから同じソケットに書き込むため
+        self.send_lock = threading.Lock()
+        # マルチプロセス時：ルームを所有する別ワーカーへの引き継ぎ先
+        self.handoff_worker: Optional[int] = None
+        self.handed_off = False
+        # 観戦中のルームIDと観戦者用の送信キュー（観戦中のみ）
+        self.spectating = ""
+        self.send_queue: Optional[SendQueue] = None
+        # 送信量を記録する計測値（サーバーが設定）
+        self.metrics: Optional[ServerMetrics] = None
+    
+    def write(self, message: str) -> int:
+        """メッセージを長さ付きフレームで1回の書き込みで送信し、送信したバイト数を返す"""
+        message_bytes = message.encode('utf-8')
+        frame = len(message_bytes).to_bytes(LENGTH_SIZE, byteorder='big') + message_bytes
+        # 観戦者への送信は観戦配信と順序が入れ替わらないよう送信キューを通す
+        queue = self.send_queue
+        if queue is None or not queue.push(frame):
+            with self.send_lock:
+                self.socket.sendall(frame)
+        return len(frame)
 
 
 class TetrisRoom:
@@ -30,6 +77,12 @@ class TetrisRoom:
         self.players: List[TetrisPlayer] = []
         self.game_started = False
         self.created_at = time.time()
+        # サーバー権威モードの対戦（sync_mode="server" で開始されたときのみ）
+        self.authority: Optional[AuthoritativeMatch] = None
+        # 配信時間を記録する計測値（サーバーが設定）
+        self.metrics: Optional[ServerMetrics] = None
+        # 観戦者（プレイヤーへの配信とは別に、一定間隔でまとめて送る）
+        self.feed = SpectatorFeed()
     
     def add_player(self, player: TetrisPlayer) -> bool:
         """プレイヤーをルームに追加"""
@@ -54,8 +107,32 @@ class TetrisRoom:
         """ルームが満員かどうか"""
         return len(self.players) >= self.max_players
     
-    def broadcast_message(self, message: str, exclude_player: Optional[TetrisPlayer] = None):
-        """ルーム内の全プレイヤーにメッセージを送信"""
+    def summary(self) -> Dict[str, Any]:
+        """ルーム一覧に載せる要約"""
+        return {
+            "room_id": self.room_id,
+            "name": self.room_id,
+            "players": [p.player_name for p in self.players],
+            "max_players": self.max_players,
+            "has_password": bool(self.password),
+            "spectators": len(self.feed)
+        }
+    
+    def is_authoritative(self) -> bool:
+        """サーバー権威モードの対戦中かどうか"""
+        return self.authority is not None and not self.authority.finished
+    
+    def get_player(self, player_id: str) -> Optional[TetrisPlayer]:
+        """プレイヤーIDからルーム内のプレイヤーを取得"""
+        for player in self.players:
+            if player.player_id == player_id:
+                return player
+        return None
+    
+    def broadcast_message(self, message: str, exclude_player: Optional[TetrisPlayer] = None,
+                          coalesce_key: Optional[str] = None):
+        """ルーム内の全プレイヤーにメッセージを送信（観戦者には次の配信でまとめて送る）"""
+        started = time.perf_counter()
         for player in self.players[:]:  # コピーを作成して安全にイテレート
             if player != exclude_player and player.connected:
                 try:
@@ -63,24 +140,58 @@ class TetrisRoom:
                 except:
                     # 送信失敗したプレイヤーは削除
                     self.remove_player(player)
+        self.feed.publish(message, coalesce_key)
+        if self.metrics:
+            self.metrics.observe_fanout(time.perf_counter() - started)
 
 
 class TetrisServer:
     """テトリスサーバークラス"""
     
-    def __init__(self, host: str = "localhost", port: int = 12345):
+    def __init__(self, host: str = "localhost", port: int = 12345, cluster: Optional[ClusterWorker] = None,
+                 metrics_port: Optional[int] = None):
         self.host = host
         self.port = port
         self.socket: Optional[socket.socket] = None
         self.running = False
         
+        # マルチプロセス時のワーカー連携（単一プロセスでは None）
+        self.cluster = cluster
+        
+        # 計測値（metrics_port を指定すると HTTP で参照できる）
+        self.metrics = ServerMetrics()
+        self.metrics_endpoint: Optional[MetricsEndpoint] = None
+        if metrics_port:
+            # マルチプロセス時はワーカーごとに別のポートを使う
+            self.metrics_endpoint = MetricsEndpoint(self.metrics, port=metrics_port + (cluster.index if cluster else 0))
+        
         # プレイヤー管理
         self.players: Dict[str, TetrisPlayer] = {}
-        self.players_lock = threading.Lock()
+        self.players_lock = TimedLock("players", self.metrics)
         
         # ルーム管理
         self.rooms: Dict[str, TetrisRoom] = {}
-        self.rooms_lock = threading.Lock()
+        self.rooms_lock = TimedLock("rooms", self.metrics)
+        # LIST_ROOMS の応答キャッシュとロビーへの差分プッシュ
+        self.directory = RoomDirectory()
+        
+        self.metrics.gauges.update({
+            "players": lambda: len(self.players),
+            "rooms": lambda: len(self.rooms),
+            "threads": threading.active_count,
+            "outbox_depth_max": lambda: max((len(p.outbox) for p in list(self.players.values())), default=0),
+            "timers": lambda: len(self.timers),
+            "matchmaking_queue": lambda: len(self.matchmaking),
+            "room_list_subscribers": lambda: len(self.directory.subscribers),
+            "spectators": lambda: sum(len(room.feed) for room in list(self.rooms.values())),
+        })
+        
+        # ハートビートのタイムアウトと空きルームの確認（期限順のタイマーホイール）
+        self.timers = TimerWheel(resolution=TIMER_INTERVAL)
+        
+        # クイックマッチの待ち行列
+        self.matchmaking = MatchmakingQueue()
+        self.total_matches = 0
         
         # 統計情報
         self.total_connections = 0
@@ -91,19 +202,20 @@ class TetrisServer:
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.cluster:
+                # 同じポートを全ワーカーで共有し、接続の振り分けはカーネルに任せる
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.socket.bind((self.host, self.port))
             self.socket.listen(10)
             
             self.running = True
-            print(f"テトリスサーバーが {self.host}:{self.port} で開始されました")
-            
-            # ハートビートスレッドを開始
-            heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-            heartbeat_thread.start()
+            if self.cluster:
+                self.cluster.start(self._accept_handoff)
+                print(f"ワーカー {self.cluster.index} が {self.host}:{self.port} で開始されました")
+            else:
+                print(f"テトリスサーバーが {self.host}:{self.port} で開始されました")
             
-            # クリーンアップスレッドを開始
-            cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
-            cleanup_thread.start()
+            self._start_background_threads()
             
             # クライアント接続を待機
             while self.running:
@@ -125,15 +237,45 @@ class TetrisServer:
             print(f"サーバー開始エラー: {e}")
             return False
     
+    def _start_background_threads(self):
+        """接続の受付以外の定期処理を開始"""
+        # タイマースレッドを開始（ハートビートのタイムアウト・空きルームの削除）
+        timer_thread = threading.Thread(target=self._timer_loop, daemon=True)
+        timer_thread.start()
+        
+        # マッチメイキングスレッドを開始
+        matchmaking_thread = threading.Thread(target=self._matchmaking_loop, daemon=True)
+        matchmaking_thread.start()
+        
+        # 観戦配信スレッドを開始
+        spectator_thread = threading.Thread(target=self._spectator_loop, daemon=True)
+        spectator_thread.start()
+        
+        # ルーム一覧の差分プッシュスレッドを開始
+        directory_thread = threading.Thread(target=self._directory_loop, daemon=True)
+        directory_thread.start()
+        
+        # 計測値の定期ログと HTTP エンドポイント
+        metrics_thread = threading.Thread(target=self._metrics_log_loop, daemon=True)
+        metrics_thread.start()
+        if self.metrics_endpoint:
+            self.metrics_endpoint.start()
+    
     def stop(self):
         """サーバーを停止"""
         print("サーバーを停止中...")
         self.running = False
         
-        # 全プレイヤーに切断通知
+        if self.cluster:
+            self.cluster.stop()
+        if self.metrics_endpoint:
+            self.metrics_endpoint.stop()
+        
+        # 全プレイヤーに切断通知（_disconnect_player がロックを取るため先にコピーする）
         with self.players_lock:
-            for player in list(self.players.values()):
-                self._disconnect_player(player)
+            players = list(self.players.values())
+        for player in players:
+            self._disconnect_player(player)
         
         # ソケットを閉じる
         if self.socket:
@@ -145,12 +287,13 @@ class TetrisServer:
         
         print("サーバーが停止されました")
     
-    def _handle_client(self, client_socket: socket.socket, address: tuple):
-        """クライアント接続を処理"""
-        player_id = f"player_{self.total_connections}_{int(time.time())}"
-        self.total_connections += 1
-        
-        player = TetrisPlayer(client_socket, address, player_id)
+    def _handle_client(self, client_socket: socket.socket, address: tuple,
+                       player: Optional[TetrisPlayer] = None, pending: bytes = b""):
+        """クライアント接続を処理（player・pending は別ワーカーから引き継いだ接続の場合）"""
+        if player is None:
+            player = TetrisPlayer(client_socket, address, self._next_player_id())
+        player.metrics = self.metrics
+        player_id = player.player_id
         
         try:
             with self.players_lock:
@@ -159,31 +302,32 @@ class TetrisServer:
             print(f"クライアント接続: {address} (ID: {player_id})")
             
             # メッセージ受信ループ
+            reader = FrameReader(client_socket)
+            frames = reader.feed(pending)
             while self.running and player.connected:
                 try:
-                    # メッセージ長を受信
-                    length_bytes = self._recv_exactly(client_socket, 4)
-                    if not length_bytes:
-                        break
+                    for index, frame in enumerate(frames):
+                        message_data = Protocol.parse_message(decode_frame(frame))
+                        if message_data:
+                            self.metrics.record_in(message_data["type"], len(frame) + LENGTH_SIZE)
+                            self._process_message(player, message_data)
+                        
+                        if player.handoff_worker is not None:
+                            # 参加先のルームは別のワーカーにある：この JOIN_ROOM 以降を引き継ぐ
+                            if self._hand_off(player, reader, frames[index:]):
+                                return
+                            self._send_error(player, "ROOM_NOT_FOUND", "ルームが見つかりません")
                     
-                    message_length = int.from_bytes(length_bytes, byteorder='big')
-                    if message_length <= 0 or message_length > 1024 * 1024:  # 1MBまで
-                        break
+                    # ハートビート更新（タイムアウトの期限を延ばすだけで走査はしない）
+                    player.last_heartbeat = time.time()
+                    self.timers.schedule(("player", player_id), player.last_heartbeat + HEARTBEAT_TIMEOUT)
                     
-                    # メッセージ本体を受信
-                    message_bytes = self._recv_exactly(client_socket, message_length)
-                    if not message_bytes:
+                    # 1回の受信で届いている完全なメッセージをすべて取り出す
+                    try:
+                        frames = reader.read_frames()
+                    except (EOFError, FrameError, OSError):
                         break
                     
-                    message_str = message_bytes.decode('utf-8')
-                    message_data = Protocol.parse_message(message_str)
-                    
-                    if message_data:
-                        self._process_message(player, message_data)
-                    
-                    # ハートビート更新
-                    player.last_heartbeat = time.time()
-                    
                 except Exception as e:
                     print(f"メッセージ処理エラー (Player {player_id}): {e}")
                     break
@@ -192,10 +336,61 @@ class TetrisServer:
             print(f"クライアント処理エラー: {e}")
         
         finally:
-            self._disconnect_player(player)
+            if not player.handed_off:
+                self._disconnect_player(player)
+    
+    def _next_player_id(self) -> str:
+        """新しいプレイヤーIDを発行（マルチプロセス時はワーカー番号を含めて重複を防ぐ）"""
+        worker = f"w{self.cluster.index}_" if self.cluster else ""
+        player_id = f"player_{worker}{self.total_connections}_{int(time.time())}"
+        self.total_connections += 1
+        return player_id
+    
+    def _hand_off(self, player: TetrisPlayer, reader: FrameReader, frames: List[memoryview]) -> bool:
+        """接続をルームを所有するワーカーに渡す（frames は引き継ぎ先で処理し直すメッセージ）"""
+        owner = player.handoff_worker
+        player.handoff_worker = None
+        
+        if player.room_id:
+            self._handle_leave_room(player)
+        
+        pending = b"".join(encode_frame(bytes(frame)) for frame in frames) + reader.pending_bytes()
+        player_state = {"player_id": player.player_id, "player_name": player.player_name}
+        if not self.cluster.hand_off(owner, player.socket, player_state, pending):
+            return False
+        
+        # 引き継ぎ先が同じ接続を使い続けるので、切断通知はせず自分の参照だけを閉じる
+        player.handed_off = True
+        player.connected = False
+        with self.players_lock:
+            self.players.pop(player.player_id, None)
+        try:
+            player.socket.close()
+        except OSError:
+            pass
+        print(f"接続をワーカー {owner} に引き継ぎ: {player.address} (ID: {player.player_id})")
+        return True
+    
+    def _accept_handoff(self, client_socket: socket.socket, player_state: Dict[str, Any], pending: bytes):
+        """別のワーカーから引き継いだ接続の処理を開始"""
+        try:
+            address = client_socket.getpeername()
+        except OSError:
+            client_socket.close()
+            return
+        
+        player = TetrisPlayer(client_socket, address, player_state.get("player_id", self._next_player_id()))
+        player.player_name = player_state.get("player_name", "")
+        threading.Thread(
+            target=self._handle_client,
+            args=(client_socket, address, player, pending),
+            daemon=True
+        ).start()
     
     def _process_message(self, player: TetrisPlayer, message: Dict[str, Any]):
         """受信メッセージを処理"""
+        received_at = time.time()
+        started = time.perf_counter()
         msg_type = message.get("type")
         data = message.get("data", {})
         
@@ -210,6 +405,8 @@ class TetrisServer:
                 self._handle_join_room(player, data)
             elif msg_type == MessageType.LEAVE_ROOM.value:
                 self._handle_leave_room(player)
+            elif msg_type == MessageType.LIST_ROOMS.value:
+                self._handle_list_rooms(player, data)
             elif msg_type == MessageType.PLAYER_ACTION.value:
                 self._handle_player_action(player, data)
             elif msg_type == MessageType.GAME_STATE.value:
@@ -219,11 +416,20 @@ class TetrisServer:
             elif msg_type == MessageType.HEARTBEAT.value:
                 # ハートビートは自動的に処理される
                 pass
+            elif msg_type == MessageType.PING.value:
+                self._handle_ping(player, data, received_at)
+            elif msg_type == MessageType.BATCH.value:
+                self._handle_batch(player, data)
+            elif msg_type == MessageType.MATCHMAKING.value:
+                self._handle_matchmaking(player, data)
             else:
                 self._send_error(player, "UNKNOWN_MESSAGE", f"不明なメッセージタイプ: {msg_type}")
         
         except Exception as e:
             self._send_error(player, "PROCESSING_ERROR", f"メッセージ処理エラー: {str(e)}")
+        
+        if msg_type != MessageType.BATCH.value:
+            self.metrics.observe_handle(str(msg_type), time.perf_counter() - started)
     
     def _handle_connect(self, player: TetrisPlayer, data: Dict[str, Any]):
         """接続メッセージを処理"""
@@ -247,13 +453,17 @@ class TetrisServer:
         password = data.get("password")
         
         with self.rooms_lock:
-            if room_id in self.rooms:
+            # マルチプロセス時は全ワーカーで共有する所有者表にも登録する
+            if room_id in self.rooms or (self.cluster and not self.cluster.registry.claim(room_id, self.cluster.index)):
                 self._send_error(player, "ROOM_EXISTS", "ルームが既に存在します")
                 return
             
             room = TetrisRoom(room_id, password)
+            room.metrics = self.metrics
             if room.add_player(player):
                 self.rooms[room_id] = room
+                self.directory.update(room_id, room.summary())
+                self.timers.schedule(("room", room_id), time.time() + ROOM_CHECK_INTERVAL)
                 
                 response = Protocol.create_message(MessageType.CREATE_ROOM, {
                     "success": True,
@@ -271,6 +481,11 @@ class TetrisServer:
         with self.rooms_lock:
             room = self.rooms.get(room_id)
             if not room:
+                owner = self.cluster.registry.owner(room_id) if self.cluster else None
+                if owner is not None and owner != self.cluster.index:
+                    # 別のワーカーのルーム：受信ループが接続ごと所有ワーカーに引き渡す
+                    player.handoff_worker = owner
+                    return
                 self._send_error(player, "ROOM_NOT_FOUND", "ルームが見つかりません")
                 return
             
@@ -278,11 +493,16 @@ class TetrisServer:
                 self._send_error(player, "INVALID_PASSWORD", "パスワードが間違っています")
                 return
             
+            if data.get("spectate"):
+                self._add_spectator(player, room)
+                return
+            
             if room.is_full():
                 self._send_error(player, "ROOM_FULL", "ルームが満員です")
                 return
             
             room.add_player(player)
+            self.directory.update(room_id, room.summary())
             
             # 参加成功を通知
             response = Protocol.create_message(MessageType.JOIN_ROOM, {
@@ -302,6 +522,12 @@ class TetrisServer:
     
     def _handle_leave_room(self, player: TetrisPlayer):
         """ルーム退出を処理"""
+        if player.spectating:
+            with self.rooms_lock:
+                self._remove_spectator(player, self.rooms.get(player.spectating))
+            self._send_message_to_player(player, Protocol.create_message(MessageType.LEAVE_ROOM, {"success": True}))
+            return
+        
         if not player.room_id or not player.room_id.strip():
             return
         
@@ -310,6 +536,11 @@ class TetrisServer:
             if room:
                 room.remove_player(player)
                 
+                # 権威モードの対戦中に抜けたプレイヤーは敗北扱い
+                if room.is_authoritative():
+                    room.authority.forfeit(player.player_id)
+                    self._advance_authority(room)
+                
                 # 他のプレイヤーに退出を通知
                 if not room.is_empty():
                     notification = Protocol.create_message(MessageType.ROOM_INFO, {
@@ -319,9 +550,14 @@ class TetrisServer:
                     })
                     room.broadcast_message(notification)
                 
-                # 空のルームを削除
-                if room.is_empty() and player.room_id in self.rooms:
-                    del self.rooms[player.room_id]
+                # 空のルームを削除（remove_player で player.room_id は空になっている）
+                if room.is_empty() and self.rooms.get(room.room_id) is room:
+                    self._close_spectators(room)
+                    del self.rooms[room.room_id]
+                    self._release_room(room.room_id)
+                    self.metrics.remove_room(room.room_id)
+                elif self.rooms.get(room.room_id) is room:
+                    self.directory.update(room.room_id, room.summary())
         
         # 退出成功を通知（プレイヤーが接続中の場合のみ）
         if player.connected:
@@ -339,6 +575,15 @@ class TetrisServer:
         
         with self.rooms_lock:
             room = self.rooms.get(player.room_id)
+        
+        if room and room.is_authoritative():
+            # 権威モードでは転送せず、サーバーのシミュレーションに入力する
+            if "tick" in data:
+                room.authority.add_input(player.player_id, data["tick"], data.get("action", ""), data)
+                self._advance_authority(room)
+            return
+        
+        with self.rooms_lock:
             if room:
                 # アクションを他のプレイヤーに転送
                 message = Protocol.create_message(MessageType.PLAYER_ACTION, {
@@ -353,16 +598,315 @@ class TetrisServer:
         if not player.room_id:
             return
         
+        event = data.get("event")
         with self.rooms_lock:
             room = self.rooms.get(player.room_id)
+            if room and event in ("start_game", "game_start") and data.get("sync_mode") == "server":
+                self._start_authority(room, data.get("seed"), data.get("garbage_messiness"))
+        
+        if room and room.is_authoritative():
+            # 権威モードではクライアント申告のゲーム状態・攻撃・勝敗は転送しない
+            if event == "input_tick":
+                room.authority.confirm(player.player_id, data.get("tick", 0))
+                self._advance_authority(room)
+                return
+            if event in ("game_state", "attack_warning", "attack", "game_over"):
+                return
+        
+        with self.rooms_lock:
             if room:
+                self.metrics.record_room_frame(room.room_id)
                 # ゲーム状態を他のプレイヤーに転送
                 message = Protocol.create_message(MessageType.GAME_STATE, {
                     "player_id": player.player_id,
                     "player_name": player.player_name,
                     **data
                 })
-                room.broadcast_message(message, exclude_player=player)
+                # 観戦者には盤面の定期送信などを最新のものだけ送る
+                key = f"{player.player_id}:{event}" if event in COALESCE_EVENTS else None
+                room.broadcast_message(message, exclude_player=player, coalesce_key=key)
+    
+    def _start_authority(self, room: TetrisRoom, seed: Optional[int], garbage_messiness: Optional[float] = None):
+        """サーバー権威モードの対戦を開始（同じシードの開始通知は一度だけ扱う）"""
+        if seed is None or len(room.players) < 2:
+            return
+        if room.is_authoritative() and room.authority.seed == seed:
+            return
+        
+        options = {}
+        if isinstance(garbage_messiness, (int, float)):
+            options["garbage_messiness"] = garbage_messiness
+        room.authority = AuthoritativeMatch([p.player_id for p in room.players], seed, **options)
+        room.game_started = True
+        print(f"権威モード対戦開始: ルーム {room.room_id} (シード: {seed})")
+    
+    def _advance_authority(self, room: TetrisRoom):
+        """権威シミュレーションを進め、ガベージ到着・状態・勝敗を配信"""
+        authority = room.authority
+        if not authority:
+            return
+        
+        arrivals = authority.advance()
+        self.metrics.record_room_tick(room.room_id, authority.tick)
+        for player_id, lines in arrivals:
+            target = room.get_player(player_id)
+            if target:
+                message = Protocol.create_game_state_message({
+                    "event": "garbage",
+                    "lines": lines,
+                    "tick": authority.tick
+                })
+                try:
+                    self._send_message_to_player(target, message)
+                except:
+                    pass
+        
+        if authority.should_send_state():
+            # 全員分を一度だけエンコードしてルームに配信
+            state = authority.get_state()
+            room.broadcast_message(Protocol.create_game_state_message({
+                "event": "authoritative_state",
+                **state
+            }))
+        
+        reported, winner = authority.pop_result()
+        if reported:
+            winner_player = room.get_player(winner) if winner else None
+            room.broadcast_message(Protocol.create_game_state_message({
+                "event": "match_result",
+                "winner": winner,
+                "winner_name": winner_player.player_name if winner_player else "",
+                "tick": authority.tick
+            }))
+            room.game_started = False
+            print(f"権威モード対戦終了: ルーム {room.room_id} (勝者: {winner_player.player_name if winner_player else 'なし'})")
+    
+    def _handle_ping(self, player: TetrisPlayer, data: Dict[str, Any], received_at: float):
+        """PINGに受信・送信時刻を付けて返す（クライアントの RTT・時刻オフセット計測用）"""
+        response = Protocol.create_pong_message(ClockSync.create_pong(data, received_at))
+        self._send_message_to_player(player, response)
+    
+    def _handle_batch(self, player: TetrisPlayer, data: Dict[str, Any]):
+        """まとめ送りされたメッセージを順に処理し、その間の送信も宛先ごとに1フレームにまとめる"""
+        if getattr(_outbound, "players", None) is not None:
+            return  # 入れ子のまとめ送りは受け付けない
+        
+        _outbound.players = {}
+        try:
+            for message in data.get("messages", []):
+                if isinstance(message, dict) and "type" in message:
+                    self._process_message(player, message)
+        finally:
+            targets = _outbound.players
+            _outbound.players = None
+            for target in targets.values():
+                self._flush_player(target)
+    
+    def _add_spectator(self, player: TetrisPlayer, room: TetrisRoom):
+        """観戦者としてルームに入れる（rooms_lock 取得済みで呼ぶ）"""
+        if player.room_id or player.spectating:
+            self._send_error(player, "ALREADY_IN_ROOM", "既にルームに参加しています")
+            return
+        if not room.feed.add(player):
+            self._send_error(player, "SPECTATORS_FULL", "観戦枠が満員です")
+            return
+        
+        player.spectating = room.room_id
+        player.send_queue = SendQueue()
+        self.directory.update(room.room_id, room.summary())
+        
+        response = Protocol.create_message(MessageType.JOIN_ROOM, {
+            "success": True,
+            "room_id": room.room_id,
+            "players": [p.player_name for p in room.players],
+            "spectator": True
+        })
+        self._send_message_to_player(player, response)
+    
+    def _remove_spectator(self, player: TetrisPlayer, room: Optional[TetrisRoom]):
+        """観戦をやめさせ、送信キューの残りを送りきる（rooms_lock 取得済みで呼ぶ）"""
+        if room:
+            room.feed.remove(player)
+            if self.rooms.get(room.room_id) is room:
+                self.directory.update(room.room_id, room.summary())
+        player.spectating = ""
+        queue, player.send_queue = player.send_queue, None
+        if queue:
+            try:
+                queue.close(player.socket if player.connected else None)
+            except OSError:
+                player.connected = False
+    
+    def _close_spectators(self, room: TetrisRoom):
+        """削除するルームの観戦者に終了を通知して外す（rooms_lock 取得済みで呼ぶ）"""
+        notification = Protocol.create_message(MessageType.ROOM_INFO, {"event": "room_closed", "room_id": room.room_id})
+        for spectator in room.feed.snapshot():
+            self._remove_spectator(spectator, room)
+            try:
+                self._send_message_to_player(spectator, notification)
+            except Exception:
+                pass
+    
+    def _spectator_loop(self):
+        """観戦者への配信ループ（溜まったメッセージをルームごとに1回だけエンコードして全観戦者に送る）"""
+        interval = SPECTATOR_INTERVAL
+        while self.running:
+            time.sleep(interval)
+            started = time.perf_counter()
+            
+            with self.rooms_lock:
+                rooms = list(self.rooms.values())
+            
+            total = 0
+            for room in rooms:
+                spectators = room.feed.snapshot()
+                if not spectators:
+                    continue
+                total += len(spectators)
+                
+                frames = room.feed.take_frames()
+                for spectator in spectators:
+                    queue = spectator.send_queue
+                    if queue is None:
+                        continue
+                    if frames:
+                        queue.push(frames)
+                    try:
+                        queue.drain(spectator.socket)
+                    except OSError:
+                        # 受信スレッドを起こして切断処理をさせる
+                        spectator.connected = False
+                        try:
+                            spectator.socket.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+            
+            # 観戦者が多いか配信が間に合っていなければ間隔を広げる（盤面は最新優先なので間引かれるだけ）
+            elapsed = time.perf_counter() - started
+            under_load = total > SPECTATOR_LOAD_THRESHOLD or elapsed > SPECTATOR_INTERVAL / 2
+            interval = SPECTATOR_INTERVAL_UNDER_LOAD if under_load else SPECTATOR_INTERVAL
+    
+    def _handle_list_rooms(self, player: TetrisPlayer, data: Dict[str, Any]):
+        """ルーム一覧の要求を処理（応答はキャッシュ済みの文字列をそのまま送る）"""
+        if data.get("subscribe") is True:
+            self.directory.subscribe(player.player_id)
+        elif data.get("subscribe") is False:
+            self.directory.unsubscribe(player.player_id)
+        
+        self._send_message_to_player(player, self.directory.list_message(data))
+    
+    def _directory_loop(self):
+        """溜まったルーム一覧の差分を一定間隔でまとめて購読者に送る"""
+        while self.running:
+            time.sleep(PUSH_INTERVAL)
+            
+            message, subscriber_ids = self.directory.take_changes()
+            if not message:
+                continue
+            
+            with self.players_lock:
+                subscribers = [self.players.get(player_id) for player_id in subscriber_ids]
+            for player in subscribers:
+                # ルームに入っている間は送らない（ロビーに戻ったとき一覧を取り直す）
+                if player is None or not player.connected or player.room_id:
+                    continue
+                try:
+                    self._send_message_to_player(player, message)
+                except Exception:
+                    pass
+    
+    def _handle_matchmaking(self, player: TetrisPlayer, data: Dict[str, Any]):
+        """クイックマッチの登録・取り消しを処理"""
+        action = data.get("action")
+        if action == "enqueue":
+            if player.room_id:
+                self._send_error(player, "ALREADY_IN_ROOM", "ルームに参加中はマッチングできません")
+                return
+            
+            try:
+                rating = int(data.get("rating", DEFAULT_RATING))
+                rtt = float(data["rtt"]) if data.get("rtt") is not None else None
+            except (TypeError, ValueError):
+                self._send_error(player, "INVALID_MATCH_REQUEST", "マッチング条件が不正です")
+                return
+            
+            self.matchmaking.enqueue(player.player_id, rating, rtt)
+            response = Protocol.create_message(MessageType.MATCHMAKING, {
+                "event": "queued",
+                "waiting": len(self.matchmaking)
+            })
+            self._send_message_to_player(player, response)
+        
+        elif action == "cancel":
+            cancelled = self.matchmaking.cancel(player.player_id)
+            response = Protocol.create_message(MessageType.MATCHMAKING, {
+                "event": "cancelled",
+                "success": cancelled
+            })
+            self._send_message_to_player(player, response)
+        
+        else:
+            self._send_error(player, "INVALID_MATCH_REQUEST", f"不明なマッチング操作: {action}")
+    
+    def _matchmaking_loop(self):
+        """一定間隔で待ち行列をまとめてペアリングし、ルームを作成"""
+        while self.running:
+            time.sleep(MATCH_INTERVAL)
+            
+            for first, second in self.matchmaking.pair():
+                self._start_match(first, second)
+    
+    def _start_match(self, first: MatchTicket, second: MatchTicket):
+        """組まれた2人のルームを作成して通知（先に待っていた方がホスト）"""
+        with self.players_lock:
+            players = [self.players.get(first.player_id), self.players.get(second.player_id)]
+        
+        # 待っている間に切断・ルーム参加したプレイヤーは外し、相手は待ち行列に戻す
+        available = [p is not None and p.connected and not p.room_id for p in players]
+        if not all(available):
+            for ticket, ok in zip((first, second), available):
+                if ok:
+                    self.matchmaking.requeue(ticket)
+            return
+        
+        self.total_matches += 1
+        worker = f"w{self.cluster.index}_" if self.cluster else ""
+        room_id = f"match_{worker}{self.total_matches}_{int(time.time())}"
+        
+        with self.rooms_lock:
+            claimed = not self.cluster or self.cluster.registry.claim(room_id, self.cluster.index)
+            if claimed:
+                room = TetrisRoom(room_id)
+                room.metrics = self.metrics
+                for player in players:
+                    room.add_player(player)
+                self.rooms[room_id] = room
+                self.directory.update(room_id, room.summary())
+                self.timers.schedule(("room", room_id), time.time() + ROOM_CHECK_INTERVAL)
+        
+        if not claimed:
+            # ルームIDを確保できなかった：2人とも待ち行列に戻して次の組み合わせを待つ
+            print(f"マッチングのルーム作成に失敗: {room_id}")
+            self.matchmaking.requeue(first)
+            self.matchmaking.requeue(second)
+            return
+        
+        names = [p.player_name for p in players]
+        for index, (player, ticket) in enumerate(zip(players, (first, second))):
+            opponent = players[1 - index]
+            message = Protocol.create_message(MessageType.MATCHMAKING, {
+                "event": "matched",
+                "room_id": room_id,
+                "players": names,
+                "opponent_name": opponent.player_name,
+                "host": index == 0,
+                "wait_time": time.time() - ticket.enqueued_at
+            })
+            try:
+                self._send_message_to_player(player, message)
+            except Exception:
+                pass
+        print(f"マッチング成立: {names[0]} vs {names[1]} (ルーム: {room_id})")
     
     def _handle_chat_message(self, player: TetrisPlayer, data: Dict[str, Any]):
         """チャットメッセージを処理"""
@@ -389,14 +933,19 @@ class TetrisServer:
         """プレイヤーを切断"""
         print(f"プレイヤー切断: {player.address} (ID: {player.player_id})")
         
-        # ルームから退出
-        if player.room_id and player.room_id.strip():
+        # マッチング待ち・ルーム一覧の購読を取り消し
+        self.matchmaking.cancel(player.player_id)
+        self.directory.unsubscribe(player.player_id)
+        
+        # ルーム・観戦から退出
+        if player.spectating or (player.room_id and player.room_id.strip()):
             self._handle_leave_room(player)
         
         # プレイヤーリストから削除
         with self.players_lock:
-            if player.player_id in self.players:
+            if self.players.get(player.player_id) is player:
                 del self.players[player.player_id]
+                self.timers.cancel(("player", player.player_id))
         
         # ソケットを閉じる
         player.connected = False
@@ -408,74 +957,114 @@ class TetrisServer:
     def _send_error(self, player: TetrisPlayer, error_code: str, error_message: str):
         """エラーメッセージを送信"""
         error_msg = Protocol.create_error_message(error_code, error_message)
+        self.metrics.record_error(error_code)
         self._send_message_to_player(player, error_msg)
     
     @staticmethod
     def _send_message_to_player(player: TetrisPlayer, message: str):
-        """プレイヤーにメッセージを送信"""
+        """プレイヤーにメッセージを送信（まとめ送りの処理中は溜めておく）"""
         if not player.connected:
             return
         
+        pending = getattr(_outbound, "players", None)
+        if pending is not None:
+            player.outbox.add(message)
+            pending[player.player_id] = player
+            return
+        
+        TetrisServer._write_frame(player, message)
+    
+    @staticmethod
+    def _flush_player(player: TetrisPlayer):
+        """溜めたメッセージを1フレームで送信"""
+        messages = player.outbox.take()
+        if not messages or not player.connected:
+            return
+        
+        message = messages[0] if len(messages) == 1 else Protocol.create_batch_message(messages)
+        try:
+            TetrisServer._write_frame(player, message)
+        except Exception:
+            pass  # 切断は受信スレッド側で処理される
+    
+    @staticmethod
+    def _write_frame(player: TetrisPlayer, message: str):
+        """プレイヤーの接続に書き込み、送信量を記録"""
         try:
-            message_bytes = message.encode('utf-8')
-            length = len(message_bytes)
-            player.socket.sendall(length.to_bytes(4, byteorder='big') + message_bytes)
+            size = player.write(message)
+            if player.metrics:
+                player.metrics.record_out(Protocol.message_type(message), size)
         except Exception as e:
             player.connected = False
             raise e
     
-    @staticmethod
-    def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
-        """指定したサイズのデータを確実に受信"""
-        data = b''
-        while len(data) < size:
-            try:
-                chunk = sock.recv(size - len(data))
-                if not chunk:
-                    return None
-                data += chunk
-            except:
-                return None
-        return data
-    
-    def _heartbeat_loop(self):
-        """ハートビートループ"""
+    def _timer_loop(self):
+        """タイマーループ（期限を過ぎたものだけを処理する）"""
         while self.running:
-            time.sleep(30)  # 30秒間隔
-            
-            current_time = time.time()
-            disconnected_players = []
+            time.sleep(TIMER_INTERVAL)
             
-            with self.players_lock:
-                for player in self.players.values():
-                    if current_time - player.last_heartbeat > 60:  # 60秒タイムアウト
-                        disconnected_players.append(player)
+            for kind, key in self.timers.advance():
+                if kind == "player":
+                    self._expire_player(key)
+                elif kind == "room":
+                    self._expire_room(key)
+    
+    def _expire_player(self, player_id: str):
+        """一定時間受信のないプレイヤーを切断"""
+        with self.players_lock:
+            player = self.players.get(player_id)
+        if not player:
+            return
+        
+        self.metrics.record_heartbeat_timeout()
+        print(f"ハートビートタイムアウト: {player.address} (ID: {player_id})")
+        # 受信待ちのスレッドを起こして終了させる
+        try:
+            player.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._disconnect_player(player)
+    
+    def _expire_room(self, room_id: str):
+        """空のルームを削除（プレイヤーがいれば次の確認を予約）"""
+        with self.rooms_lock:
+            room = self.rooms.get(room_id)
+            if not room:
+                return
+            if not room.is_empty():
+                self.timers.schedule(("room", room_id), time.time() + ROOM_CHECK_INTERVAL)
+                return
             
-            # タイムアウトしたプレイヤーを切断
-            for player in disconnected_players:
-                self._disconnect_player(player)
+            self._close_spectators(room)
+            del self.rooms[room_id]
+            self._release_room(room_id)
+            self.metrics.remove_room(room_id)
+            print(f"空のルームを削除: {room_id}")
+    
+    def _release_room(self, room_id: str):
+        """削除したルームをルーム一覧と共有の所有者表から削除"""
+        self.directory.remove(room_id)
+        if self.cluster:
+            self.cluster.registry.release(room_id, self.cluster.index)
     
-    def _cleanup_loop(self):
-        """クリーンアップループ"""
+    def _metrics_log_loop(self):
+        """計測値の定期ログ"""
         while self.running:
-            time.sleep(300)  # 5分間隔
-            
-            # 空のルームを削除
-            with self.rooms_lock:
-                empty_rooms = [room_id for room_id, room in self.rooms.items() if room.is_empty()]
-                for room_id in empty_rooms:
-                    del self.rooms[room_id]
-                    print(f"空のルームを削除: {room_id}")
+            time.sleep(LOG_INTERVAL)
+            if self.running:
+                print(self.metrics.summary_line())
     
     def get_stats(self) -> Dict[str, Any]:
-        """サーバー統計を取得"""
+        """サーバー統計を取得（計測値を含む）"""
         with self.players_lock, self.rooms_lock:
-            return {
+            stats = {
                 "players": len(self.players),
                 "rooms": len(self.rooms),
                 "total_connections": self.total_connections,
                 "uptime": time.time() - self.start_time
             }
+        stats["metrics"] = self.metrics.snapshot()
+        return stats
 
 
 # サーバー単体実行用
@@ -0,0 +1,141 @@
+# 観戦者への配信（エンコード済みフレームの共有・送信キュー・負荷時の間引き）
+import socket
+import threading
+from collections import deque
+from typing import Deque, List, Optional
+
+from network.framing import encode_frame
+from network.outbox import Outbox
+
+# 1ルームあたりの観戦者の上限
+MAX_SPECTATORS = 500
+
+# 観戦者へ配信する間隔（秒）。通常時と負荷時
+SPECTATOR_INTERVAL = 1 / 20
+SPECTATOR_INTERVAL_UNDER_LOAD = 1 / 5
+
+# サーバー全体の観戦者がこの数を超えたら負荷時の間隔にする
+SPECTATOR_LOAD_THRESHOLD = 200
+
+# 観戦者1人の送信キューに溜めてよいバイト数（超えたら古いフレームから捨てる）
+SPECTATOR_QUEUE_BYTES = 256 * 1024
+
+# ブロックしない送信のフラグ（使えない環境では通常の送信になる）
+SEND_FLAGS = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class SendQueue:
+    """観戦者1人の送信キュー
+
+    複数の観戦者が同じ bytes オブジェクトを共有して並べる。送信はブロックしない
+    send で行い、送りきれなかった分は次の配信で続きから送るため、遅い観戦者が
+    他の観戦者や対戦の処理を止めることはない。
+    """
+
+    def __init__(self, limit: int = SPECTATOR_QUEUE_BYTES):
+        self.limit = limit
+        self.frames: Deque[bytes] = deque()
+        # 先頭フレームの送信済みバイト数
+        self.offset = 0
+        self.size = 0
+        self.dropped = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def push(self, data: bytes) -> bool:
+        """送信データを追加（溜まりすぎたら送信を始めていない古いものから捨てる）
+
+        閉じたキューには追加せず False を返す（呼び出し側で直接送信する）。
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            self.frames.append(data)
+            self.size += len(data)
+            while self.size > self.limit and len(self.frames) > 1:
+                if self.offset:
+                    # 途中まで送ったフレームは最後まで送る必要があるので、その次を捨てる
+                    dropped = self.frames[1]
+                    del self.frames[1]
+                else:
+                    dropped = self.frames.popleft()
+                self.size -= len(dropped)
+                self.dropped += 1
+            return True
+
+    def drain(self, sock: socket.socket):
+        """送れるだけ送る（切断などのエラーは OSError で返す）"""
+        with self.lock:
+            while self.frames:
+                frame = self.frames[0]
+                try:
+                    sent = sock.send(memoryview(frame)[self.offset:], SEND_FLAGS)
+                except (BlockingIOError, InterruptedError):
+                    return
+                self.offset += sent
+                if self.offset < len(frame):
+                    return
+                self.frames.popleft()
+                self.size -= len(frame)
+                self.offset = 0
+
+    def close(self, sock: Optional[socket.socket] = None):
+        """観戦をやめるときに残りを送りきって閉じる（sock が None なら捨てる）"""
+        with self.lock:
+            self.closed = True
+            frames, self.frames = self.frames, deque()
+            offset, self.offset, self.size = self.offset, 0, 0
+            if sock is None:
+                return
+            for index, frame in enumerate(frames):
+                sock.sendall(memoryview(frame)[offset:] if index == 0 else frame)
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class SpectatorFeed:
+    """ルームの観戦配信
+
+    ルーム内に配信したメッセージを Outbox に溜め（盤面の定期送信などは最新優先で
+    まとめる）、配信のたびに1回だけフレームにエンコードして、同じ bytes を全観戦者の
+    送信キューに入れる。エンコードの回数は観戦者の数によらない。
+    """
+
+    def __init__(self, max_spectators: int = MAX_SPECTATORS):
+        self.max_spectators = max_spectators
+        self.spectators: List = []
+        self.pending = Outbox()
+        self.lock = threading.Lock()
+
+    def add(self, spectator) -> bool:
+        with self.lock:
+            if len(self.spectators) >= self.max_spectators:
+                return False
+            self.spectators.append(spectator)
+            return True
+
+    def remove(self, spectator):
+        with self.lock:
+            if spectator in self.spectators:
+                self.spectators.remove(spectator)
+
+    def snapshot(self) -> List:
+        """現在の観戦者（コピー）"""
+        with self.lock:
+            return list(self.spectators)
+
+    def publish(self, message: str, key: Optional[str] = None):
+        """配信するメッセージを追加（観戦者がいなければ捨てる）"""
+        if self.spectators:
+            self.pending.add(message, key)
+
+    def take_frames(self) -> Optional[bytes]:
+        """溜まったメッセージを長さ付きフレームを連結した1つの bytes にする（なければ None）"""
+        messages = self.pending.take()
+        if not messages:
+            return None
+        return b"".join(encode_frame(message.encode('utf-8')) for message in messages)
+
+    def __len__(self) -> int:
+        return len(self.spectators)
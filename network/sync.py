@@ -0,0 +1,199 @@
+# 入力同期（相手の入力列から盤面を再シミュレーション）
+import threading
+from typing import Dict, List, Tuple, Any, Optional
+from engine import TetrisEngine, VersusMatch, TICK_RATE, GARBAGE_MESSINESS
+
+# 巻き戻し可能な最大ティック数（これ以上相手が遅れたら相手を待つ）
+MAX_ROLLBACK_TICKS = 4 * TICK_RATE
+
+
+class InputSync:
+    """対戦相手の入力から盤面を再現するクラス
+
+    相手からは GameAction とティック番号だけを受け取り、共有シードで作成した
+    TetrisEngine に同じティックで適用することで相手の盤面を再現する。
+    入力は順序が保証された経路（TCP）で届くことを前提とする。
+    """
+
+    def __init__(self, seed: int, block_colors: Optional[list] = None, game_mode: str = "marathon",
+                 garbage_messiness: float = GARBAGE_MESSINESS):
+        self.seed = seed
+        self.engine = TetrisEngine(game_mode, seed=seed, block_colors=block_colors,
+                                   garbage_messiness=garbage_messiness)
+
+        # ティック -> そのティックの先頭で適用する入力リスト
+        self.pending_inputs: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+        # このティック未満の入力はすべて受信済み
+        self.confirmed_tick = 0
+        self.lock = threading.Lock()
+
+    def add_input(self, tick: int, action: str, data: Optional[Dict[str, Any]] = None):
+        """相手の入力を追加（受信スレッドから呼ばれる）"""
+        with self.lock:
+            self.pending_inputs.setdefault(tick, []).append((action, data or {}))
+            # tick の入力が届いた = それより前のティックの入力はすべて届いている
+            if tick > self.confirmed_tick:
+                self.confirmed_tick = tick
+
+    def confirm(self, tick: int):
+        """相手が tick まで進んだことを記録（入力がないティックの確定用）"""
+        with self.lock:
+            if tick > self.confirmed_tick:
+                self.confirmed_tick = tick
+
+    def advance(self) -> int:
+        """確定済みのティックまでシミュレーションを進め、進めたティック数を返す"""
+        with self.lock:
+            target = self.confirmed_tick
+            inputs = {}
+            for tick in [t for t in self.pending_inputs if t < target]:
+                inputs[tick] = self.pending_inputs.pop(tick)
+
+        steps = 0
+        while self.engine.tick < target:
+            self.engine.step(inputs.pop(self.engine.tick, ()))
+            steps += 1
+        return steps
+
+    def get_state(self) -> Dict[str, Any]:
+        """再現した相手の盤面を取得"""
+        return self.engine.get_state()
+
+
+class RollbackSession:
+    """ロールバック方式の対戦セッション
+
+    自分の入力は遅延なしで即座に適用し、相手の未着の入力は「新しい入力なし」と
+    予測して先行シミュレーションする。過去のティックの入力が遅れて届いた場合は、
+    そのティックの開始時点のスナップショットまで巻き戻して現在まで再計算する。
+    ガベージの送受信は両者の入力から VersusMatch が決定的に計算するため、
+    入力がそろえば双方の端末で同じ結果になる。
+    """
+
+    LOCAL = 0
+    REMOTE = 1
+
+    def __init__(self, local_engine: TetrisEngine, seed: int, block_colors: Optional[list] = None,
+                 max_rollback_ticks: int = MAX_ROLLBACK_TICKS):
+        self.seed = seed
+        self.local_engine = local_engine
+        self.remote_engine = TetrisEngine(local_engine.game_mode, seed=seed, block_colors=block_colors,
+                                          garbage_messiness=local_engine.garbage.messiness)
+        self.match = VersusMatch([self.local_engine, self.remote_engine])
+        self.max_rollback_ticks = max_rollback_ticks
+
+        # ティック -> 入力リスト（巻き戻し時の再計算用に保持）
+        self.local_inputs: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+        self.remote_inputs: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+        # このティック未満の相手の入力はすべて受信済み
+        self.remote_confirmed_tick = 0
+        # 予測と食い違った最も古いティック（次の advance で巻き戻す）
+        self.rollback_tick: Optional[int] = None
+
+        # ティック -> そのティック開始時点の状態
+        self.snapshots: Dict[int, Dict[str, Any]] = {0: self.match.snapshot()}
+
+        # 統計
+        self.rollback_count = 0
+        self.resimulated_ticks = 0
+
+        self.lock = threading.Lock()
+
+    @property
+    def tick(self) -> int:
+        """現在のティック（次に進めるティック）"""
+        return self.match.tick
+
+    def apply_local_input(self, action: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """自分の入力を即座に適用して記録し、入力のティック番号を返す"""
+        data = data or {}
+        with self.lock:
+            tick = self.match.tick
+            self.local_engine.apply_action(action, **data)
+            self.local_inputs.setdefault(tick, []).append((action, data))
+        return tick
+
+    def add_remote_input(self, tick: int, action: str, data: Optional[Dict[str, Any]] = None):
+        """相手の入力を追加（受信スレッドから呼ばれる）"""
+        with self.lock:
+            if tick < self.remote_confirmed_tick:
+                return  # 確定済みのティック（順序保証のある経路では起こらない）
+            self.remote_inputs.setdefault(tick, []).append((action, data or {}))
+            # 既に予測で進めたティックなら巻き戻しが必要
+            if tick < self.match.tick:
+                if self.rollback_tick is None or tick < self.rollback_tick:
+                    self.rollback_tick = tick
+            if tick > self.remote_confirmed_tick:
+                self.remote_confirmed_tick = tick
+
+    def confirm_remote(self, tick: int):
+        """相手が tick まで進んだことを記録"""
+        with self.lock:
+            if tick > self.remote_confirmed_tick:
+                self.remote_confirmed_tick = tick
+
+    def advance(self, ticks: int) -> int:
+        """必要なら巻き戻してから ticks だけ進め、実際に進めたティック数を返す"""
+        with self.lock:
+            if self.rollback_tick is not None:
+                self._rollback(self.rollback_tick)
+                self.rollback_tick = None
+
+            steps = 0
+            for _ in range(ticks):
+                # 相手が遅れすぎている場合は追いつくまで待つ
+                if self.match.tick - self.remote_confirmed_tick >= self.max_rollback_ticks:
+                    break
+                # 自分の入力は適用済みなので、ここでは相手の入力だけを渡す
+                self._step([], self.remote_inputs.get(self.match.tick, []))
+                steps += 1
+
+            self._discard_confirmed()
+            return steps
+
+    def _step(self, local_actions, remote_actions):
+        """1ティック進めてスナップショットを保存"""
+        inputs = [None, None]
+        inputs[self.LOCAL] = local_actions
+        inputs[self.REMOTE] = remote_actions
+        self.match.step(inputs)
+        self.snapshots[self.match.tick] = self.match.snapshot()
+
+    def _rollback(self, tick: int):
+        """tick の開始時点まで戻し、記録した入力で現在まで再計算する"""
+        snapshot = self.snapshots.get(tick)
+        if snapshot is None:
+            return
+
+        target = self.match.tick
+        self.match.restore(snapshot)
+        self.local_engine.muted = True
+        try:
+            while self.match.tick < target:
+                current = self.match.tick
+                self._step(self.local_inputs.get(current, []), self.remote_inputs.get(current, []))
+                self.resimulated_ticks += 1
+        finally:
+            self.local_engine.muted = False
+
+        # 現在のティックで既に適用した自分の入力を適用し直す
+        for action, data in self.local_inputs.get(target, []):
+            self.local_engine.apply_action(action, **data)
+        self.rollback_count += 1
+
+    def _discard_confirmed(self):
+        """もう巻き戻すことのない古い記録を捨てる"""
+        oldest = min(self.remote_confirmed_tick, self.match.tick)
+        for tick in [t for t in self.snapshots if t < oldest]:
+            del self.snapshots[tick]
+        for inputs in (self.local_inputs, self.remote_inputs):
+            for tick in [t for t in inputs if t < oldest]:
+                del inputs[tick]
+
+    def pending_garbage(self) -> List[List[int]]:
+        """自分が受ける予定のガベージ [残りティック, ライン数]"""
+        return self.match.pending_garbage(self.LOCAL)
+
+    def get_remote_state(self) -> Dict[str, Any]:
+        """予測を含む相手の盤面を取得"""
+        return self.remote_engine.get_state()
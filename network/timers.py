@@ -0,0 +1,85 @@
+# 期限付きタイマーのハッシュタイマーホイール（ハートビートのタイムアウト・空きルームの削除）
+import math
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# 1スロットの時間幅（秒）
+DEFAULT_RESOLUTION = 1.0
+
+# スロット数（これを超える先の期限は周回数で区別する）
+DEFAULT_SLOTS = 512
+
+
+class TimerWheel:
+    """キーごとに期限を1つ持つタイマーホイール
+
+    期限の更新（schedule）は辞書の書き換えだけで済み、スロットへの登録は
+    キーが新しいときか期限が早まったときだけ行う。スロットの時刻になったとき
+    期限が延びていれば新しい期限のスロットに登録し直す（遅延再登録）ため、
+    受信のたびに期限を延ばしても O(1) で、全件を走査する処理がない。
+    """
+
+    def __init__(self, resolution: float = DEFAULT_RESOLUTION, slots: int = DEFAULT_SLOTS,
+                 now: Optional[float] = None):
+        self.resolution = resolution
+        self.slots: List[List[Tuple[Hashable, int]]] = [[] for _ in range(slots)]
+        # キー -> 期限（時刻）
+        self.deadlines: Dict[Hashable, float] = {}
+        # キー -> 登録しているスロットのティック
+        self.slotted: Dict[Hashable, int] = {}
+        self.current_tick = int((now if now is not None else time.time()) // resolution)
+        self.lock = threading.Lock()
+
+    def _tick_of(self, deadline: float) -> int:
+        """期限を含むスロットのティック（期限を過ぎてから発火するよう切り上げる）"""
+        return max(self.current_tick + 1, int(math.ceil(deadline / self.resolution)))
+
+    def schedule(self, key: Hashable, deadline: float):
+        """key の期限を設定（既にあれば置き換える）"""
+        with self.lock:
+            self.deadlines[key] = deadline
+            tick = self._tick_of(deadline)
+            slotted = self.slotted.get(key)
+            if slotted is None or tick < slotted:
+                self._insert(key, tick)
+
+    def cancel(self, key: Hashable):
+        """key のタイマーを取り消す（スロットの登録は発火時に捨てる）"""
+        with self.lock:
+            self.deadlines.pop(key, None)
+            self.slotted.pop(key, None)
+
+    def _insert(self, key: Hashable, tick: int):
+        """スロットに登録（ロック取得済みで呼ぶ）"""
+        self.slotted[key] = tick
+        self.slots[tick % len(self.slots)].append((key, tick))
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """現在時刻まで進め、期限を過ぎたキーを返す"""
+        now = now if now is not None else time.time()
+        target = int(now // self.resolution)
+        expired = []
+        with self.lock:
+            while self.current_tick < target:
+                self.current_tick += 1
+                index = self.current_tick % len(self.slots)
+                entries = self.slots[index]
+                if not entries:
+                    continue
+                self.slots[index] = []
+                for key, tick in entries:
+                    if tick > self.current_tick:
+                        self.slots[index].append((key, tick))  # 後の周回
+                    elif self.slotted.get(key) != tick:
+                        continue  # 取り消し済み・別のスロットに登録し直したもの
+                    elif self.deadlines[key] <= now:
+                        del self.deadlines[key]
+                        del self.slotted[key]
+                        expired.append(key)
+                    else:
+                        self._insert(key, self._tick_of(self.deadlines[key]))
+        return expired
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
@@ -5,6 +5,14 @@ import json
 import time
 from typing import Callable, Optional, Dict, Any
 from network.protocol import Protocol, MessageType, GameAction
+from network.reliability import ReliableChannel, MAX_OUT_OF_ORDER
+from network.clock import ClockSync, PING_INTERVAL
+from logger import get_logger, trace
+
+log = get_logger(__name__)
+
+# 再送・ACK 処理の間隔（秒）
+RELIABILITY_INTERVAL = 0.01
 
 
 class UDPTetrisClient:
@@ -18,8 +26,12 @@ class UDPTetrisClient:
         self.player_id = ""
         self.room_id = ""
         
-        # シーケンス番号（パケットの順序管理用）
-        self.sequence = 0
+        # 信頼性レイヤー（ACK・再送・順序保証、接続ごとに作り直す）
+        self.channel = ReliableChannel()
+        self.send_lock = threading.Lock()
+        
+        # TCP クライアントと同じインターフェース（UDP は1メッセージ1データグラムで送るため使わない）
+        self.batch_mode = False
         
         # コールバック関数
         self.on_message_received: Optional[Callable[[Dict[str, Any]], None]] = None
@@ -34,6 +46,13 @@ class UDPTetrisClient:
         # ハートビート
         self.heartbeat_thread: Optional[threading.Thread] = None
         self.last_heartbeat = time.time()
+        
+        # 再送スレッド
+        self.reliability_thread: Optional[threading.Thread] = None
+        
+        # 通信品質の計測（PING/PONG）
+        self.clock = ClockSync()
+        self.ping_thread: Optional[threading.Thread] = None
     
     def connect(self, host: str, port: int, player_name: str) -> bool:
         """UDPサーバーに接続"""
@@ -48,11 +67,13 @@ class UDPTetrisClient:
             print(f"UDPソケット作成完了: {self.server_addr}")
             
             self.player_name = player_name
+            self.channel = ReliableChannel()
+            self.clock = ClockSync()
             self.connected = True
             self.running = True
             
             # 接続メッセージを送信
-            connect_msg = Protocol.create_connect_message(player_name)
+            connect_msg = Protocol.build_connect_message(player_name)
             print(f"接続メッセージ送信: {connect_msg}")
             self._send_message(connect_msg)
             
@@ -66,6 +87,14 @@ class UDPTetrisClient:
             self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
             self.heartbeat_thread.start()
             
+            # 再送スレッドを開始
+            self.reliability_thread = threading.Thread(target=self._reliability_loop, daemon=True)
+            self.reliability_thread.start()
+            
+            # PINGスレッドを開始
+            self.ping_thread = threading.Thread(target=self._ping_loop, daemon=True)
+            self.ping_thread.start()
+            
             print(f"コールバック実行...on_connected={self.on_connected is not None}")
             if self.on_connected:
                 self.on_connected()
@@ -84,7 +113,7 @@ class UDPTetrisClient:
         if self.connected:
             try:
                 # 切断メッセージを送信
-                disconnect_msg = Protocol.create_message(MessageType.DISCONNECT)
+                disconnect_msg = Protocol.build_message(MessageType.DISCONNECT)
                 self._send_message(disconnect_msg)
             except:
                 pass
@@ -99,7 +128,7 @@ class UDPTetrisClient:
             return False
         
         try:
-            message = Protocol.create_room_message(room_id, password)
+            message = Protocol.build_room_message(room_id, password)
             print(f"UDPクライアント: ルーム作成メッセージ送信 {message}")
             self._send_message(message)
             return True
@@ -115,7 +144,7 @@ class UDPTetrisClient:
             return False
         
         try:
-            message = Protocol.create_join_room_message(room_id, password)
+            message = Protocol.build_join_room_message(room_id, password)
             self._send_message(message)
             return True
         except Exception as e:
@@ -123,13 +152,27 @@ class UDPTetrisClient:
                 self.on_error("ROOM_ERROR", f"ルーム参加エラー: {str(e)}")
             return False
     
+    def spectate_room(self, room_id: str, password: Optional[str] = None) -> bool:
+        """ルームを観戦（対戦中の盤面などが一定間隔でまとめて届く。やめるときは leave_room）"""
+        if not self.connected:
+            return False
+        
+        try:
+            message = Protocol.build_join_room_message(room_id, password, spectate=True)
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("ROOM_ERROR", f"観戦エラー: {str(e)}")
+            return False
+    
     def leave_room(self) -> bool:
         """ルームから退出"""
         if not self.connected:
             return False
         
         try:
-            message = Protocol.create_message(MessageType.LEAVE_ROOM)
+            message = Protocol.build_message(MessageType.LEAVE_ROOM)
             self._send_message(message)
             self.room_id = ""
             return True
@@ -138,13 +181,15 @@ class UDPTetrisClient:
                 self.on_error("ROOM_ERROR", f"ルーム退出エラー: {str(e)}")
             return False
     
-    def list_rooms(self) -> bool:
-        """ルーム一覧を取得"""
+    def list_rooms(self, subscribe: bool = False, **options) -> bool:
+        """ルーム一覧を取得（subscribe=True で以降の変更をプッシュで受け取る）"""
         if not self.connected:
             return False
         
         try:
-            message = Protocol.create_list_rooms_message()
+            if subscribe:
+                options["subscribe"] = True
+            message = Protocol.build_list_rooms_message(**options)
             self._send_message(message)
             return True
         except Exception as e:
@@ -152,13 +197,44 @@ class UDPTetrisClient:
                 self.on_error("ROOM_ERROR", f"ルーム一覧取得エラー: {str(e)}")
             return False
     
+    def enqueue_match(self, rating: Optional[int] = None) -> bool:
+        """クイックマッチの待ち行列に登録（計測済みの RTT も送り、近い相手と組まれやすくする）"""
+        if not self.connected:
+            return False
+        
+        try:
+            kwargs = {"rtt": self.clock.srtt}
+            if rating is not None:
+                kwargs["rating"] = rating
+            message = Protocol.build_matchmaking_message("enqueue", **kwargs)
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("MATCH_ERROR", f"マッチング登録エラー: {str(e)}")
+            return False
+    
+    def cancel_match(self) -> bool:
+        """クイックマッチの待ち行列から抜ける"""
+        if not self.connected:
+            return False
+        
+        try:
+            message = Protocol.build_matchmaking_message("cancel")
+            self._send_message(message)
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error("MATCH_ERROR", f"マッチング取り消しエラー: {str(e)}")
+            return False
+    
     def send_game_action(self, action: GameAction, **kwargs) -> bool:
         """ゲームアクションを送信（高頻度・低遅延）"""
         if not self.connected:
             return False
         
         try:
-            message = Protocol.create_action_message(action, **kwargs)
+            message = Protocol.build_action_message(action, **kwargs)
             self._send_message_fast(message)  # 高速送信
             return True
         except Exception as e:
@@ -172,7 +248,7 @@ class UDPTetrisClient:
             return False
         
         try:
-            message = Protocol.create_game_state_message(game_state)
+            message = Protocol.build_game_state_message(game_state)
             self._send_message_fast(message)  # 高速送信
             return True
         except Exception as e:
@@ -186,7 +262,7 @@ class UDPTetrisClient:
             return False
         
         try:
-            chat_msg = Protocol.create_chat_message(message)
+            chat_msg = Protocol.build_chat_message(message)
             self._send_message(chat_msg)
             return True
         except Exception as e:
@@ -194,63 +270,83 @@ class UDPTetrisClient:
                 self.on_error("CHAT_ERROR", f"チャット送信エラー: {str(e)}")
             return False
     
-    def _send_message(self, message_str: str):
+    def flush(self) -> bool:
+        """まとめ送りはしない（信頼性レイヤーがメッセージ単位で再送・最新優先を判定するため）"""
+        return False
+    
+    def _send_message(self, message: Dict[str, Any]):
         """メッセージを送信（通常版）"""
         if self.socket and self.connected and self.server_addr:
             try:
-                # JSONパース
-                message_dict = json.loads(message_str)
-                
-                # シーケンス番号を追加
-                self.sequence += 1
-                message_dict['sequence'] = self.sequence
-                message_dict['player_id'] = self.player_id
-                
-                # 再エンコード
-                message_bytes = json.dumps(message_dict).encode('utf-8')
-                
-                self.socket.sendto(message_bytes, self.server_addr)
-                
+                self._send_datagram(message)
             except Exception as e:
                 self._handle_connection_error(f"送信エラー: {str(e)}")
     
-    def _send_message_fast(self, message_str: str):
+    def _send_message_fast(self, message: Dict[str, Any]):
         """メッセージを高速送信（ゲーム用・エラーハンドリング最小）"""
         if self.socket and self.connected and self.server_addr:
             try:
-                message_dict = json.loads(message_str)
-                self.sequence += 1
-                message_dict['sequence'] = self.sequence
-                message_dict['player_id'] = self.player_id
-                
-                message_bytes = json.dumps(message_dict).encode('utf-8')
-                self.socket.sendto(message_bytes, self.server_addr)
-                
+                self._send_datagram(message)
             except:
                 # ゲーム用なのでエラーは無視（遅延を避けるため）
                 pass
     
+    def _send_datagram(self, message_dict: Dict[str, Any]):
+        """信頼性ヘッダー（シーケンス番号・ACK）を付けて送信
+        
+        Protocol.build_* で作った辞書にヘッダーを足し、エンコードは送信時の1回だけ行う。
+        盤面状態とハートビートは再送しない最新優先、それ以外は ACK と再送で順序どおり届ける。
+        """
+        message_dict['player_id'] = self.player_id
+        # タイムスタンプはサーバーの時刻で付ける
+        message_dict['timestamp'] = self.clock.server_time()
+        with self.send_lock:
+            packet = self.channel.prepare(message_dict)
+            self.socket.sendto(json.dumps(packet).encode('utf-8'), self.server_addr)
+    
+    def _reliability_loop(self):
+        """再送・ACK ループ（別スレッドで実行）"""
+        while self.running and self.connected:
+            time.sleep(RELIABILITY_INTERVAL)
+            try:
+                with self.send_lock:
+                    for packet in self.channel.poll():
+                        packet['player_id'] = self.player_id
+                        self.socket.sendto(json.dumps(packet).encode('utf-8'), self.server_addr)
+            except Exception as e:
+                if self.running:
+                    self._handle_connection_error(f"再送エラー: {str(e)}")
+                break
+            
+            if self.channel.failed:
+                self._handle_connection_error("再送の上限に達しました（サーバーに届きません）")
+                break
+    
     def _receive_loop(self):
         """受信ループ（別スレッドで実行）"""
-        print("受信ループが開始されました")
+        log.info("受信ループが開始されました")
         while self.running and self.connected:
             try:
-                data, addr = self.socket.recvfrom(4096)  # 4KB受信
-                print(f"パケット受信: from {addr}, expected {self.server_addr}")
+                data, addr = self.socket.recvfrom(65535)  # データグラムの最大サイズまで受信
+                received_at = time.time()
+                trace("udp_recv", len(data))
                 
                 if addr != self.server_addr:
-                    print(f"アドレス不一致: {addr} != {self.server_addr}")
+                    log.warning("アドレス不一致: %s != %s", addr, self.server_addr)
                     continue  # 不正なアドレスからのパケットは無視
                 
                 message_str = data.decode('utf-8')
-                print(f"UDPクライアント受信: {message_str}")
+                log.debug("UDPクライアント受信: %s", message_str)
                 message_data = Protocol.parse_message(message_str)
                 
-                if message_data and self.on_message_received:
-                    print(f"コールバック実行: {message_data.get('type')}")
-                    self.on_message_received(message_data)
-                else:
-                    print(f"コールバック実行されず: message_data={message_data is not None}, callback={self.on_message_received is not None}")
+                # ACK を処理し、順序どおりに届けられるメッセージだけを渡す
+                for message in self.channel.receive(message_data) if message_data else []:
+                    # PONGは計測に使い、アプリケーションには渡さない
+                    if message.get("type") == MessageType.PONG.value:
+                        self.clock.on_pong(message.get("data", {}), received_at)
+                        continue
+                    if self.on_message_received:
+                        self.on_message_received(message)
                 
                 self.last_heartbeat = time.time()
                 
@@ -264,6 +360,12 @@ class UDPTetrisClient:
         
         self._close_connection()
     
+    def _ping_loop(self):
+        """PINGループ（RTT・ジッター・時刻オフセットの計測）"""
+        while self.running and self.connected:
+            self._send_message_fast(Protocol.build_ping_message(self.clock.create_ping()))
+            time.sleep(PING_INTERVAL)
+    
     def _heartbeat_loop(self):
         """ハートビートループ"""
         while self.running and self.connected:
@@ -272,7 +374,7 @@ class UDPTetrisClient:
                 time.sleep(30)
                 
                 if self.connected:
-                    heartbeat_msg = Protocol.create_message(MessageType.HEARTBEAT)
+                    heartbeat_msg = Protocol.build_message(MessageType.HEARTBEAT)
                     self._send_message_fast(heartbeat_msg)
                 
                 # 90秒間応答がない場合はタイムアウト
@@ -320,11 +422,22 @@ class UDPTetrisClient:
         """現在のルームIDを取得"""
         return self.room_id
     
+    def server_time(self) -> float:
+        """サーバーの時刻（推定）を取得"""
+        return self.clock.server_time()
+    
+    def send_backlog(self) -> float:
+        """ACK を待っている信頼メッセージの量（サーバーが順序待ちで保持できる数に対する割合）"""
+        return len(self.channel.pending) / MAX_OUT_OF_ORDER
+    
     def get_latency_info(self) -> Dict[str, Any]:
-        """レイテンシ情報を取得（UDP版では簡易実装）"""
+        """RTT・ジッター・損失率・時刻オフセットを取得"""
         return {
             "connected": self.connected,
             "last_heartbeat": self.last_heartbeat,
-            "sequence": self.sequence,
-            "protocol": "UDP"
+            "sequence": self.channel.local_sequence,
+            "protocol": "UDP",
+            "quality": self.clock.quality(),
+            "reliability": self.channel.get_stats(),
+            **self.clock.get_stats()
         }
@@ -0,0 +1,223 @@
+# UDP サーバー実装（asyncio のデータグラムエンドポイント。ルーム・対戦の処理は TetrisServer と共通）
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+from network.protocol import Protocol, MessageType
+from network.reliability import ReliableChannel, HEADER_FIELDS
+from network.server import TetrisServer, TetrisPlayer, TetrisRoom, HEARTBEAT_TIMEOUT
+
+# 再送・ACK 処理の間隔（秒）
+RELIABILITY_INTERVAL = 0.01
+
+# LIST_ROOMS の1ページの上限（応答を1データグラムに収めるため）
+UDP_PAGE_SIZE = 10
+
+
+class UDPPlayer(TetrisPlayer):
+    """UDP のプレイヤー（送信は信頼性レイヤーのヘッダーを付けたデータグラム）"""
+
+    def __init__(self, server: "UDPTetrisServer", address: tuple, player_id: str):
+        super().__init__(None, address, player_id)
+        self.server = server
+        self.channel = ReliableChannel()
+
+    def write(self, message: str) -> int:
+        """メッセージにシーケンス番号・ACK を付けて送信し、送信したバイト数を返す
+
+        ルームへの一斉送信では同じメッセージが受信者の数だけ渡されるため、解析と本体の
+        エンコードはサーバーで1回だけ行い、受信者ごとのヘッダーだけを書き足して送る。
+        """
+        message_dict, body = self.server._decode_outgoing(message)
+        packet = self.channel.prepare(message_dict)
+        return self.server._send_packet(self, packet, body)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """受信したデータグラムをサーバーに渡す"""
+
+    def __init__(self, server: "UDPTetrisServer"):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.server._handle_datagram(data, addr)
+
+    def error_received(self, exc: Exception):
+        print(f"UDP受信エラー: {exc}")
+
+
+class UDPTetrisServer(TetrisServer):
+    """テトリス UDP サーバー
+
+    受信はイベントループ1本で全クライアントのデータグラムを処理し、相手ごとのスレッドは
+    作らない。クライアントはアドレスで識別し、ReliableChannel で ACK・再送・順序保証を行う
+    （UDPTetrisClient・Go 版 UDP サーバーと同じ形式）。ルーム・マッチメイキング・
+    ルーム一覧・権威モードの処理は TetrisServer のものをそのまま使う。
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 12346, metrics_port: Optional[int] = None):
+        super().__init__(host, port, metrics_port=metrics_port)
+        self.players_by_addr: Dict[tuple, UDPPlayer] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        # 最後に送信用に解析したメッセージ (文字列, 辞書, 末尾の } を除いた本体)
+        self.last_outgoing: Tuple[Optional[str], Dict[str, Any], Optional[bytes]] = (None, {}, None)
+
+    def start(self) -> bool:
+        """サーバーを開始（停止するまで戻らない）"""
+        try:
+            asyncio.run(self._serve())
+            return True
+        except Exception as e:
+            print(f"UDPサーバー開始エラー: {e}")
+            return False
+
+    async def _serve(self):
+        """データグラムの受信と再送処理を行うイベントループ"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=(self.host, self.port)
+        )
+        self.running = True
+        print(f"テトリス UDP サーバーが {self.host}:{self.port} で開始されました")
+        self._start_background_threads()
+
+        try:
+            while self.running:
+                await asyncio.sleep(RELIABILITY_INTERVAL)
+                self._poll_channels()
+        finally:
+            self.transport.close()
+            self.transport = None
+
+    def _handle_datagram(self, data: bytes, addr: tuple):
+        """1データグラムを処理（イベントループ上で実行）"""
+        received_at = time.time()
+        try:
+            message = Protocol.parse_message(data.decode('utf-8'))
+        except UnicodeDecodeError:
+            message = None
+        if not message:
+            return
+
+        player = self.players_by_addr.get(addr)
+        if player is not None and self._is_new_session(player, message):
+            # 同じアドレスから接続し直した：前のセッションの送信状態は引き継げないので作り直す
+            self._disconnect_player(player)
+            player = None
+        if player is None:
+            # 接続メッセージ以外で始まるアドレスは相手にしない（接続は再送されてくる）
+            if message.get("type") != MessageType.CONNECT.value:
+                return
+            player = UDPPlayer(self, addr, self._next_player_id())
+            player.metrics = self.metrics
+            with self.players_lock:
+                self.players[player.player_id] = player
+                self.players_by_addr[addr] = player
+            print(f"UDPクライアント接続: {addr} (ID: {player.player_id})")
+
+        self.metrics.record_in(message["type"], len(data))
+        player.last_heartbeat = received_at
+        self.timers.schedule(("player", player.player_id), received_at + HEARTBEAT_TIMEOUT)
+
+        # ACK を処理し、順序どおりに届けられるメッセージだけを処理する
+        for delivered in player.channel.receive(message):
+            self._process_message(player, delivered)
+
+    @staticmethod
+    def _is_new_session(player: UDPPlayer, message: Dict[str, Any]) -> bool:
+        """新しいクライアントの最初のパケット（接続メッセージ）か"""
+        return (message.get("type") == MessageType.CONNECT.value and message.get("sequence") == 1
+                and message.get("reliable_sequence") == 0 and player.channel.remote_sequence is not None)
+
+    def _poll_channels(self):
+        """再送と ACK 専用パケットの送信（待ちのある相手だけ）"""
+        with self.players_lock:
+            players = list(self.players.values())
+
+        for player in players:
+            channel = player.channel
+            if not channel.pending and channel.ack_pending_since is None:
+                continue
+            for packet in channel.poll():
+                self._send_packet(player, packet)
+            if channel.failed:
+                print(f"再送の上限に達しました: {player.address} (ID: {player.player_id})")
+                self._disconnect_player(player)
+
+    def _decode_outgoing(self, message: str) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """送信するメッセージの辞書とエンコード済みの本体（直前と同じメッセージなら使い回す）"""
+        cached_message, message_dict, body = self.last_outgoing
+        if cached_message is not message:
+            message_dict = json.loads(message)
+            # 空でないオブジェクトなら、ヘッダーは末尾の } の前に書き足せる
+            body = message.encode('utf-8')[:-1] if message_dict and message.endswith("}") else None
+            self.last_outgoing = (message, message_dict, body)
+        # ヘッダーは受信者ごとに付けるので最上位だけ複製する
+        return dict(message_dict), body
+
+    def _send_packet(self, player: UDPPlayer, packet: Dict[str, Any], body: Optional[bytes] = None) -> int:
+        """データグラムを送信（イベントループ以外のスレッドからはループに依頼する）
+
+        body（エンコード済みの本体）を渡すと、パケットのヘッダーだけをエンコードして付け足す。
+        """
+        if body is None:
+            data = json.dumps(packet).encode('utf-8')
+        else:
+            header = json.dumps({key: packet[key] for key in HEADER_FIELDS if key in packet})
+            data = body + b", " + header[1:].encode('utf-8')
+        transport = self.transport
+        if transport is None:
+            raise ConnectionError("UDPサーバーが停止しています")
+        if threading.get_ident() == self.loop_thread_id:
+            transport.sendto(data, player.address)
+        else:
+            self.loop.call_soon_threadsafe(transport.sendto, data, player.address)
+        return len(data)
+
+    def _handle_disconnect(self, player: TetrisPlayer):
+        """切断メッセージを処理（UDP には受信スレッドがないのでここで切断する）"""
+        self._disconnect_player(player)
+
+    def _disconnect_player(self, player: TetrisPlayer):
+        """プレイヤーを切断"""
+        super()._disconnect_player(player)
+        with self.players_lock:
+            if self.players_by_addr.get(player.address) is player:
+                del self.players_by_addr[player.address]
+
+    def _expire_player(self, player_id: str):
+        """一定時間受信のないプレイヤーを切断"""
+        with self.players_lock:
+            player = self.players.get(player_id)
+        if not player:
+            return
+
+        self.metrics.record_heartbeat_timeout()
+        print(f"ハートビートタイムアウト: {player.address} (ID: {player_id})")
+        self._disconnect_player(player)
+
+    def _handle_list_rooms(self, player: TetrisPlayer, data: Dict[str, Any]):
+        """ルーム一覧の要求を処理（1ページを1データグラムに収まる件数にする）"""
+        try:
+            limit = min(UDP_PAGE_SIZE, int(data.get("limit", UDP_PAGE_SIZE)))
+        except (TypeError, ValueError):
+            limit = UDP_PAGE_SIZE
+        super()._handle_list_rooms(player, {**data, "limit": limit})
+
+    def _add_spectator(self, player: TetrisPlayer, room: TetrisRoom):
+        """観戦は TCP のみ（観戦配信は長さ付きフレームをまとめて送るため）"""
+        self._send_error(player, "SPECTATE_UNSUPPORTED", "UDP 接続では観戦できません（TCP で接続してください）")
+
+
+# サーバー単体実行用
+if __name__ == "__main__":
+    server = UDPTetrisServer()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        print("\nサーバーを停止します...")
+        server.stop()
@@ -2,19 +2,38 @@
 import pygame
 import time
 import json
+import random
+from collections import deque
 from typing import Dict, List, Optional, Any
 from game import Tetris
+from engine import TICK_DT, DEFAULT_BLOCK_COLORS, GARBAGE_MESSINESS, AttackQueue
 from network.client import TetrisClient
 from network.protocol import MessageType, GameAction
+from network.sync import InputSync, RollbackSession
+from network.jitter import JitterBuffer, RENDER_DELAY
+from network.send_rate import SendRateController
+from network.authority import MAX_CLIENT_LEAD_TICKS
 import config
 from config import scale_factor, font, small_font, big_font, GRID_WIDTH, GRID_HEIGHT, BLOCK_SIZE
 from ui import Button
+from input_controller import MoveInputController, SHIFT_TO_WALL, event_time
+from input_latency import InputLatencyProbe
+from logger import get_logger, trace
+
+log = get_logger(__name__)
 
 
 class OnlineGame:
     """オンライン対戦ゲームクラス"""
     
-    def __init__(self, screen_width: int, screen_height: int, client: TetrisClient):
+    # 固定ティックで進め、入力をティック番号付きで送る同期方式
+    TICK_SYNC_MODES = ("input", "rollback", "server")
+    # 攻撃を攻撃メッセージでやり取りする同期方式（それ以外は入力から計算する）
+    ATTACK_MESSAGE_MODES = ("state", "input")
+    
+    def __init__(self, screen_width: int, screen_height: int, client: TetrisClient,
+                 sync_mode: Optional[str] = None, garbage_messiness: Optional[float] = None,
+                 latency_probe: Optional[InputLatencyProbe] = None):
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.client = client
@@ -22,6 +41,8 @@ class OnlineGame:
         # ゲーム状態
         self.local_game = Tetris("marathon")  # 自分のゲーム
         self.opponent_game_state = {}  # 相手のゲーム状態
+        # 盤面送信方式で受信した相手の状態（並べ替えて少し遅れて再生する）
+        self.opponent_frames = JitterBuffer(config.settings.get("online_render_delay", RENDER_DELAY))
         self.game_started = False
         self.game_over = False
         self.winner = None
@@ -34,13 +55,42 @@ class OnlineGame:
         
         # 攻撃システム
         self.attack_lines = 0  # 送信予定のガベージライン数
-        self.pending_garbage = []  # 受信したガベージライン
-        self.outgoing_attacks = []  # 送信中の攻撃 (delay, lines)
-        self.incoming_attacks = []  # 受信中の攻撃 (delay, lines)
+        self.pending_garbage = deque()  # 受信したガベージ（攻撃ごとのライン数）
+        # 送信中・受信中の攻撃（到着時刻は time.time()。ロールバックモードではシミュレーションのキューでティック）
+        self.outgoing_attacks = AttackQueue()
+        self.incoming_attacks = AttackQueue()
+        # 受信スレッドが受け取った攻撃予告 (到着時刻, ライン数)。AttackQueue はメインスレッドだけで
+        # 操作するため、update の最初に incoming_attacks へ移す
+        self.received_attacks = deque()
         
         # 同期用
         self.last_state_send = 0
-        self.send_interval = 1/30  # 30FPS でゲーム状態を送信
+        self.send_interval = 1/30  # 入力同期モードのティック通知の間隔（30FPS）
+        # 盤面送信モードは変化したときだけ送り、RTT や送信の詰まりに応じて間引く
+        self.send_rate = SendRateController()
+        self.last_sent_signature = None  # 最後に送った状態（変化の判定用）
+        self.state_seq = 0  # 送信したゲーム状態の通し番号（相手のジッターバッファの並べ替え用）
+        
+        # 同期方式: "state"（盤面を送信）、"input"（入力とティックのみ送信）、
+        # "rollback"（入力同期 + 予測と巻き戻し、ガベージも入力から決定的に計算）、
+        # "server"（入力のみ送信し、盤面・ガベージ・勝敗はサーバーの計算結果に従う）
+        self.sync_mode = sync_mode or config.settings.get("online_sync_mode", "state")
+        self.game_seed = None
+        # ガベージの穴の散らばり具合（開始時にシードと一緒に共有する）
+        if not isinstance(garbage_messiness, (int, float)):
+            garbage_messiness = config.settings.get("garbage_messiness", GARBAGE_MESSINESS)
+        self.garbage_messiness = garbage_messiness
+        self.input_sync: Optional[InputSync] = None  # 相手盤面の再シミュレーション
+        self.rollback: Optional[RollbackSession] = None  # ロールバック対戦セッション
+        self.authoritative_state: Dict[str, Any] = {}  # サーバー権威モードの最新状態
+        self.server_pending_garbage: List[tuple] = []  # 受信予定ガベージ (到着ティック, ライン数)
+        self.tick_accumulator = 0.0
+        
+        # 左右移動の DAS/ARR（キーを押した時刻から計算する）
+        self.move_input = MoveInputController.from_settings(config.settings)
+        
+        # 入力遅延の計測（main から渡される。無効なら何も記録しない）
+        self.latency_probe = latency_probe or InputLatencyProbe()
         
         # 画面制御
         self.should_exit = False
@@ -52,6 +102,8 @@ class OnlineGame:
         # クライアントコールバック設定
         if self.client:
             self.client.on_message_received = self._on_message_received
+            # 1フレーム中の送信はまとめて update の最後に送る
+            self.client.batch_mode = True
     
     def setup_layout(self):
         """レイアウトを設定"""
@@ -103,75 +155,156 @@ class OnlineGame:
             "テスト攻撃", self._test_attack
         )
     
-    def start_game(self):
+    def start_game(self, seed: Optional[int] = None):
         """ゲーム開始"""
         self.game_started = True
-        self.local_game.reset()
+        
+        # 共有シードでピース順を揃える（指定がなければ自分で決める）
+        self.game_seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.local_game = Tetris("marathon", seed=self.game_seed, garbage_messiness=self.garbage_messiness)
+        self.tick_accumulator = 0.0
+        self.opponent_frames.clear()
+        
+        if self.sync_mode == "input":
+            self.input_sync = InputSync(self.game_seed, block_colors=config.theme["blocks"],
+                                        garbage_messiness=self.garbage_messiness)
+        elif self.sync_mode == "rollback":
+            self.rollback = RollbackSession(self.local_game, self.game_seed,
+                                            block_colors=config.theme["blocks"])
         
         # ゲーム開始メッセージを送信
         if self.client:
             start_msg = {
                 "event": "game_start",
-                "timestamp": time.time()
+                "seed": self.game_seed,
+                "sync_mode": self.sync_mode,
+                "garbage_messiness": self.garbage_messiness,
+                "timestamp": self._server_time()
             }
             self.client.send_game_state(start_msg)
     
     def update(self, events: List[pygame.event.Event], keys_held: Dict, dt: float) -> bool:
         """ゲームを更新"""
+        self._drain_received_attacks()
+        
         if not self.game_started:
+            self._flush_outbox()
             return True
         
-        # イベント処理
+        # イベント処理（時刻を持たないイベントは受け取った時刻とする）
+        now = pygame.time.get_ticks() / 1000
         for event in events:
             if event.type == pygame.KEYDOWN:
-                self._handle_key_press(event.key)
+                self._handle_key_press(event.key, event_time(event, now))
             elif event.type == pygame.KEYUP:
-                self._handle_key_release(event.key)
+                self._handle_key_release(event.key, event_time(event, now))
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # 左クリック
                     self._handle_mouse_click(event.pos)
         
         # DAS/ARR処理
-        self._handle_das_arr(keys_held, dt)
+        self._handle_das_arr(now)
         
         # ローカルゲームの更新
         if not self.local_game.game_over:
             # ライン消去時の攻撃処理（update前にチェック）
             old_lines_cleared = self.local_game.lines_cleared
             
-            self.local_game.update(dt)
+            self._update_local_game(dt)
             
             # ライン消去数の変化をチェック
             lines_cleared_this_frame = self.local_game.lines_cleared - old_lines_cleared
             
-            if lines_cleared_this_frame > 0:
-                print(f"ライン消去検出: {lines_cleared_this_frame}ライン (総計: {old_lines_cleared} -> {self.local_game.lines_cleared})")
+            # ロールバック・サーバー権威モードでは攻撃は入力から計算される
+            if lines_cleared_this_frame > 0 and self.sync_mode in self.ATTACK_MESSAGE_MODES:
+                log.debug("ライン消去検出: %dライン (総計: %d -> %d)",
+                          lines_cleared_this_frame, old_lines_cleared, self.local_game.lines_cleared)
                 self._send_attack(lines_cleared_this_frame)
             
-            # 攻撃状況をデバッグ表示
-            if self.outgoing_attacks:
-                print(f"[DEBUG] 送信中攻撃: {self.outgoing_attacks}")
-            if self.incoming_attacks:
-                print(f"[DEBUG] 受信中攻撃: {self.incoming_attacks}")
-        
-        # 攻撃システムの更新
-        self._update_attacks(dt)
-        
-        # ガベージライン処理
-        self._process_garbage_lines()
-        
-        # ゲーム状態の定期送信
+            # 攻撃状況をデバッグ表示（トレースには件数だけ記録）
+            if self.outgoing_attacks or self.incoming_attacks:
+                # キューをそのまま渡す（中身の文字列化は出力するときだけ）
+                log.debug("送信中攻撃: %r 受信中攻撃: %r", self.outgoing_attacks, self.incoming_attacks)
+                trace("attack_queues", len(self.outgoing_attacks), len(self.incoming_attacks))
+        
+        if self.sync_mode in self.ATTACK_MESSAGE_MODES:
+            # 攻撃システムの更新
+            self._update_attacks(time.time())
+            
+            # ガベージライン処理
+            self._process_garbage_lines()
+        elif self.sync_mode == "server":
+            # サーバーから到着を通知されたガベージを適用
+            self._apply_server_garbage()
+        
+        # 入力同期モードでは相手の盤面を入力から再現
+        if self.input_sync:
+            self.input_sync.advance()
+            self.opponent_game_state = self.input_sync.get_state()
+        elif self.rollback:
+            self.opponent_game_state = self.rollback.get_remote_state()
+            # 攻撃の表示はシミュレーションのキューをそのまま参照する（到着時刻はティック、
+            # 巻き戻しでキューが入れ替わるのでフレームごとに参照し直す）
+            self.incoming_attacks = self.rollback.match.incoming[RollbackSession.LOCAL]
+            self.outgoing_attacks = self.rollback.match.incoming[RollbackSession.REMOTE]
+        elif self.sync_mode == "state":
+            # 盤面送信モードではジッターバッファから表示する時刻の状態を取り出す
+            frame = self.opponent_frames.sample(self._server_time())
+            if frame:
+                self.opponent_game_state = frame
+        
+        # ゲーム状態の送信
         current_time = time.time()
-        if current_time - self.last_state_send > self.send_interval:
-            self._send_game_state()
-            self.last_state_send = current_time
+        if self.sync_mode in self.TICK_SYNC_MODES:
+            if current_time - self.last_state_send > self.send_interval:
+                self._send_game_state()
+                self.last_state_send = current_time
+        else:
+            self._send_state_if_changed(current_time)
         
-        # ゲームオーバー判定
-        if self.local_game.game_over and not self.game_over:
+        # ゲームオーバー判定（サーバー権威モードではサーバーの判定を待つ）
+        if self.local_game.game_over and not self.game_over and self.sync_mode != "server":
             self._handle_game_over("lose")
         
+        # このフレームで作ったメッセージを1回の書き込みで送信
+        self._flush_outbox()
         return True
     
+    def _flush_outbox(self):
+        """溜めている送信メッセージをまとめて送信"""
+        if self.client:
+            self.client.flush()
+    
+    def _update_local_game(self, dt: float):
+        """ローカルゲームを進める（入力同期モードでは固定ティックで進める）"""
+        if self.sync_mode not in self.TICK_SYNC_MODES:
+            self.local_game.update(dt)
+            return
+        
+        self.tick_accumulator += dt
+        if self.rollback:
+            # 相手を待っている間は進めない（その間の時間は捨てる）
+            ticks = int(self.tick_accumulator / TICK_DT)
+            self.rollback.advance(ticks)
+            self.tick_accumulator -= ticks * TICK_DT
+            return
+        
+        while self.tick_accumulator >= TICK_DT:
+            if self.sync_mode == "server" and not self._can_lead_server():
+                # サーバーが追いつくまで進めない（その間の時間は捨てる）
+                self.tick_accumulator = 0.0
+                break
+            self.local_game.step()
+            self.tick_accumulator -= TICK_DT
+    
+    def _can_lead_server(self) -> bool:
+        """サーバー権威モード：受信した権威状態より先に進める余地があるか
+        
+        相手が遅れるとサーバーは相手のティックまでしか進まないため、先に進みすぎると
+        ガベージの到着の通知が自分のティックでは遅れて届き、盤面がずれやすくなる。
+        """
+        return self.local_game.tick - self.authoritative_state.get("tick", 0) < MAX_CLIENT_LEAD_TICKS
+    
     def draw(self, screen: pygame.Surface):
         """ゲーム画面を描画"""
         # 背景
@@ -232,6 +365,11 @@ class OnlineGame:
         if grid:
             self._draw_mini_grid(screen, grid, self.opponent_game_x, self.opponent_game_y)
         
+        # 相手の操作中のピース（位置は補間されて小数になることがある）
+        piece = self.opponent_game_state.get("current_piece")
+        if piece and piece.get("shape") and piece.get("color"):
+            self._draw_mini_piece(screen, piece, self.opponent_game_x, self.opponent_game_y)
+        
         # 相手のスコア表示
         score = self.opponent_game_state.get("score", 0)
         level = self.opponent_game_state.get("level", 1)
@@ -267,6 +405,22 @@ class OnlineGame:
                         pygame.draw.rect(screen, config.theme["grid_line"], 
                                        (block_x, block_y, mini_block_size, mini_block_size), 1)
     
+    def _draw_mini_piece(self, screen: pygame.Surface, piece: Dict[str, Any], x: int, y: int):
+        """小さいグリッド上に操作中のピースを描画"""
+        mini_block_size = int(BLOCK_SIZE * scale_factor * self.opponent_scale)
+        dark_color = tuple(max(0, c - 50) for c in piece["color"][:3])
+        
+        for row, cells in enumerate(piece["shape"]):
+            for col, cell in enumerate(cells):
+                if not cell or piece["y"] + row < 0:
+                    continue
+                block_x = x + int((piece["x"] + col) * mini_block_size)
+                block_y = y + int((piece["y"] + row) * mini_block_size)
+                pygame.draw.rect(screen, dark_color, 
+                               (block_x, block_y, mini_block_size, mini_block_size))
+                pygame.draw.rect(screen, config.theme["grid_line"], 
+                               (block_x, block_y, mini_block_size, mini_block_size), 1)
+    
     def _draw_ui(self, screen: pygame.Surface):
         """UI要素を描画"""
         # チャット欄
@@ -298,22 +452,30 @@ class OnlineGame:
         y_offset = 40
         
         # デバッグ情報
-        debug_text = small_font.render(f"送信キュー: {len(self.outgoing_attacks)}", True, config.theme["text"])
+        debug_text = small_font.render(f"送信キュー: {len(self.outgoing_attacks)}件 ({self.outgoing_attacks.total}ライン)",
+                                       True, config.theme["text"])
         screen.blit(debug_text, (self.attack_display_x + 10, self.attack_display_y + y_offset))
         y_offset += 20
         
-        debug_text2 = small_font.render(f"受信キュー: {len(self.incoming_attacks)}", True, config.theme["text"])
+        debug_text2 = small_font.render(f"受信キュー: {len(self.incoming_attacks)}件 ({self.incoming_attacks.total}ライン)",
+                                        True, config.theme["text"])
         screen.blit(debug_text2, (self.attack_display_x + 10, self.attack_display_y + y_offset))
         y_offset += 25
         
+        # ロールバックモードのキューはシミュレーションのもの（到着時刻はティック）
+        if self.rollback:
+            now, scale = self.rollback.match.tick, TICK_DT
+        else:
+            now, scale = time.time(), 1.0
+        
         # 送信中の攻撃
         if self.outgoing_attacks:
             out_text = small_font.render("送信中:", True, (255, 150, 150))
             screen.blit(out_text, (self.attack_display_x + 10, self.attack_display_y + y_offset))
             y_offset += 20
             
-            for i, (delay, lines) in enumerate(self.outgoing_attacks[:3]):
-                attack_text = small_font.render(f"  {lines}ライン (あと{delay:.1f}秒)", True, (255, 100, 100))
+            for i, (delay, lines) in enumerate(self.outgoing_attacks.remaining(now, 3)):
+                attack_text = small_font.render(f"  {lines}ライン (あと{delay * scale:.1f}秒)", True, (255, 100, 100))
                 screen.blit(attack_text, (self.attack_display_x + 10, self.attack_display_y + y_offset))
                 y_offset += 15
         
@@ -323,8 +485,8 @@ class OnlineGame:
             screen.blit(in_text, (self.attack_display_x + 10, self.attack_display_y + y_offset))
             y_offset += 20
             
-            for i, (delay, lines) in enumerate(self.incoming_attacks[:3]):
-                attack_text = small_font.render(f"  {lines}ライン (あと{delay:.1f}秒)", True, (100, 100, 255))
+            for i, (delay, lines) in enumerate(self.incoming_attacks.remaining(now, 3)):
+                attack_text = small_font.render(f"  {lines}ライン (あと{delay * scale:.1f}秒)", True, (100, 100, 255))
                 screen.blit(attack_text, (self.attack_display_x + 10, self.attack_display_y + y_offset))
                 y_offset += 15
     
@@ -351,7 +513,7 @@ class OnlineGame:
         text_rect = text.get_rect(center=(self.screen_width // 2, self.screen_height // 2))
         screen.blit(text, text_rect)
     
-    def _handle_key_press(self, key: int):
+    def _handle_key_press(self, key: int, timestamp: float):
         """キー押下処理"""
         action = None
         
@@ -373,16 +535,35 @@ class OnlineGame:
         elif key == key_bindings.get("hold", pygame.K_c):
             action = GameAction.HOLD
         
+        # 左右移動は押した時刻から DAS を溜める
+        if action in (GameAction.MOVE_LEFT, GameAction.MOVE_RIGHT):
+            self.move_input.press(-1 if action == GameAction.MOVE_LEFT else 1, timestamp)
+        
         # ローカルゲームに反映
         if action:
+            before = self.latency_probe.watch(self.local_game)
             self._apply_action_to_local_game(action)
+            self.latency_probe.input(action.value, timestamp, self.local_game, before)
             
             # アクションをサーバーに送信
-            if self.client:
-                self.client.send_game_action(action)
+            self._send_action(action)
+    
+    def _send_action(self, action: GameAction, **kwargs):
+        """アクションをサーバーに送信（入力同期モードではティック番号を付ける）"""
+        if not self.client:
+            return
+        
+        if self.sync_mode in self.TICK_SYNC_MODES:
+            kwargs["tick"] = self.local_game.tick
+        self.client.send_game_action(action, **kwargs)
     
     def _apply_action_to_local_game(self, action: GameAction):
         """アクションをローカルゲームに適用"""
+        if self.rollback:
+            # 巻き戻し時に再適用できるよう記録してから適用する
+            self.rollback.apply_local_input(action.value)
+            return
+        
         if action == GameAction.MOVE_LEFT:
             self.local_game.move(-1)
         elif action == GameAction.MOVE_RIGHT:
@@ -399,53 +580,51 @@ class OnlineGame:
         elif action == GameAction.HOLD:
             self.local_game.hold_piece()
     
-    def _handle_das_arr(self, keys_held: Dict, dt: float):
-        """DAS/ARR処理"""
-        # キー設定を取得
-        key_bindings = config.settings.get("key_bindings", {})
+    def _handle_das_arr(self, now: float):
+        """DAS/ARR処理（前のフレームから now までに溜まった回数だけ移動）"""
+        direction, count = self.move_input.poll(now)
+        if direction == 0:
+            return
         
-        # DAS/ARR設定を取得
-        das_delay = config.settings.get("das_delay", 0.167)
-        arr_delay = config.settings.get("arr_delay", 0.033)
-        
-        # DAS/ARRタイマーの初期化（初回のみ）
-        if not hasattr(self, 'das_left_timer'):
-            self.das_left_timer = 0
-            self.das_right_timer = 0
-            self.arr_left_timer = 0
-            self.arr_right_timer = 0
-        
-        # 左右移動のDAS/ARR処理
-        left_key = key_bindings.get("move_left", pygame.K_LEFT)
-        right_key = key_bindings.get("move_right", pygame.K_RIGHT)
-        
-        if keys_held.get(left_key) and not keys_held.get(right_key):
-            self.das_left_timer += dt
-            if self.das_left_timer >= das_delay:
-                self.arr_left_timer += dt
-                if self.arr_left_timer >= arr_delay:
-                    self.local_game.move(-1)
-                    self.arr_left_timer = 0
-        elif keys_held.get(right_key) and not keys_held.get(left_key):
-            self.das_right_timer += dt
-            if self.das_right_timer >= das_delay:
-                self.arr_right_timer += dt
-                if self.arr_right_timer >= arr_delay:
-                    self.local_game.move(1)
-                    self.arr_right_timer = 0
-        else:
-            # どちらも押されていない、または両方押されている場合はリセット
-            self.das_left_timer = 0
-            self.das_right_timer = 0
-            self.arr_left_timer = 0
-            self.arr_right_timer = 0
+        action = GameAction.MOVE_LEFT if direction < 0 else GameAction.MOVE_RIGHT
+        # ARR 0 は壁まで移動（入力同期では1マスずつ入力として送る）
+        shifts = GRID_WIDTH if count == SHIFT_TO_WALL else count
+        for _ in range(shifts):
+            if not self._auto_shift(action):
+                break
     
-    def _handle_key_release(self, key: int):
+    def _auto_shift(self, action: GameAction) -> bool:
+        """DAS/ARRによる自動移動（移動できなければ False）"""
+        direction = -1 if action == GameAction.MOVE_LEFT else 1
+        if self.rollback:
+            # 動けない移動は入力として記録・送信しない
+            if not self.local_game.valid_move(self.local_game.current_piece, x_offset=direction):
+                return False
+            self.rollback.apply_local_input(action.value)
+            self._send_action(action)
+            return True
+        
+        if not self.local_game.move(direction):
+            return False
+        if self.sync_mode in self.TICK_SYNC_MODES:
+            self._send_action(action)
+        return True
+    
+    def _handle_key_release(self, key: int, timestamp: float):
         """キー離上処理"""
         # ソフトドロップの終了など
         key_bindings = config.settings.get("key_bindings", {})
+        if key == key_bindings.get("move_left", pygame.K_LEFT):
+            self.move_input.release(-1, timestamp)
+        elif key == key_bindings.get("move_right", pygame.K_RIGHT):
+            self.move_input.release(1, timestamp)
         if key == key_bindings.get("soft_drop", pygame.K_DOWN):
-            self.local_game.soft_drop = False
+            if self.rollback:
+                self.rollback.apply_local_input(GameAction.SOFT_DROP_END.value)
+            else:
+                self.local_game.soft_drop = False
+            if self.sync_mode in self.TICK_SYNC_MODES:
+                self._send_action(GameAction.SOFT_DROP_END)
     
     def _send_attack(self, lines_cleared: int):
         """攻撃を送信（遅延付き）"""
@@ -471,23 +650,13 @@ class OnlineGame:
         print(f"_send_attack呼び出し: lines_cleared={lines_cleared}, attack_power={attack_power}")
         
         if attack_power > 0:
-            # まず相殺処理
-            cancelled = 0
-            for attack in self.incoming_attacks[:]:
-                if cancelled < attack_power:
-                    cancel_amount = min(attack_power - cancelled, attack[1])
-                    attack[1] -= cancel_amount
-                    cancelled += cancel_amount
-                    if attack[1] <= 0:
-                        self.incoming_attacks.remove(attack)
-            
-            # 相殺後の残り攻撃力
-            remaining_attack = attack_power - cancelled
+            # まず受信中の攻撃を古い順に相殺し、残りの攻撃力を求める
+            remaining_attack = self.incoming_attacks.cancel(attack_power)
             
             if remaining_attack > 0:
                 # 攻撃を遅延キューに追加（2秒後に発動）
                 delay = 2.0
-                self.outgoing_attacks.append([delay, remaining_attack])
+                self.outgoing_attacks.push(time.time() + delay, remaining_attack)
                 
                 # 相手にも攻撃予告を送信
                 if self.client:
@@ -495,62 +664,95 @@ class OnlineGame:
                         "event": "attack_warning",
                         "lines": remaining_attack,
                         "delay": delay,
-                        "timestamp": time.time()
+                        "timestamp": self._server_time()
                     }
                     self.client.send_game_state(attack_msg)
     
-    def _update_attacks(self, dt: float):
-        """攻撃の更新処理"""
-        # 送信中の攻撃の遅延を減らす
-        for attack in self.outgoing_attacks[:]:
-            attack[0] -= dt  # delay -= dt
-            if attack[0] <= 0:
-                # 攻撃を実際に送信
-                lines = attack[1]
-                if self.client:
-                    attack_msg = {
-                        "event": "attack",
-                        "lines": lines,
-                        "timestamp": time.time()
-                    }
-                    self.client.send_game_state(attack_msg)
-                self.outgoing_attacks.remove(attack)
-        
-        # 受信中の攻撃の遅延を減らす
-        for attack in self.incoming_attacks[:]:
-            attack[0] -= dt  # delay -= dt
-            if attack[0] <= 0:
-                # ガベージラインを追加
-                lines = attack[1]
-                for _ in range(lines):
-                    self.pending_garbage.append(1)
-                self.incoming_attacks.remove(attack)
+    def _drain_received_attacks(self):
+        """受信スレッドから届いた攻撃予告を受信中の攻撃に移す"""
+        while self.received_attacks:
+            due, lines = self.received_attacks.popleft()
+            # 攻撃予告を使わないモードではキューがシミュレーションのものなので入れない
+            if self.sync_mode in self.ATTACK_MESSAGE_MODES:
+                self.incoming_attacks.push(due, lines)
+    
+    def _update_attacks(self, now: float):
+        """攻撃の更新処理（到着時刻を過ぎたものだけを取り出す）"""
+        # 送信中の攻撃のうち発動したものを実際に送信
+        for lines in self.outgoing_attacks.pop_due(now):
+            if self.client:
+                attack_msg = {
+                    "event": "attack",
+                    "lines": lines,
+                    "timestamp": self._server_time()
+                }
+                self.client.send_game_state(attack_msg)
+        
+        # 受信中の攻撃のうち到着したものをガベージラインとして追加
+        self.pending_garbage.extend(self.incoming_attacks.pop_due(now))
     
     def _process_garbage_lines(self):
-        """ガベージラインを処理"""
-        if self.pending_garbage and not self.local_game.game_over:
-            # 一度に1ラインずつ追加
-            garbage_count = self.pending_garbage.pop(0)
-            self._add_garbage_line()
-    
-    def _add_garbage_line(self):
-        """ガベージラインを追加"""
-        # グリッドを上にシフト
-        for row in range(1, GRID_HEIGHT):
-            for col in range(GRID_WIDTH):
-                self.local_game.grid[row - 1][col] = self.local_game.grid[row][col]
-        
-        # 最下段にガベージラインを追加（1箇所空きを作る）
-        empty_col = __import__('random').randint(0, GRID_WIDTH - 1)
-        for col in range(GRID_WIDTH):
-            if col != empty_col:
-                self.local_game.grid[GRID_HEIGHT - 1][col] = (128, 128, 128)  # グレー
+        """届いたガベージをすべてこのフレームで追加"""
+        while self.pending_garbage and not self.local_game.game_over:
+            self._add_garbage_lines(self.pending_garbage.popleft())
+    
+    def _add_garbage_lines(self, lines: int):
+        """1回の攻撃分のガベージラインをまとめて追加"""
+        # 穴位置は共有シードのガベージ用乱数で決める（同じ攻撃の穴は同じ列に揃える）
+        self.local_game.add_random_garbage(lines)
+        
+        # 入力同期モードでは相手側の再シミュレーションにもライン数だけ伝える
+        # （相手側も同じシードのガベージ用乱数で同じ穴位置を決める）
+        if self.sync_mode == "input":
+            self._send_action(GameAction.GARBAGE, lines=lines)
+    
+    def _apply_server_garbage(self):
+        """サーバー権威モード：通知されたガベージを現在のティックで適用してサーバーに伝える"""
+        while self.pending_garbage and not self.local_game.game_over:
+            lines = self.pending_garbage.popleft()
+            # 穴位置は共有シードのガベージ用乱数で決まるのでサーバーと一致する
+            self.local_game.apply_action(GameAction.GARBAGE.value, lines=lines)
+            self._send_action(GameAction.GARBAGE, lines=lines)
+    
+    def _on_authoritative_state(self, data: Dict[str, Any]):
+        """サーバー権威モード：配信された状態から相手の盤面と受信予定ガベージを更新"""
+        self.authoritative_state = data
+        own_id = self.client.player_id if self.client else ""
+        for player_id, state in data.get("players", {}).items():
+            if player_id == own_id:
+                # 残りティックは毎ティック減るので到着ティックで比べ、変わったときだけ作り直す
+                tick = data.get("tick", 0)
+                pending = [(tick + ticks, lines) for ticks, lines in state.get("pending_garbage", [])]
+                if pending != self.server_pending_garbage:
+                    self.server_pending_garbage = pending
+                    now = time.time()
+                    self.incoming_attacks = AttackQueue([now + (due - tick) * TICK_DT, lines]
+                                                        for due, lines in pending)
             else:
-                self.local_game.grid[GRID_HEIGHT - 1][col] = None
+                state["grid"] = self._apply_theme_colors(state.get("grid", []))
+                self.opponent_game_state = state
+    
+    @staticmethod
+    def _apply_theme_colors(grid: List[List[Any]]) -> List[List[Any]]:
+        """サーバーの盤面（標準色）を現在のテーマの色に置き換える"""
+        theme_colors = {tuple(color): config.theme["blocks"][i] for i, color in enumerate(DEFAULT_BLOCK_COLORS)}
+        return [[theme_colors.get(tuple(cell), cell) if cell else cell for cell in row] for row in grid]
     
     def _send_game_state(self):
         """ゲーム状態を送信"""
-        if not self.client or self.local_game.game_over:
+        if not self.client:
+            return
+        
+        if self.sync_mode in self.TICK_SYNC_MODES:
+            # 入力同期モードでは盤面を送らず、進んだティックだけを通知
+            # （ゲームオーバー後も送り、相手やサーバーが最後のティックまで進めるようにする）
+            self.client.send_game_state({
+                "event": "input_tick",
+                "tick": self.local_game.tick
+            })
+            return
+        
+        if self.local_game.game_over:
             return
         
         state = {
@@ -565,11 +767,41 @@ class OnlineGame:
                 "y": self.local_game.current_piece["y"] if self.local_game.current_piece else 0,
                 "color": self.local_game.current_piece["color"] if self.local_game.current_piece else None,
             },
-            "timestamp": time.time()
+            "seq": self.state_seq,
+            "timestamp": self._server_time()
         }
+        self.state_seq += 1
         
         self.client.send_game_state(state)
     
+    def _send_state_if_changed(self, now: float):
+        """盤面送信モード：状態が変わったら上限レート以内で送り、変わらなくても定期的に送る"""
+        if self.client:
+            clock = self.client.clock
+            self.send_rate.adjust(now, clock.srtt, clock.min_rtt, self.client.send_backlog())
+        
+        signature = self._state_signature()
+        if self.send_rate.should_send(now, signature != self.last_sent_signature):
+            self._send_game_state()
+            self.send_rate.sent(now)
+            self.last_sent_signature = signature
+    
+    def _state_signature(self) -> tuple:
+        """送信する状態の比較用のコピー（移動・回転・固定・ガベージで変わる）"""
+        game = self.local_game
+        piece = game.current_piece
+        return (
+            [row[:] for row in game.grid],
+            (piece["x"], piece["y"], [row[:] for row in piece["shape"]]) if piece else None,
+            game.score,
+            game.level,
+            game.lines_cleared,
+        )
+    
+    def _server_time(self) -> float:
+        """メッセージのタイムスタンプ用：サーバーの時刻（推定）"""
+        return self.client.server_time() if self.client else time.time()
+    
     def _handle_mouse_click(self, mouse_pos: tuple):
         """マウスクリック処理"""
         print(f"オンラインゲーム マウスクリック: {mouse_pos}")
@@ -598,7 +830,7 @@ class OnlineGame:
             game_over_msg = {
                 "event": "game_over",
                 "result": result,
-                "timestamp": time.time()
+                "timestamp": self._server_time()
             }
             self.client.send_game_state(game_over_msg)
     
@@ -611,25 +843,71 @@ class OnlineGame:
             event = data.get("event")
             
             if event == "game_state":
-                # 相手のゲーム状態を更新
-                self.opponent_game_state = data
+                # 相手のゲーム状態をジッターバッファに入れる（表示は update で取り出す）
+                self.opponent_frames.push(data)
+            
+            elif event == "game_start":
+                # 相手が別のシード・散らばり具合で開始した場合は再シミュレーションを作り直す
+                seed = data.get("seed")
+                messiness = data.get("garbage_messiness")
+                if not isinstance(messiness, (int, float)):
+                    messiness = self.garbage_messiness
+                if self.sync_mode == "input" and seed is not None:
+                    if (not self.input_sync or self.input_sync.seed != seed
+                            or self.input_sync.engine.garbage.messiness != messiness):
+                        self.input_sync = InputSync(seed, block_colors=config.theme["blocks"],
+                                                    garbage_messiness=messiness)
+            
+            elif event == "input_tick":
+                if self.input_sync:
+                    self.input_sync.confirm(data.get("tick", 0))
+                elif self.rollback:
+                    self.rollback.confirm_remote(data.get("tick", 0))
             
             elif event == "attack_warning":
-                # 攻撃予告を受信
+                # 攻撃予告を受信（受信スレッドなので update で受信中の攻撃に移す）
                 lines = data.get("lines", 0)
                 delay = data.get("delay", 2.0)
-                self.incoming_attacks.append([delay, lines])
+                self.received_attacks.append((time.time() + delay, lines))
             
             elif event == "attack":
                 # 即座に攻撃を受信（旧システム対応）
                 lines = data.get("lines", 0)
-                for _ in range(lines):
-                    self.pending_garbage.append(1)
+                if lines > 0:
+                    self.pending_garbage.append(lines)
             
             elif event == "game_over":
-                # 相手のゲームオーバー
-                if not self.game_over:
+                # 相手のゲームオーバー（サーバー権威モードでは match_result に従う）
+                if not self.game_over and self.sync_mode != "server":
                     self._handle_game_over("win")
+            
+            elif event == "garbage":
+                # サーバー権威モード：ガベージの到着通知（メインループで適用）
+                self.pending_garbage.append(data.get("lines", 0))
+            
+            elif event == "authoritative_state":
+                self._on_authoritative_state(data)
+            
+            elif event == "match_result":
+                # サーバー権威モードの勝敗
+                if not self.game_over:
+                    winner = data.get("winner")
+                    if winner is None:
+                        self._handle_game_over("draw")
+                    elif self.client and winner == self.client.player_id:
+                        self._handle_game_over("win")
+                    else:
+                        self._handle_game_over("lose")
+        
+        elif msg_type == MessageType.PLAYER_ACTION.value:
+            # 入力同期モード：相手の入力を再シミュレーションに渡す
+            if "tick" in data:
+                # ガベージはライン数だけを渡す（穴位置は共有シードから決まる）
+                extra = {"lines": data["lines"]} if "lines" in data else {}
+                if self.input_sync:
+                    self.input_sync.add_input(data["tick"], data.get("action", ""), extra)
+                elif self.rollback:
+                    self.rollback.add_remote_input(data["tick"], data.get("action", ""), extra)
         
         elif msg_type == MessageType.CHAT_MESSAGE.value:
             # チャットメッセージを受信
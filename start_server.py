@@ -3,6 +3,8 @@
 import sys
 import signal
 from network.server import TetrisServer
+from network.udp_server import UDPTetrisServer
+from network.cluster import run_workers
 
 
 def signal_handler(signum, frame):
@@ -17,26 +19,70 @@ def main():
     # デフォルトのホストとポート
     host = "localhost"
     port = 12345
+    workers = 1
+    metrics_port = None
+    use_udp = False
     
     # コマンドライン引数の処理
-    if len(sys.argv) > 1:
+    # （--workers N でマルチプロセス起動、--metrics-port N で計測値を http://127.0.0.1:N/metrics に公開、
+    #   --udp で UDP サーバーとして起動）
+    args = sys.argv[1:]
+    if "--udp" in args:
+        use_udp = True
+        port = 12346
+        args.remove("--udp")
+    
+    if "--workers" in args:
+        index = args.index("--workers")
+        try:
+            workers = int(args[index + 1])
+        except (IndexError, ValueError):
+            print("ワーカー数は数値で指定してください")
+            sys.exit(1)
+        del args[index:index + 2]
+    
+    if "--metrics-port" in args:
+        index = args.index("--metrics-port")
         try:
-            port = int(sys.argv[1])
+            metrics_port = int(args[index + 1])
+        except (IndexError, ValueError):
+            print("計測値のポート番号は数値で指定してください")
+            sys.exit(1)
+        del args[index:index + 2]
+    
+    if len(args) > 0:
+        try:
+            port = int(args[0])
         except ValueError:
             print("ポート番号は数値で指定してください")
             sys.exit(1)
     
-    if len(sys.argv) > 2:
-        host = sys.argv[2]
+    if len(args) > 1:
+        host = args[1]
     
     print(f"テトリスサーバーを起動します...")
     print(f"ホスト: {host}")
     print(f"ポート: {port}")
+    if use_udp:
+        print("プロトコル: UDP")
+    if workers > 1:
+        print(f"ワーカー数: {workers}")
     print("Ctrl+C で停止")
     print("-" * 40)
     
+    if workers > 1 and use_udp:
+        print("UDP サーバーはマルチプロセスモードに対応していないため、単一プロセスで起動します")
+    elif workers > 1:
+        # ポートを共有する複数のワーカープロセスで起動（GIL の制約を受けずに全コアを使う）
+        if run_workers(host, port, workers, metrics_port):
+            return
+        print("単一プロセスで起動します")
+    
     # サーバーインスタンスを作成
-    server = TetrisServer(host, port)
+    if use_udp:
+        server = UDPTetrisServer(host, port, metrics_port=metrics_port)
+    else:
+        server = TetrisServer(host, port, metrics_port=metrics_port)
     signal_handler.server = server
     
     # シグナルハンドラーを設定